@@ -4,18 +4,42 @@ from .agents import (
     BaseAgent, 
     SearchAgent, 
     ChatAgent, 
+    CatalogAgent,
     ImageAgent, 
     AgentConfig, 
     AgentResponse,
-    ImageGenerationResult
+    ImageGenerationResult,
+    ToolDiscoveryError
 )
+from .cache import (
+    InMemoryResponseCache,
+    MongoResponseCache,
+    ResponseCache,
+    response_cache_from_env
+)
+from .limits import (
+    AgentOverloadedError,
+    ConcurrencyGate,
+    SingleFlight
+)
+from .registry import AgentRegistry
 
 __all__ = [
     "BaseAgent",
     "SearchAgent", 
     "ChatAgent",
+    "CatalogAgent",
     "ImageAgent",
     "AgentConfig",
     "AgentResponse",
-    "ImageGenerationResult"
+    "ImageGenerationResult",
+    "ResponseCache",
+    "InMemoryResponseCache",
+    "MongoResponseCache",
+    "response_cache_from_env",
+    "AgentOverloadedError",
+    "ConcurrencyGate",
+    "SingleFlight",
+    "AgentRegistry",
+    "ToolDiscoveryError"
 ]
@@ -1,16 +1,30 @@
 # Extensible AI agents with LangChain and MCP support
 
-from typing import Dict, Any, Optional, List
+from typing import AsyncIterator, Callable, Dict, Any, Optional, List, Tuple
+import asyncio
 import os
 import logging
+import time
+from contextlib import nullcontext
 from dataclasses import dataclass
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_mcp_adapters.client import MultiServerMCPClient
 from pydantic import BaseModel, Field
 
+from .cache import ResponseCache, cache_scope, normalize_prompt
+from .limits import AgentOverloadedError, ConcurrencyGate, SingleFlight
+
 logger = logging.getLogger(__name__)
 
+# Seconds between MCP discovery retries on the request path after a failure
+MCP_RETRY_SECONDS = 30.0
+
+
+class ToolDiscoveryError(RuntimeError):
+    # Raised by warm_up when MCP tool discovery failed or found no tools
+    pass
+
 
 @dataclass
 class AgentConfig:
@@ -46,9 +60,33 @@ class ImageGenerationResult(BaseModel):
     success: bool = Field(description="Whether image generation was successful")
 
 
+def _chunk_text(chunk) -> str:
+    # Message chunk content is a string, or a list of content blocks for some providers
+    content = getattr(chunk, "content", "")
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for block in content or []
+    )
+
+
+def _token_usage(messages) -> Dict[str, int]:
+    # Sum provider-reported token usage across the AI messages of a run
+    usage = {"input_tokens": 0, "output_tokens": 0}
+    for message in messages:
+        metadata = getattr(message, "usage_metadata", None) or {}
+        usage["input_tokens"] += metadata.get("input_tokens", 0) or 0
+        usage["output_tokens"] += metadata.get("output_tokens", 0) or 0
+    return usage
+
+
 class BaseAgent:
     # Base AI agent with LangChain and MCP support
     
+    # Whether a cached answer to a similar (not identical) prompt may be served
+    allow_similar_cache = True
+    
     def __init__(self, config: AgentConfig, system_prompt: str = "You are a helpful AI assistant."):
         self.config = config
         self.system_prompt = system_prompt
@@ -64,10 +102,26 @@ class BaseAgent:
         self.mcp_client: Optional[MultiServerMCPClient] = None
         self.mcp_tools = []
         
+        # Compiled LangGraph agent, reused until the tool list changes
+        self._react_agent = None
+        self._react_agent_tools: tuple = ()
+        
+        # Optional response cache, assigned by the owner of the agent
+        self.response_cache: Optional[ResponseCache] = None
+        
+        # Optional concurrency gate, assigned by the owner; identical in-flight calls always coalesce
+        self.gate: Optional[ConcurrencyGate] = None
+        self.in_flight = SingleFlight()
+        
+        # Serializes MCP setup so concurrent first calls share one client
+        self._mcp_lock = asyncio.Lock()
+        self.mcp_error: Optional[str] = None
+        self._mcp_retry_at = 0.0
+        
         logger.info(f"Initialized {self.__class__.__name__} with model {config.model_name}")
     
-    async def setup_mcp(self, server_configs: Dict[str, Dict[str, Any]]):
-        # Setup MCP servers and load tools
+    async def setup_mcp(self, server_configs: Dict[str, Dict[str, Any]]) -> bool:
+        # Setup MCP servers and load tools; True only when at least one tool was discovered
         try:
             # Initialize MCP client with server configs (dict of server name -> config)
             logger.debug("Setting up MCP with configs: %s", server_configs)
@@ -100,8 +154,93 @@ class BaseAgent:
             traceback.print_exc()
             self.mcp_client = None
             self.mcp_tools = []
+            self.mcp_error = str(e)
+        else:
+            self.mcp_error = None if self.mcp_tools else "MCP discovery returned no tools"
+        
+        if self.mcp_error:
+            self._mcp_retry_at = time.monotonic() + MCP_RETRY_SECONDS
+            return False
+        return True
+    
+    def _mcp_retry_pending(self, force: bool) -> bool:
+        # After a failed discovery, requests skip rediscovery until the retry time
+        return not force and time.monotonic() < self._mcp_retry_at
+    
+    def _require_tools(self) -> None:
+        # Used by warm_up: a failed discovery keeps the agent out of the ready state
+        if self.mcp_error:
+            raise ToolDiscoveryError(self.mcp_error)
+    
+    async def warm_up(self):
+        # Do one-time setup (e.g. MCP tool discovery) before the first request
+        pass
+    
+    def get_react_agent(self):
+        # Compile the LangGraph react agent once per tool set
+        tools_key = tuple(id(tool) for tool in self.mcp_tools)
+        if self._react_agent is None or tools_key != self._react_agent_tools:
+            from langgraph.prebuilt import create_react_agent
+            
+            logger.info(f"Creating agent with {len(self.mcp_tools)} tools")
+            
+            # Create LangGraph agent with tools (no checkpointer, so safe to share across requests)
+            self._react_agent = create_react_agent(
+                self.llm,
+                self.mcp_tools
+            )
+            self._react_agent_tools = tools_key
+        return self._react_agent
+    
+    def _cache_scope(self, use_tools: bool) -> str:
+        return cache_scope(self.__class__.__name__, self.system_prompt, self.config.model_name, use_tools)
+    
+    async def _cached_response(self, prompt: str, use_tools: bool) -> Optional[AgentResponse]:
+        if not self.response_cache:
+            return None
+        cached = await self.response_cache.get(self._cache_scope(use_tools), prompt, self.allow_similar_cache)
+        if not cached:
+            return None
+        response, match = cached
+        result = AgentResponse(**response)
+        result.metadata = {**result.metadata, "cache_hit": True, "cache_match": match}
+        return result
+    
+    async def _store_response(self, prompt: str, use_tools: bool, response: AgentResponse) -> None:
+        if self.response_cache and response.success:
+            await self.response_cache.set(
+                self._cache_scope(use_tools), prompt, response.model_dump(), self.allow_similar_cache
+            )
     
     async def execute(self, prompt: str, use_tools: bool = True) -> AgentResponse:
+        # Serve repeated prompts from the response cache, if one is configured
+        cached = await self._cached_response(prompt, use_tools)
+        if cached:
+            return cached
+        
+        # Concurrent identical prompts share one upstream call; each caller gets its own copy
+        key = (self._cache_scope(use_tools), normalize_prompt(prompt))
+        response, shared = await self.in_flight.do(key, lambda: self._execute_gated(prompt, use_tools))
+        response = response.model_copy(deep=True)
+        if shared:
+            response.metadata["coalesced"] = True
+        return response
+    
+    def _slot(self):
+        return self.gate.slot() if self.gate else nullcontext()
+    
+    async def _execute_gated(self, prompt: str, use_tools: bool) -> AgentResponse:
+        # Raises AgentOverloadedError when the gate's queue is full
+        async with self._slot():
+            started = time.perf_counter()
+            response = await self._execute(prompt, use_tools)
+            response.metadata["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        await self._store_response(prompt, use_tools, response)
+        if self.response_cache:
+            response.metadata["cache_hit"] = False
+        return response
+    
+    async def _execute(self, prompt: str, use_tools: bool = True) -> AgentResponse:
         # Execute agent with LangGraph
         try:
             messages = [
@@ -111,16 +250,8 @@ class BaseAgent:
             
             # Use MCP tools with LangGraph if available
             if use_tools and self.mcp_client and self.mcp_tools:
-                # Use LangGraph's create_react_agent (simple form)
-                from langgraph.prebuilt import create_react_agent
-                
-                logger.info(f"Creating agent with {len(self.mcp_tools)} tools")
-                
-                # Create LangGraph agent with tools (no checkpointer for simplicity)
-                agent = create_react_agent(
-                    self.llm,
-                    self.mcp_tools
-                )
+                # Reuse the compiled LangGraph agent for this tool set
+                agent = self.get_react_agent()
                 
                 # Execute the agent with system prompt + user message
                 result = await agent.ainvoke({
@@ -161,7 +292,8 @@ class BaseAgent:
                         "tools_available": len(self.mcp_tools),
                         "tools_used": tools_called,
                         "tool_call_count": tool_call_count,
-                        "message_count": len(response_messages)
+                        "message_count": len(response_messages),
+                        **_token_usage(response_messages)
                     }
                 )
             else:
@@ -178,7 +310,8 @@ class BaseAgent:
                     metadata={
                         "model": self.config.model_name,
                         "tools_available": 0,
-                        "tools_used": False
+                        "tools_used": False,
+                        **_token_usage([response])
                     }
                 )
             
@@ -192,6 +325,102 @@ class BaseAgent:
                 error=str(e)
             )
     
+    async def stream(self, prompt: str, use_tools: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        # Stream tokens and tool events as they happen, ending with a "final" event
+        # whose fields mirror AgentResponse
+        cached = await self._cached_response(prompt, use_tools)
+        if cached:
+            yield {"type": "token", "content": cached.content}
+            yield {"type": "final", **cached.model_dump()}
+            return
+        
+        # Streams hold a gate slot until the final event; they are not coalesced
+        try:
+            async with self._slot():
+                async for event in self._stream(prompt, use_tools):
+                    yield event
+        except AgentOverloadedError as e:
+            response = AgentResponse(
+                success=False,
+                content="",
+                metadata={"overloaded": True, "retry_after": e.retry_after},
+                error=str(e)
+            )
+            yield {"type": "final", **response.model_dump()}
+    
+    async def _stream(self, prompt: str, use_tools: bool) -> AsyncIterator[Dict[str, Any]]:
+        messages = [
+            SystemMessage(content=self.system_prompt),
+            HumanMessage(content=prompt)
+        ]
+        started = time.perf_counter()
+        try:
+            if use_tools and self.mcp_client and self.mcp_tools:
+                agent = self.get_react_agent()
+                model_outputs = []
+                run_text: Dict[str, str] = {}
+                last_run_id = None
+                tool_call_count = 0
+                
+                async for event in agent.astream_events({"messages": messages}, version="v2"):
+                    kind = event["event"]
+                    if kind == "on_chat_model_stream":
+                        text = _chunk_text(event["data"]["chunk"])
+                        if text:
+                            last_run_id = event["run_id"]
+                            run_text[last_run_id] = run_text.get(last_run_id, "") + text
+                            yield {"type": "token", "content": text}
+                    elif kind == "on_tool_start":
+                        tool_call_count += 1
+                        yield {"type": "tool_start", "name": event["name"], "input": event["data"].get("input")}
+                    elif kind == "on_tool_end":
+                        yield {"type": "tool_end", "name": event["name"]}
+                    elif kind == "on_chat_model_end":
+                        model_outputs.append(event["data"].get("output"))
+                
+                # The answer is the text of the last model run; earlier runs only chose tools
+                response = AgentResponse(
+                    success=True,
+                    content=run_text.get(last_run_id, ""),
+                    metadata={
+                        "model": self.config.model_name,
+                        "tools_available": len(self.mcp_tools),
+                        "tools_used": tool_call_count > 0,
+                        "tool_call_count": tool_call_count,
+                        "streamed": True,
+                        **_token_usage(model_outputs)
+                    }
+                )
+            else:
+                content = ""
+                chunks = []
+                async for chunk in self.llm.astream(messages):
+                    chunks.append(chunk)
+                    text = _chunk_text(chunk)
+                    if text:
+                        content += text
+                        yield {"type": "token", "content": text}
+                response = AgentResponse(
+                    success=True,
+                    content=content,
+                    metadata={
+                        "model": self.config.model_name,
+                        "tools_available": 0,
+                        "tools_used": False,
+                        "streamed": True,
+                        **_token_usage(chunks)
+                    }
+                )
+        except Exception as e:
+            logger.error(f"Error streaming agent: {e}")
+            response = AgentResponse(success=False, content="", error=str(e))
+        
+        response.metadata["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        await self._store_response(prompt, use_tools, response)
+        if self.response_cache:
+            response.metadata["cache_hit"] = False
+        yield {"type": "final", **response.model_dump()}
+    
     def get_capabilities(self) -> List[str]:
         # Get agent capabilities
         capabilities = ["text_generation", "conversation"]
@@ -215,30 +444,43 @@ Cite sources from your search results."""
         # Store setup flag
         self._mcp_setup_done = False
     
-    async def setup_web_search_mcp(self):
+    async def setup_web_search_mcp(self, force: bool = False):
         # Setup web search MCP with auth token
-        if self._mcp_setup_done:
-            return
+        async with self._mcp_lock:
+            if self._mcp_setup_done or self._mcp_retry_pending(force):
+                return
             
-        mcp_token = os.getenv("CODEXHUB_MCP_AUTH_TOKEN")
-        if mcp_token and mcp_token != "dummy-key":
-            server_configs = {
-                "web-search": {
-                    "transport": "streamable_http",
-                    "url": "https://mcp.codexhub.ai/web/mcp",
-                    "headers": {"x-team-key": mcp_token}
+            mcp_token = os.getenv("CODEXHUB_MCP_AUTH_TOKEN")
+            if mcp_token and mcp_token != "dummy-key":
+                server_configs = {
+                    "web-search": {
+                        "transport": "streamable_http",
+                        "url": "https://mcp.codexhub.ai/web/mcp",
+                        "headers": {"x-team-key": mcp_token}
+                    }
                 }
-            }
-            await self.setup_mcp(server_configs)
-            self._mcp_setup_done = True
-            logger.info("Web search MCP configured")
-        else:
-            logger.warning("CODEXHUB_MCP_AUTH_TOKEN not found, web search disabled")
+                # Left unset on failure so a later call retries discovery
+                self._mcp_setup_done = await self.setup_mcp(server_configs)
+                if self._mcp_setup_done:
+                    logger.info("Web search MCP configured")
+            else:
+                logger.warning("CODEXHUB_MCP_AUTH_TOKEN not found, web search disabled")
+    
+    async def warm_up(self):
+        # Discover web search tools ahead of the first request
+        await self.setup_web_search_mcp(force=True)
+        self._require_tools()
     
     async def execute(self, prompt: str, use_tools: bool = True) -> AgentResponse:
         # Ensure MCP is setup before execution
         await self.setup_web_search_mcp()
         return await super().execute(prompt, use_tools)
+    
+    async def stream(self, prompt: str, use_tools: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        # Ensure MCP is setup before streaming
+        await self.setup_web_search_mcp()
+        async for event in super().stream(prompt, use_tools):
+            yield event
 
 
 class ChatAgent(BaseAgent):
@@ -250,6 +492,67 @@ class ChatAgent(BaseAgent):
         super().__init__(config, system_prompt)
 
 
+# Returns up to k product documents relevant to a shopper's message
+CatalogRetriever = Callable[[str, int], List[Dict[str, Any]]]
+
+
+class CatalogAgent(BaseAgent):
+    # Shopping assistant grounded in the store catalog
+
+    # Grounded prompts that differ only in a size, stock count or price are different questions
+    allow_similar_cache = False
+
+    def __init__(self, config: AgentConfig, retrieve: CatalogRetriever, top_k: int = 5):
+        system_prompt = """You are the shopping assistant for a sneaker store.
+Answer ONLY from the catalog entries given with each message; they are the products that match the question.
+Stock, sizes and prices in those entries are current. NEVER invent products, sizes or prices.
+If no entry answers the question, say the store does not carry it.
+Refer to products by name. Keep answers short."""
+
+        super().__init__(config, system_prompt)
+
+        # Local retrieval (in-memory index), so grounding costs no LLM or database call
+        self.retrieve = retrieve
+        self.top_k = top_k
+
+    def _grounded_prompt(self, prompt: str) -> Tuple[str, List[str]]:
+        # Inject only the top-k matching SKUs, one compact line each
+        products = self.retrieve(prompt, self.top_k)
+        lines = [_catalog_line(product) for product in products]
+        context = "\n".join(lines) if lines else "(no matching products)"
+        grounded = f"Catalog entries:\n{context}\n\nCustomer: {prompt}"
+        return grounded, [product["id"] for product in products]
+
+    async def execute(self, prompt: str, use_tools: bool = True) -> AgentResponse:
+        # The grounded prompt is also the cache key, so a stock change misses the cache
+        grounded, skus = self._grounded_prompt(prompt)
+        response = await super().execute(grounded, use_tools)
+        response.metadata["catalog_skus"] = skus
+        return response
+
+    async def stream(self, prompt: str, use_tools: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        grounded, skus = self._grounded_prompt(prompt)
+        async for event in super().stream(grounded, use_tools):
+            if event["type"] == "final":
+                event["metadata"]["catalog_skus"] = skus
+            yield event
+
+    def get_capabilities(self) -> List[str]:
+        return super().get_capabilities() + ["catalog_grounded"]
+
+
+def _catalog_line(product: Dict[str, Any]) -> str:
+    # e.g. "p1 | Apex Runner | Black | $120.00 | in stock: 9, 10"
+    sizes = [entry["size"] for entry in product.get("sizes") or [] if entry.get("stock", 0) > 0]
+    return " | ".join([
+        str(product["id"]),
+        str(product.get("name", "")),
+        str(product.get("color", "")),
+        f"${float(product.get('price', 0.0)):.2f}",
+        f"in stock: {', '.join(sizes)}" if sizes else "sold out",
+    ])
+
+
 class ImageAgent(BaseAgent):
     # Image generation agent with MCP support
     
@@ -265,31 +568,44 @@ Provide responses in a clear, structured format."""
         # Store setup flag
         self._mcp_setup_done = False
     
-    async def setup_image_mcp(self):
+    async def setup_image_mcp(self, force: bool = False):
         # Setup image generation MCP with auth token
-        if self._mcp_setup_done:
-            return
+        async with self._mcp_lock:
+            if self._mcp_setup_done or self._mcp_retry_pending(force):
+                return
             
-        mcp_token = os.getenv("CODEXHUB_MCP_AUTH_TOKEN")
-        if mcp_token and mcp_token != "dummy-key":
-            server_configs = {
-                "image-generation": {
-                    "transport": "streamable_http",
-                    "url": "https://mcp.codexhub.ai/image/mcp",
-                    "headers": {"x-team-key": mcp_token}
+            mcp_token = os.getenv("CODEXHUB_MCP_AUTH_TOKEN")
+            if mcp_token and mcp_token != "dummy-key":
+                server_configs = {
+                    "image-generation": {
+                        "transport": "streamable_http",
+                        "url": "https://mcp.codexhub.ai/image/mcp",
+                        "headers": {"x-team-key": mcp_token}
+                    }
                 }
-            }
-            await self.setup_mcp(server_configs)
-            self._mcp_setup_done = True
-            logger.info("Image generation MCP configured")
-        else:
-            logger.warning("CODEXHUB_MCP_AUTH_TOKEN not found, image generation disabled")
+                # Left unset on failure so a later call retries discovery
+                self._mcp_setup_done = await self.setup_mcp(server_configs)
+                if self._mcp_setup_done:
+                    logger.info("Image generation MCP configured")
+            else:
+                logger.warning("CODEXHUB_MCP_AUTH_TOKEN not found, image generation disabled")
+    
+    async def warm_up(self):
+        # Discover image generation tools ahead of the first request
+        await self.setup_image_mcp(force=True)
+        self._require_tools()
     
     async def execute(self, prompt: str, use_tools: bool = True) -> AgentResponse:
         # Ensure MCP is setup before execution
         await self.setup_image_mcp()
         return await super().execute(prompt, use_tools)
     
+    async def stream(self, prompt: str, use_tools: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        # Ensure MCP is setup before streaming
+        await self.setup_image_mcp()
+        async for event in super().stream(prompt, use_tools):
+            yield event
+    
     async def generate_image_structured(self, prompt: str) -> ImageGenerationResult:
         # Generate image with structured output
         await self.setup_image_mcp()
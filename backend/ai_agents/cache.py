@@ -0,0 +1,229 @@
+# Response caching for agent calls, with in-memory and MongoDB backends
+
+import hashlib
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+Embedding = List[float]
+Embedder = Callable[[str], Embedding]
+
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+_NUMERIC = re.compile(r"\w*\d\w*")
+
+
+def normalize_prompt(prompt: str) -> str:
+    # Case, whitespace and trailing punctuation do not change the answer
+    return _WHITESPACE.sub(" ", prompt.strip().lower()).rstrip(" ?!.")
+
+
+def numeric_tokens(text: str) -> List[str]:
+    # Sizes, model numbers and quantities: "size 10" and "size 11" embed almost identically
+    return sorted(_NUMERIC.findall(text.lower()))
+
+
+def cache_scope(agent_name: str, system_prompt: str, model_name: str, use_tools: bool) -> str:
+    # Responses are only shared between calls with the same agent, prompt and model
+    prompt_hash = hashlib.sha256(system_prompt.encode()).hexdigest()[:16]
+    return f"{agent_name}:{prompt_hash}:{model_name}:{int(use_tools)}"
+
+
+def hashing_embedding(text: str, dims: int = 256) -> Embedding:
+    # Dependency-free local embedding: hashed words and character trigrams, L2-normalized
+    vector = [0.0] * dims
+    words = _WORD.findall(text.lower())
+    features = words + [word[i:i + 3] for word in words for i in range(max(len(word) - 2, 1))]
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dims
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector] if norm else vector
+
+
+def cosine_similarity(a: Embedding, b: Embedding) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class ResponseCache:
+    # Base cache keyed on (scope, normalized prompt) with optional similarity matching
+
+    def __init__(
+        self,
+        ttl_seconds: float = 300.0,
+        similarity_threshold: Optional[float] = None,
+        embedder: Optional[Embedder] = None,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.embedder = embedder or (hashing_embedding if similarity_threshold else None)
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    def _similarity_enabled(self, allow_similar: bool) -> bool:
+        return bool(allow_similar and self.similarity_threshold and self.embedder)
+
+    async def get(
+        self, scope: str, prompt: str, allow_similar: bool = True
+    ) -> Optional[Tuple[Dict[str, Any], str]]:
+        # Returns (response, match) where match is "exact" or "similar"
+        key = normalize_prompt(prompt)
+        response = await self._get_exact(scope, key)
+        if response is not None:
+            self.hits += 1
+            return response, "exact"
+
+        if self._similarity_enabled(allow_similar):
+            query = self.embedder(key)
+            numbers = numeric_tokens(key)
+            best_score, best_response = 0.0, None
+            for candidate_key, embedding, candidate in await self._candidates(scope):
+                # A similar prompt about a different size or model is a different question
+                if numeric_tokens(candidate_key) != numbers:
+                    continue
+                score = cosine_similarity(query, embedding)
+                if score > best_score:
+                    best_score, best_response = score, candidate
+            if best_response is not None and best_score >= self.similarity_threshold:
+                self.similar_hits += 1
+                return best_response, "similar"
+
+        self.misses += 1
+        return None
+
+    async def set(self, scope: str, prompt: str, response: Dict[str, Any], allow_similar: bool = True) -> None:
+        key = normalize_prompt(prompt)
+        embedding = self.embedder(key) if self._similarity_enabled(allow_similar) else None
+        await self._put(scope, key, response, embedding)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.__class__.__name__,
+            "ttl_seconds": self.ttl_seconds,
+            "similarity_threshold": self.similarity_threshold,
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+        }
+
+    async def _get_exact(self, scope: str, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def _put(self, scope: str, key: str, response: Dict[str, Any], embedding: Optional[Embedding]) -> None:
+        raise NotImplementedError
+
+    async def _candidates(self, scope: str) -> Iterable[Tuple[str, Embedding, Dict[str, Any]]]:
+        # (normalized prompt, embedding, response) for live entries in scope
+        raise NotImplementedError
+
+
+class InMemoryResponseCache(ResponseCache):
+    # Per-process LRU cache bounded by max_entries
+
+    def __init__(self, max_entries: int = 1000, **kwargs):
+        super().__init__(**kwargs)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Dict[str, Any], float, Optional[Embedding]]]" = OrderedDict()
+
+    async def _get_exact(self, scope: str, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get((scope, key))
+        if entry is None:
+            return None
+        response, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            del self._entries[(scope, key)]
+            return None
+        self._entries.move_to_end((scope, key))
+        return response
+
+    async def _put(self, scope: str, key: str, response: Dict[str, Any], embedding: Optional[Embedding]) -> None:
+        self._entries[(scope, key)] = (response, time.monotonic() + self.ttl_seconds, embedding)
+        self._entries.move_to_end((scope, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _candidates(self, scope: str) -> Iterable[Tuple[str, Embedding, Dict[str, Any]]]:
+        now = time.monotonic()
+        return [
+            (key, embedding, response)
+            for (entry_scope, key), (response, expires_at, embedding) in self._entries.items()
+            if entry_scope == scope and embedding is not None and expires_at > now
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "entries": len(self._entries), "max_entries": self.max_entries}
+
+
+class MongoResponseCache(ResponseCache):
+    # Shared cache in a MongoDB collection; a TTL index expires entries server-side
+
+    def __init__(self, collection, max_candidates: int = 200, **kwargs):
+        super().__init__(**kwargs)
+        self.collection = collection
+        self.max_candidates = max_candidates
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index("expires_at", name="agent_cache_expires_at", expireAfterSeconds=0)
+        await self.collection.create_index([("scope", 1), ("created_at", -1)], name="agent_cache_scope_created_at")
+
+    @staticmethod
+    def _doc_id(scope: str, key: str) -> str:
+        return hashlib.sha256(f"{scope}\n{key}".encode()).hexdigest()
+
+    async def _get_exact(self, scope: str, key: str) -> Optional[Dict[str, Any]]:
+        # The TTL monitor runs once a minute, so check expiry explicitly too
+        doc = await self.collection.find_one(
+            {"_id": self._doc_id(scope, key), "expires_at": {"$gt": datetime.now(timezone.utc)}},
+            {"response": 1},
+        )
+        return doc["response"] if doc else None
+
+    async def _put(self, scope: str, key: str, response: Dict[str, Any], embedding: Optional[Embedding]) -> None:
+        now = datetime.now(timezone.utc)
+        await self.collection.replace_one(
+            {"_id": self._doc_id(scope, key)},
+            {
+                "scope": scope,
+                "prompt": key,
+                "response": response,
+                "embedding": embedding,
+                "created_at": now,
+                "expires_at": now + timedelta(seconds=self.ttl_seconds),
+            },
+            upsert=True,
+        )
+
+    async def _candidates(self, scope: str) -> Iterable[Tuple[str, Embedding, Dict[str, Any]]]:
+        cursor = self.collection.find(
+            {
+                "scope": scope,
+                "embedding": {"$ne": None},
+                "expires_at": {"$gt": datetime.now(timezone.utc)},
+            },
+            {"prompt": 1, "embedding": 1, "response": 1},
+        ).sort("created_at", -1).limit(self.max_candidates)
+        return [(doc["prompt"], doc["embedding"], doc["response"]) async for doc in cursor]
+
+
+def response_cache_from_env(db=None) -> Optional[ResponseCache]:
+    # AGENT_CACHE_BACKEND: "memory" (default), "mongo" or "off"
+    backend = os.getenv("AGENT_CACHE_BACKEND", "memory").lower()
+    if backend in ("off", "none", ""):
+        return None
+
+    threshold = float(os.getenv("AGENT_CACHE_SIMILARITY_THRESHOLD", "0") or 0)
+    options = {
+        "ttl_seconds": float(os.getenv("AGENT_CACHE_TTL_SECONDS", "300")),
+        "similarity_threshold": threshold or None,
+    }
+    if backend == "mongo" and db is not None:
+        return MongoResponseCache(db.agent_response_cache, **options)
+    return InMemoryResponseCache(max_entries=int(os.getenv("AGENT_CACHE_MAX_ENTRIES", "1000")), **options)
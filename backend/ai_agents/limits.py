@@ -0,0 +1,118 @@
+# Concurrency limiting and request coalescing for agent calls
+
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class AgentOverloadedError(RuntimeError):
+    # Raised instead of queueing when an agent's wait queue is full (HTTP 429)
+
+    def __init__(self, agent_name: str, retry_after: int):
+        super().__init__(f"{agent_name} is overloaded, retry in {retry_after}s")
+        self.agent_name = agent_name
+        self.retry_after = retry_after
+
+
+class ConcurrencyGate:
+    # At most max_concurrent upstream calls; up to max_queue callers wait, the rest are shed
+
+    def __init__(self, name: str, max_concurrent: int = 8, max_queue: int = 32):
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        # Moving average of slot hold time, for the Retry-After estimate
+        self._average_seconds = 1.0
+
+    @classmethod
+    def from_env(cls, name: str) -> "ConcurrencyGate":
+        return cls(
+            name,
+            max_concurrent=int(os.getenv("AGENT_MAX_CONCURRENCY", "8")),
+            max_queue=int(os.getenv("AGENT_MAX_QUEUE", "32")),
+        )
+
+    def saturated(self) -> bool:
+        # True when a new caller would be shed rather than queued
+        return self.active >= self.max_concurrent and self.waiting >= self.max_queue
+
+    def retry_after(self) -> int:
+        # Seconds until the current queue has likely drained
+        backlog = self.waiting + 1
+        return max(1, math.ceil(self._average_seconds * backlog / self.max_concurrent))
+
+    def check(self) -> None:
+        if self.saturated():
+            self.rejected += 1
+            raise AgentOverloadedError(self.name, self.retry_after())
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        self.check()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self.admitted += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+            self._average_seconds = 0.8 * self._average_seconds + 0.2 * (time.perf_counter() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "average_seconds": round(self._average_seconds, 3),
+        }
+
+
+class SingleFlight:
+    # Identical in-flight calls share one execution; its result fans out to every waiter
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        # Returns (result, shared); shared is True for callers that joined another call
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        # A disconnecting caller must not cancel the call the others are waiting on
+        return await asyncio.shield(task), shared
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every waiter went away
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._calls), "leaders": self.leaders, "coalesced": self.coalesced}
@@ -0,0 +1,105 @@
+# Agent registry: one instance per agent type, built once and warmed ahead of traffic
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from .agents import BaseAgent, ToolDiscoveryError
+
+logger = logging.getLogger(__name__)
+
+AgentFactory = Callable[[], BaseAgent]
+
+
+class AgentRegistry:
+    # Lazily builds agents under a per-type lock, so concurrent first callers share one build
+
+    def __init__(
+        self,
+        factories: Dict[str, AgentFactory],
+        configure: Optional[Callable[[str, BaseAgent], None]] = None,
+    ):
+        self.factories = factories
+        # Applied to every new agent, e.g. to attach a response cache or a concurrency gate
+        self.configure = configure
+        self._agents: Dict[str, BaseAgent] = {}
+        self._locks: Dict[str, asyncio.Lock] = {name: asyncio.Lock() for name in factories}
+        self._status: Dict[str, Dict[str, Any]] = {name: {"state": "cold"} for name in factories}
+
+    def __contains__(self, agent_type: str) -> bool:
+        return agent_type in self.factories or agent_type in self._agents
+
+    def items(self):
+        return self._agents.items()
+
+    async def get(self, agent_type: str) -> BaseAgent:
+        # Raises KeyError for unknown agent types; a degraded agent is served without its tools
+        agent = self._agents.get(agent_type)
+        if agent is not None:
+            return agent
+        return await self._ensure_warm(agent_type)
+
+    async def _ensure_warm(self, agent_type: str) -> BaseAgent:
+        async with self._locks[agent_type]:
+            agent = self._agents.get(agent_type)
+            if agent is None:
+                agent = await self._build(agent_type)
+            elif self._status[agent_type]["state"] == "degraded":
+                await self._warm(agent_type, agent)
+        return agent
+
+    async def register(self, agent_type: str, agent: BaseAgent) -> None:
+        # Install a prebuilt agent (e.g. one with a stub LLM), replacing any built one
+        async with self._locks.setdefault(agent_type, asyncio.Lock()):
+            if self.configure:
+                self.configure(agent_type, agent)
+            self._agents[agent_type] = agent
+            self._status[agent_type] = {"state": "ready", "tools": len(agent.mcp_tools)}
+
+    async def _build(self, agent_type: str) -> BaseAgent:
+        self._status[agent_type] = {"state": "warming"}
+        try:
+            agent = self.factories[agent_type]()
+            if self.configure:
+                self.configure(agent_type, agent)
+            await self._warm(agent_type, agent)
+        except Exception as e:
+            self._status[agent_type] = {"state": "failed", "error": str(e)}
+            raise
+        self._agents[agent_type] = agent
+        return agent
+
+    async def _warm(self, agent_type: str, agent: BaseAgent) -> None:
+        # MCP tool discovery happens here rather than on the first user request
+        started = time.perf_counter()
+        try:
+            await agent.warm_up()
+        except ToolDiscoveryError as e:
+            # Usable without tools, but not ready; the next warm_up retries discovery
+            self._agents[agent_type] = agent
+            self._status[agent_type] = {"state": "degraded", "tools": 0, "error": str(e)}
+            logger.warning(f"{agent_type} agent is degraded: {e}")
+            return
+        self._status[agent_type] = {
+            "state": "ready",
+            "tools": len(agent.mcp_tools),
+            "warm_up_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    async def warm_up(self, agent_types: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        # Build and warm every agent concurrently; one failure does not block the others.
+        # Degraded agents retry tool discovery, so calling this periodically heals them.
+        names = list(agent_types or self.factories)
+        results = await asyncio.gather(*(self._ensure_warm(name) for name in names), return_exceptions=True)
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to warm up {name} agent: {result}")
+        return self.status()
+
+    @property
+    def ready(self) -> bool:
+        return all(status["state"] == "ready" for status in self._status.values())
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {name: dict(status) for name, status in self._status.items()}
@@ -0,0 +1,142 @@
+"""Compare the stock list-response path with the orjson fast path.
+
+Serves the same 1000 Mongo-shaped documents three ways through a real FastAPI
+app over an in-process ASGI transport. No database is involved, so the
+numbers are serialization cost plus a constant routing overhead:
+
+- ``response_model``: models built in the endpoint and validated again by FastAPI
+- ``fast validated``: validated once, encoded by orjson
+- ``fast trusted``: reshaped without validation, encoded by orjson
+
+Run from ``backend/``:
+    python benchmarks/bench_json_responses.py --items 1000 --iterations 50
+
+One run on a development VM (mean per request, 1000 items, 50 requests):
+
+    Product   response_model 112.95 ms   fast validated 31.72 ms   fast trusted 7.05 ms
+    Order     response_model  48.59 ms   fast validated 30.38 ms   fast trusted 7.23 ms
+
+The Order documents omit ``reservation_id`` and ``cart_item_ids``, like orders
+written before those fields existed, so the trusted path fills defaults.
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+import httpx
+from bson import ObjectId
+from fastapi import FastAPI
+
+from commerce.fast_json import documents_response
+from server import Order, Product
+
+
+def _product_docs(count: int) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "_id": ObjectId(),
+            "id": str(uuid.uuid4()),
+            "name": f"Bench Runner {index}",
+            "description": "Load test sneaker " * 20,
+            "price": 150.0 + index,
+            "images": [f"https://img.test/{index}/{n}.jpg" for n in range(6)],
+            "category": "sneakers",
+            "color": "black",
+            "sizes": [{"size": str(size), "stock": 20} for size in range(7, 13)],
+            "featured": index % 5 == 0,
+            "created_at": now - timedelta(minutes=index),
+        }
+        for index in range(count)
+    ]
+
+
+def _order_docs(count: int) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "_id": ObjectId(),
+            "id": str(uuid.uuid4()),
+            "user_id": f"user-{index % 50}",
+            "items": [{"product_id": str(uuid.uuid4()), "size": "10", "quantity": 1, "price": 180.0}] * 3,
+            "total": 540.0,
+            "shipping_address": {"line1": "1 Bench St", "city": "Bench", "zip": "00000"},
+            "status": "paid",
+            "stripe_payment_id": f"cs_test_{index}",
+            "created_at": now - timedelta(minutes=index),
+        }
+        for index in range(count)
+    ]
+
+
+def _app(model, docs) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/baseline", response_model=List[model])
+    async def baseline():
+        return [model(**doc) for doc in docs]
+
+    @app.get("/fast-validated", response_model=List[model])
+    async def fast_validated():
+        return documents_response(model, docs, trusted=False)
+
+    @app.get("/fast-trusted", response_model=List[model])
+    async def fast_trusted():
+        return documents_response(model, docs)
+
+    return app
+
+
+async def _time_ms(client: httpx.AsyncClient, path: str, iterations: int) -> List[float]:
+    await client.get(path)  # warm up
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _report(label: str, samples: List[float], baseline: float) -> None:
+    ordered = sorted(samples)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    mean = statistics.mean(samples)
+    print(f"  {label:<16} mean {mean:8.2f} ms   p95 {p95:8.2f} ms   {baseline / mean:5.2f}x")
+
+
+async def run(items: int, iterations: int) -> None:
+    for name, model, docs in (("Product", Product, _product_docs(items)), ("Order", Order, _order_docs(items))):
+        transport = httpx.ASGITransport(app=_app(model, docs))
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            results = {path: await _time_ms(client, path, iterations)
+                       for path in ("/baseline", "/fast-validated", "/fast-trusted")}
+
+        baseline = statistics.mean(results["/baseline"])
+        print(f"{name} list of {items} over {iterations} requests")
+        _report("response_model", results["/baseline"], baseline)
+        _report("fast validated", results["/fast-validated"], baseline)
+        _report("fast trusted", results["/fast-trusted"], baseline)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.items, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
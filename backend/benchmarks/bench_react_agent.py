@@ -0,0 +1,73 @@
+"""Measure the per-request cost of compiling the LangGraph react agent.
+
+Compares building a fresh graph on every call (the old ``BaseAgent.execute``
+behaviour) with reusing the graph cached by ``BaseAgent.get_react_agent``.
+No network calls are made: the LLM is never invoked, only bound to tools.
+
+Run from ``backend/``:
+    python benchmarks/bench_react_agent.py --iterations 200
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from langchain_core.tools import tool
+from langgraph.prebuilt import create_react_agent
+
+from ai_agents import AgentConfig, ChatAgent
+
+
+@tool
+def web_search(query: str) -> str:
+    """Search the web for ``query``."""
+    return query
+
+
+@tool
+def fetch_page(url: str) -> str:
+    """Fetch the page at ``url``."""
+    return url
+
+
+def _time_ms(fn, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _report(label: str, samples):
+    ordered = sorted(samples)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(f"  {label:<22} mean {statistics.mean(samples):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    agent = ChatAgent(AgentConfig(api_base_url="http://localhost:0", model_name="bench", api_key="bench"))
+    agent.mcp_tools = [web_search, fetch_page]
+
+    rebuilt = _time_ms(lambda: create_react_agent(agent.llm, agent.mcp_tools), args.iterations)
+    agent.get_react_agent()  # warm the cache once, as the first request would
+    cached = _time_ms(agent.get_react_agent, args.iterations)
+
+    print(f"React agent construction over {args.iterations} requests ({len(agent.mcp_tools)} tools)")
+    _report("rebuild per request", rebuilt)
+    _report("cached on instance", cached)
+    print(f"  saved per request      {statistics.mean(rebuilt) - statistics.mean(cached):8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""Drop-day load test against an in-process ``server.app``.
+
+Boots the real FastAPI app (lifespan included) on an ``httpx`` ASGI transport,
+backed by mongomock-motor (or a local mongod via ``--mongo-url``), a fake
+Stripe client and a fake chat model with configurable latency. Then it drives
+a weighted mix of catalog browse, cart add, checkout and chat traffic, and
+reports throughput and p50/p95/p99 per endpoint.
+
+Run from ``backend/``:
+    python benchmarks/load_test.py --requests 2000 --concurrency 50
+    python benchmarks/load_test.py --json bench.json --baseline main.json --max-regression 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+import httpx
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+# Weighted drop-day traffic mix: (scenario, weight)
+DEFAULT_MIX = (("browse", 60), ("product", 20), ("cart_add", 12), ("checkout", 5), ("chat", 3))
+
+
+class FakeChatModel:
+    # Stands in for ChatOpenAI: fixed latency, canned answer, reported token usage
+
+    def __init__(self, latency: float, answer: str = "The next drop is Friday at 10am."):
+        self.latency = latency
+        self.answer = answer
+
+    async def ainvoke(self, messages, **kwargs):
+        await asyncio.sleep(self.latency)
+        return AIMessage(
+            content=self.answer,
+            usage_metadata={"input_tokens": 40, "output_tokens": 12, "total_tokens": 52},
+        )
+
+    async def astream(self, messages, **kwargs):
+        await asyncio.sleep(self.latency)
+        for word in self.answer.split(" "):
+            yield AIMessageChunk(content=word + " ")
+
+
+class FakeStripeError(Exception):
+    pass
+
+
+def fake_stripe(latency: float) -> SimpleNamespace:
+    # Mirrors the slice of the stripe SDK the server uses; create() blocks like the real one
+    def create(**kwargs):
+        time.sleep(latency)
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        return SimpleNamespace(
+            id=session_id,
+            url=f"https://checkout.stripe.test/{session_id}",
+            expires_at=kwargs["expires_at"],
+        )
+
+    def expire(session_id, **kwargs):
+        time.sleep(latency)
+        return SimpleNamespace(id=session_id, status="expired")
+
+    def retrieve(session_id, **kwargs):
+        return SimpleNamespace(id=session_id, status="expired")
+
+    return SimpleNamespace(
+        checkout=SimpleNamespace(Session=SimpleNamespace(create=create, expire=expire, retrieve=retrieve)),
+        error=SimpleNamespace(StripeError=FakeStripeError),
+        max_network_retries=0,
+        RequestsClient=lambda timeout: SimpleNamespace(timeout=timeout),
+    )
+
+
+def _patch_server(server, mongo_url: Optional[str], stripe_latency: float) -> None:
+    os.environ["MONGO_URL"] = mongo_url or "mongodb://mongomock"
+    os.environ["DB_NAME"] = os.getenv("BENCH_DB_NAME", f"bench_{uuid.uuid4().hex[:8]}")
+    os.environ["STRIPE_SECRET_KEY"] = "sk_test_bench"
+    os.environ["AGENT_CACHE_BACKEND"] = "off"
+
+    if not mongo_url:
+        from mongomock_motor import AsyncMongoMockClient
+
+        def mock_client(url, **kwargs):
+            # Command listeners are a pymongo feature mongomock does not emulate
+            return AsyncMongoMockClient()
+
+        server.AsyncIOMotorClient = mock_client
+
+    server.stripe = fake_stripe(stripe_latency)
+    server.STRIPE_AVAILABLE = True
+
+
+def _product(index: int, stock: int) -> Dict[str, object]:
+    return {
+        "name": f"Bench Runner {index}",
+        "description": "Load test sneaker " * 20,
+        "price": 150.0 + index,
+        "images": [f"https://img.test/{index}/{n}.jpg" for n in range(6)],
+        "category": "sneakers",
+        "color": random.choice(["black", "white", "red", "gold"]),
+        "sizes": [{"size": str(size), "stock": stock} for size in range(7, 13)],
+        "featured": index % 5 == 0,
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, name: str, seconds: float, ok: bool) -> None:
+        self.samples[name].append(seconds * 1000)
+        if not ok:
+            self.errors[name] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        report = {}
+        for name, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+
+            def pct(p: float) -> float:
+                return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+            report[name] = {
+                "requests": len(samples),
+                "errors": self.errors[name],
+                "throughput_rps": len(samples) / elapsed if elapsed else 0.0,
+                "mean_ms": statistics.mean(samples),
+                "p50_ms": pct(0.50),
+                "p95_ms": pct(0.95),
+                "p99_ms": pct(0.99),
+            }
+        return report
+
+
+async def _scenario(name: str, client: httpx.AsyncClient, product_ids: List[str]) -> bool:
+    product_id = random.choice(product_ids)
+    user_id = f"bench-user-{random.randrange(5000)}"
+    size = str(random.randrange(7, 13))
+
+    if name == "browse":
+        response = await client.get("/api/products", params={"limit": 20, "fields": "name,price,images", "max_images": 1})
+    elif name == "product":
+        response = await client.get(f"/api/products/{product_id}")
+    elif name == "cart_add":
+        response = await client.post(
+            "/api/cart/add", json={"user_id": user_id, "product_id": product_id, "size": size, "quantity": 1}
+        )
+    elif name == "checkout":
+        added = await client.post(
+            "/api/cart/add", json={"user_id": user_id, "product_id": product_id, "size": size, "quantity": 1}
+        )
+        if added.status_code != 200:
+            return added.status_code == 409  # sold out is a correct answer under contention
+        response = await client.post(
+            "/api/checkout",
+            json={"user_id": user_id, "cart_items": [added.json()["id"]], "shipping_address": {"city": "Bench"}},
+        )
+        return response.status_code in (200, 409)
+    elif name == "chat":
+        response = await client.post("/api/chat", json={"message": "When is the next drop?", "agent_type": "chat"})
+        return response.status_code == 200 and response.json().get("success", False)
+    else:
+        raise ValueError(f"Unknown scenario {name}")
+    return response.status_code == 200 or (name == "cart_add" and response.status_code == 409)
+
+
+async def run(args) -> Dict[str, Dict[str, float]]:
+    import server
+
+    _patch_server(server, args.mongo_url, args.stripe_latency)
+    random.seed(args.seed)
+    mix = [name for name, weight in DEFAULT_MIX for _ in range(weight)]
+
+    async with server.lifespan(server.app):
+        from ai_agents import ChatAgent
+
+        chat_agent = ChatAgent(server.app.state.agent_config)
+        chat_agent.llm = FakeChatModel(args.llm_latency)
+        await server.app.state.agents.register("chat", chat_agent)
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            product_ids = []
+            for index in range(args.products):
+                created = await client.post("/api/products", json=_product(index, args.stock))
+                created.raise_for_status()
+                product_ids.append(created.json()["id"])
+
+            recorder = Recorder()
+            remaining = args.requests
+
+            async def worker():
+                nonlocal remaining
+                while remaining > 0:
+                    remaining -= 1
+                    name = random.choice(mix)
+                    start = time.perf_counter()
+                    try:
+                        ok = await _scenario(name, client, product_ids)
+                    except Exception:
+                        ok = False
+                    recorder.record(name, time.perf_counter() - start, ok)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+
+            # Oversell check: no size may ever go negative
+            oversold = await server.app.state.db.products.count_documents({"sizes.stock": {"$lt": 0}})
+
+    report = recorder.summary(elapsed)
+    report["_total"] = {
+        "requests": args.requests,
+        "elapsed_s": elapsed,
+        "throughput_rps": args.requests / elapsed if elapsed else 0.0,
+        "oversold_products": oversold,
+    }
+    return report
+
+
+def _print_report(report: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'endpoint':<10} {'reqs':>6} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, row in report.items():
+        if name.startswith("_"):
+            continue
+        print(
+            f"{name:<10} {row['requests']:>6} {row['errors']:>5} {row['throughput_rps']:>8.1f} "
+            f"{row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f}"
+        )
+    total = report["_total"]
+    print(f"\n{total['requests']} requests in {total['elapsed_s']:.2f}s "
+          f"({total['throughput_rps']:.1f} req/s), oversold products: {total['oversold_products']}")
+
+
+def _regressions(report, baseline, max_regression: float) -> List[str]:
+    failures = []
+    for name, row in report.items():
+        base = baseline.get(name)
+        if name.startswith("_") or not base:
+            continue
+        limit = base["p95_ms"] * (1 + max_regression)
+        if row["p95_ms"] > limit:
+            failures.append(f"{name}: p95 {row['p95_ms']:.2f} ms > {limit:.2f} ms (baseline {base['p95_ms']:.2f})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--stock", type=int, default=20, help="units per size; keep low to exercise sell-outs")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--stripe-latency", type=float, default=0.05)
+    parser.add_argument("--mongo-url", help="benchmark against a local mongod instead of mongomock")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="previous --json report to compare p95 against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    _print_report(report)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+    failed = report["_total"]["oversold_products"] > 0
+    if args.baseline:
+        failures = _regressions(report, json.loads(Path(args.baseline).read_text()), args.max_regression)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        failed = failed or bool(failures)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
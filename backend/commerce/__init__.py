@@ -0,0 +1,102 @@
+# Commerce subsystems backing the storefront API
+
+from .bulk_import import import_products, iter_jsonl
+from .catalog_cache import CatalogCache, ListingFilters, ListingKey, watch_catalog_changes
+from .drops import DropScheduler, LaunchSnapshot, is_due, visible_filter
+from .export import export_rows
+from .facets import FacetIndex, FacetQuery, FacetResult
+from .hydration import hydrate_cart_items, load_products
+from .indexes import INDEX_SPECS, IndexSpec, ensure_indexes, index_status
+from .inventory import (
+    InsufficientStockError,
+    ReservationLine,
+    attach_session,
+    commit_by_session,
+    commit_reservation,
+    release_by_session,
+    release_expired,
+    release_reservation,
+    reserve_stock,
+    stripe_session_expires_at,
+)
+from .metrics import Metrics, MetricsMiddleware, MongoCommandListener
+from .notifications import (
+    FileTransport,
+    NotificationDispatcher,
+    NotificationTransport,
+    NotificationsDisabledError,
+    RateLimiter,
+    SMTPTransport,
+    transport_from_env,
+)
+from .pagination import InvalidCursorError, build_projection, decode_cursor, encode_cursor, keyset_filter
+from .pricing import PricedOrder, price_cart, pricing_pipeline
+from .stripe_gateway import StripeGateway, StripeTimeoutError
+from .text_search import SearchHit, SearchResult, TextIndex, tokenize
+from .waiting_room import InvalidQueueTokenError, WaitingRoom, WaitingRoomMiddleware
+from .webhooks import WebhookWorker, complete_checkout, expire_checkout, fulfil_event, record_event
+
+__all__ = [
+    "INDEX_SPECS",
+    "CatalogCache",
+    "DropScheduler",
+    "FacetIndex",
+    "FacetQuery",
+    "FacetResult",
+    "FileTransport",
+    "IndexSpec",
+    "InsufficientStockError",
+    "InvalidCursorError",
+    "InvalidQueueTokenError",
+    "LaunchSnapshot",
+    "ListingFilters",
+    "ListingKey",
+    "Metrics",
+    "MetricsMiddleware",
+    "MongoCommandListener",
+    "NotificationDispatcher",
+    "NotificationTransport",
+    "NotificationsDisabledError",
+    "PricedOrder",
+    "RateLimiter",
+    "ReservationLine",
+    "SMTPTransport",
+    "SearchHit",
+    "SearchResult",
+    "StripeGateway",
+    "StripeTimeoutError",
+    "TextIndex",
+    "WaitingRoom",
+    "WaitingRoomMiddleware",
+    "WebhookWorker",
+    "attach_session",
+    "build_projection",
+    "commit_by_session",
+    "commit_reservation",
+    "complete_checkout",
+    "decode_cursor",
+    "encode_cursor",
+    "ensure_indexes",
+    "expire_checkout",
+    "export_rows",
+    "fulfil_event",
+    "hydrate_cart_items",
+    "import_products",
+    "index_status",
+    "is_due",
+    "iter_jsonl",
+    "keyset_filter",
+    "load_products",
+    "price_cart",
+    "pricing_pipeline",
+    "record_event",
+    "release_by_session",
+    "release_expired",
+    "release_reservation",
+    "reserve_stock",
+    "stripe_session_expires_at",
+    "tokenize",
+    "transport_from_env",
+    "visible_filter",
+    "watch_catalog_changes",
+]
@@ -0,0 +1,145 @@
+"""Streaming bulk product import with unordered ``bulk_write`` batches.
+
+Records arrive as JSON lines. Each record is validated on its own, so a bad row
+is reported instead of failing the whole import. Valid rows are grouped into
+batches of ``BULK_BATCH_SIZE``. Each batch costs one ``find`` (the current
+state of the products it updates) and one unordered ``bulk_write``, however
+many rows it holds.
+"""
+
+import json
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+BULK_BATCH_SIZE = 1000
+# Above this many changed products per batch the whole catalog cache is cleared
+# rather than matched listing by listing
+BULK_INVALIDATE_LIMIT = 200
+
+# validate(record) -> ("create", product_id, document) or ("update", product_id, fields)
+RecordValidator = Callable[[Dict[str, Any]], Tuple[str, str, Dict[str, Any]]]
+
+
+async def iter_jsonl(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield ``(row, record)`` for each non-blank line; ``record`` is a ValueError when unparsable."""
+    buffer = b""
+    row = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                row += 1
+                yield row, _parse_line(line)
+    if buffer.strip():
+        yield row + 1, _parse_line(buffer)
+
+
+def _parse_line(line: bytes) -> Any:
+    try:
+        record = json.loads(line)
+    except ValueError as exc:
+        return ValueError(f"Invalid JSON: {exc}")
+    if not isinstance(record, dict):
+        return ValueError("Each line must be a JSON object")
+    return record
+
+
+def _result(row: int, product_id: Optional[str], status: str, error: Optional[str] = None) -> Dict[str, Any]:
+    result = {"row": row, "id": product_id, "status": status}
+    if error:
+        result["error"] = error
+    return result
+
+
+async def _write_batch(db, batch: List[Tuple[int, str, str, Dict[str, Any]]], cache) -> List[Dict[str, Any]]:
+    update_ids = [product_id for _, action, product_id, _ in batch if action == "update"]
+    existing: Dict[str, dict] = {}
+    if update_ids:
+        async for doc in db.products.find({"id": {"$in": update_ids}}, {"_id": 0}):
+            existing[doc["id"]] = doc
+
+    results: List[Dict[str, Any]] = []
+    ops = []
+    written: List[Tuple[int, str, str, Dict[str, Any]]] = []
+    for row, action, product_id, fields in batch:
+        if action == "create":
+            ops.append(InsertOne(dict(fields)))
+        elif product_id not in existing:
+            results.append(_result(row, product_id, "error", "Product not found"))
+            continue
+        elif fields:
+            ops.append(UpdateOne({"id": product_id}, {"$set": fields}))
+        else:
+            results.append(_result(row, product_id, "unchanged"))
+            continue
+        written.append((row, action, product_id, fields))
+
+    failures: Dict[int, str] = {}
+    if ops:
+        try:
+            await db.products.bulk_write(ops, ordered=False)
+        except BulkWriteError as exc:
+            for error in exc.details.get("writeErrors", []):
+                failures[error["index"]] = error.get("errmsg", "Write failed")
+
+    changed = []
+    for index, (row, action, product_id, fields) in enumerate(written):
+        if index in failures:
+            results.append(_result(row, product_id, "error", failures[index]))
+            continue
+        results.append(_result(row, product_id, "created" if action == "create" else "updated"))
+        before = existing.get(product_id)
+        changed.append((product_id, before, {**before, **fields} if before else fields))
+
+    if cache is not None and changed:
+        if len(changed) > BULK_INVALIDATE_LIMIT:
+            cache.clear()
+        else:
+            for product_id, before, after in changed:
+                cache.invalidate(product_id, before, after)
+
+    results.sort(key=lambda result: result["row"])
+    return results
+
+
+async def import_products(
+    db,
+    records: AsyncIterator[Tuple[int, Any]],
+    validate: RecordValidator,
+    cache=None,
+    batch_size: int = BULK_BATCH_SIZE,
+) -> Dict[str, Any]:
+    """Validate and write ``records``, returning counts and one result per row.
+
+    Creates go in as ``InsertOne`` (the unique ``id`` index rejects duplicates)
+    and updates as ``$set``-only ``UpdateOne``. Writes are unordered, so one
+    failing row never blocks the rest of its batch.
+    """
+    results: List[Dict[str, Any]] = []
+    batch: List[Tuple[int, str, str, Dict[str, Any]]] = []
+
+    async for row, record in records:
+        if isinstance(record, Exception):
+            results.append(_result(row, None, "error", str(record)))
+            continue
+        try:
+            action, product_id, fields = validate(record)
+        except ValueError as exc:
+            results.append(_result(row, record.get("id"), "error", str(exc)))
+            continue
+        batch.append((row, action, product_id, fields))
+        if len(batch) >= batch_size:
+            results.extend(await _write_batch(db, batch, cache))
+            batch = []
+
+    if batch:
+        results.extend(await _write_batch(db, batch, cache))
+
+    results.sort(key=lambda result: result["row"])
+    counts = {status: 0 for status in ("created", "updated", "unchanged", "error")}
+    for result in results:
+        counts[result["status"]] += 1
+    return {**counts, "rows": len(results), "results": results}
@@ -0,0 +1,163 @@
+"""Read-through in-process cache for catalog reads.
+
+Entries are keyed by product id and by the normalized ``get_products`` filter
+tuple. The admin write endpoints invalidate precisely: a product entry is
+dropped together with every cached listing that contained the product or whose
+filters match its old or new state. Stock moved by checkout reservations is not
+invalidated per request; those entries age out after ``ttl_seconds``.
+"""
+
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Hashable, NamedTuple, Optional, Tuple
+
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 10.0
+
+
+class ListingFilters(NamedTuple):
+    category: Optional[str] = None
+    color: Optional[str] = None
+    featured: Optional[bool] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+
+    def matches(self, doc: Dict[str, Any]) -> bool:
+        if self.category is not None and doc.get("category") != self.category:
+            return False
+        if self.color is not None and doc.get("color") != self.color:
+            return False
+        if self.featured is not None and doc.get("featured") != self.featured:
+            return False
+        price = doc.get("price")
+        if self.min_price is not None and (price is None or price < self.min_price):
+            return False
+        if self.max_price is not None and (price is None or price > self.max_price):
+            return False
+        return True
+
+
+class ListingKey(NamedTuple):
+    filters: ListingFilters
+    page: Tuple[Hashable, ...] = ()
+
+
+class _Entry(NamedTuple):
+    value: Any
+    expires_at: float
+    product_ids: FrozenSet[str]
+
+
+class CatalogCache:
+    """Bounded LRU cache with per-entry TTL for product and listing reads."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._products: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._listings: "OrderedDict[ListingKey, _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls) -> "CatalogCache":
+        return cls(
+            max_entries=int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            ttl_seconds=float(os.getenv("CATALOG_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+        )
+
+    def _get(self, store: OrderedDict, key: Hashable) -> Any:
+        entry = store.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            del store[key]
+            self.misses += 1
+            return None
+        store.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def _set(self, store: OrderedDict, key: Hashable, value: Any, product_ids: FrozenSet[str]) -> None:
+        if self.max_entries <= 0:
+            return
+        store[key] = _Entry(value, time.monotonic() + self.ttl_seconds, product_ids)
+        store.move_to_end(key)
+        while len(store) > self.max_entries:
+            store.popitem(last=False)
+
+    def get_product(self, product_id: str) -> Any:
+        return self._get(self._products, product_id)
+
+    def set_product(self, product_id: str, value: Any) -> None:
+        self._set(self._products, product_id, value, frozenset((product_id,)))
+
+    def get_listing(self, key: ListingKey) -> Any:
+        return self._get(self._listings, key)
+
+    def set_listing(self, key: ListingKey, value: Any, product_ids) -> None:
+        self._set(self._listings, key, value, frozenset(product_ids))
+
+    def invalidate(self, product_id: Optional[str], *docs: Optional[Dict[str, Any]]) -> None:
+        """Drop everything a write to ``product_id`` can have changed.
+
+        ``docs`` are the before/after states of the product, when known; any
+        listing whose filters match one of them is dropped as well, since the
+        product may have entered or left that listing.
+        """
+        self.invalidations += 1
+        if product_id is not None:
+            self._products.pop(product_id, None)
+
+        states = [doc for doc in docs if doc]
+        stale = [
+            key
+            for key, entry in self._listings.items()
+            if (product_id is not None and product_id in entry.product_ids)
+            or any(key.filters.matches(doc) for doc in states)
+        ]
+        for key in stale:
+            del self._listings[key]
+
+    def clear(self) -> None:
+        self._products.clear()
+        self._listings.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "products": len(self._products),
+            "listings": len(self._listings),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+async def watch_catalog_changes(db, cache: CatalogCache) -> None:
+    """Invalidate ``cache`` from a ``products`` change stream.
+
+    Keeps several workers coherent with each other's admin writes. Change
+    streams need a replica set; on a standalone server this logs and returns.
+    """
+    try:
+        async with db.products.watch(full_document="updateLookup") as stream:
+            logger.info("Watching products change stream for cache invalidation")
+            async for change in stream:
+                doc = change.get("fullDocument")
+                if doc is None:
+                    # Deletes only carry the Mongo _id, not our product id
+                    cache.clear()
+                else:
+                    cache.invalidate(doc.get("id"), doc)
+    except PyMongoError as exc:
+        logger.warning("Catalog change stream unavailable, relying on local invalidation: %s", exc)
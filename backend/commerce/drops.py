@@ -0,0 +1,147 @@
+"""Scheduled drop launches with a pre-rendered catalog snapshot.
+
+Products created with a future ``publish_at`` are stored with
+``published: False`` and stay out of every public read until launch.
+``DropScheduler`` watches for the next launch time. ``prerender_seconds``
+before it, the scheduler renders the post-launch listings. At the launch
+time it flips every due product with a single ``update_many`` and swaps the
+rendered snapshot into the catalog cache, so the first requests of a drop are
+answered from memory instead of a cold Mongo query.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .catalog_cache import CatalogCache, ListingKey
+
+logger = logging.getLogger(__name__)
+
+
+class LaunchSnapshot(NamedTuple):
+    listings: List[Tuple[ListingKey, Any, List[str]]]  # (key, cached value, product ids)
+    products: Dict[str, Any]
+
+
+SnapshotRenderer = Callable[[datetime], Awaitable[LaunchSnapshot]]
+
+
+def as_utc(value: datetime) -> datetime:
+    # Mongo hands back naive datetimes that are already UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def is_due(publish_at: Optional[datetime], now: Optional[datetime] = None) -> bool:
+    return publish_at is None or as_utc(publish_at) <= (now or datetime.now(timezone.utc))
+
+
+def visible_filter(as_of: Optional[datetime] = None) -> Dict[str, Any]:
+    """Mongo filter for products the public may see, optionally as of a future launch."""
+    if as_of is None:
+        return {"published": {"$ne": False}}
+    return {"$or": [{"published": {"$ne": False}}, {"publish_at": {"$lte": as_of}}]}
+
+
+class DropScheduler:
+    def __init__(
+        self,
+        db,
+        cache: CatalogCache,
+        render: SnapshotRenderer,
+        prerender_seconds: float = 5.0,
+        poll_seconds: float = 30.0,
+    ):
+        self.db = db
+        self.cache = cache
+        self.render = render
+        self.prerender_seconds = prerender_seconds
+        self.poll_seconds = poll_seconds
+        self.launches = 0
+        self.last_launch: Optional[Dict[str, Any]] = None
+        # Awaited after each launch, for state derived from the products collection
+        self.on_launch: Optional[Callable[[], Awaitable[object]]] = None
+        self._wakeup = asyncio.Event()
+
+    @classmethod
+    def from_env(cls, db, cache: CatalogCache, render: SnapshotRenderer) -> "DropScheduler":
+        return cls(
+            db,
+            cache,
+            render,
+            prerender_seconds=float(os.getenv("DROP_PRERENDER_SECONDS", "5")),
+            poll_seconds=float(os.getenv("DROP_POLL_SECONDS", "30")),
+        )
+
+    def wake(self) -> None:
+        """Re-read the schedule now; call after creating or rescheduling a drop."""
+        self._wakeup.set()
+
+    async def _sleep(self, seconds: float) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, seconds))
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def next_launch(self) -> Optional[datetime]:
+        doc = await self.db.products.find_one(
+            {"published": False, "publish_at": {"$ne": None}},
+            {"publish_at": 1},
+            sort=[("publish_at", 1)],
+        )
+        return as_utc(doc["publish_at"]) if doc else None
+
+    async def launch(self, launch_at: datetime, snapshot: Optional[LaunchSnapshot] = None) -> int:
+        """Publish every product due at ``launch_at`` and install ``snapshot``."""
+        result = await self.db.products.update_many(
+            {"published": False, "publish_at": {"$lte": launch_at}},
+            {"$set": {"published": True}},
+        )
+        self.cache.clear()
+        if snapshot is not None:
+            for key, value, product_ids in snapshot.listings:
+                self.cache.set_listing(key, value, product_ids)
+            for product_id, product in snapshot.products.items():
+                self.cache.set_product(product_id, product)
+        if self.on_launch is not None:
+            await self.on_launch()
+
+        self.launches += 1
+        self.last_launch = {
+            "launch_at": launch_at.isoformat(),
+            "launched_at": datetime.now(timezone.utc).isoformat(),
+            "published": result.modified_count,
+            "prerendered_listings": len(snapshot.listings) if snapshot else 0,
+        }
+        logger.info(f"Drop launched: {result.modified_count} products published at {launch_at.isoformat()}")
+        return result.modified_count
+
+    async def run(self) -> None:
+        while True:
+            try:
+                launch_at = await self.next_launch()
+                lead = None
+                if launch_at is not None:
+                    lead = (launch_at - datetime.now(timezone.utc)).total_seconds() - self.prerender_seconds
+                if lead is None or lead > 0:
+                    await self._sleep(self.poll_seconds if lead is None else min(lead, self.poll_seconds))
+                    continue
+
+                snapshot = await self.render(launch_at)
+                await asyncio.sleep(max(0.0, (launch_at - datetime.now(timezone.utc)).total_seconds()))
+                await self.launch(launch_at, snapshot)
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # pragma: no cover - keep the schedule alive on transient errors
+                logger.exception("Drop scheduler iteration failed")
+                await self._sleep(self.poll_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "launches": self.launches,
+            "last_launch": self.last_launch,
+            "prerender_seconds": self.prerender_seconds,
+            "poll_seconds": self.poll_seconds,
+        }
@@ -0,0 +1,48 @@
+"""Constant-memory NDJSON/CSV export of Mongo cursors."""
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Sequence
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_cell(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_default, separators=(",", ":"))
+    return "" if value is None else value
+
+
+def _csv_row(values: Sequence[Any]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+async def export_rows(cursor, export_format: str, columns: Sequence[str]) -> AsyncIterator[str]:
+    """Yield one encoded line per document as the cursor produces them.
+
+    Only the current Motor batch is held in memory, so export size does not
+    depend on collection size. ``columns`` fixes the CSV header and the
+    NDJSON field order.
+    """
+    if export_format == "csv":
+        yield _csv_row(columns)
+
+    async for doc in cursor:
+        if export_format == "csv":
+            yield _csv_row([_csv_cell(doc.get(column)) for column in columns])
+        else:
+            row: Dict[str, Any] = {column: doc.get(column) for column in columns}
+            yield json.dumps(row, default=_json_default) + "\n"
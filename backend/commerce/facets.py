@@ -0,0 +1,303 @@
+"""In-process faceted index over the product catalog.
+
+Each product gets a row number. Categorical attributes (category, color,
+in-stock size, featured, visibility) map each value to a bitmap of rows; a
+Python int serves as an arbitrary-length bitset. A filter combination is the
+AND of per-facet ORs. Facet counts are popcounts of each value's bitmap
+against the other facets' filters, so a selected value never hides its
+siblings.
+
+Price and recency are ordered columns cut into blocks of ``BLOCK`` rows, with
+prefix bitmaps per block. A price range becomes a mask with two prefix
+lookups. A page of newest-first results skips whole blocks by popcount.
+Neither needs a per-row Python loop over the catalog.
+
+The index holds the product documents themselves, so browse requests never
+touch Mongo. Admin writes update single rows. Stock moved by checkouts is
+picked up by the periodic ``refresh`` (or a change stream).
+"""
+
+import bisect
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .drops import as_utc
+
+BLOCK = 64
+
+
+class FacetQuery(NamedTuple):
+    categories: Tuple[str, ...] = ()
+    colors: Tuple[str, ...] = ()
+    sizes: Tuple[str, ...] = ()  # in stock in any of these sizes
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    in_stock: Optional[bool] = None
+    featured: Optional[bool] = None
+
+
+class FacetResult(NamedTuple):
+    total: int
+    items: List[Dict[str, Any]]
+    facets: Dict[str, Any]
+
+
+class _OrderedRows:
+    """Rows sorted by a key, with per-block and prefix bitmaps."""
+
+    def __init__(self, rows: List[int], keys: List[Any]):
+        self.rows = rows
+        self.keys = keys
+        self.blocks: List[int] = []
+        self.prefix: List[int] = [0]  # prefix[j] = rows in blocks[:j]
+        for start in range(0, len(rows), BLOCK):
+            bitmap = 0
+            for row in rows[start:start + BLOCK]:
+                bitmap |= 1 << row
+            self.blocks.append(bitmap)
+            self.prefix.append(self.prefix[-1] | bitmap)
+
+    def _rows_mask(self, start: int, stop: int) -> int:
+        mask = 0
+        for row in self.rows[start:stop]:
+            mask |= 1 << row
+        return mask
+
+    def range_mask(self, start: int, stop: int) -> int:
+        """Bitmap of the rows at sorted positions ``[start, stop)``."""
+        first_full = -(-start // BLOCK)
+        last_full = stop // BLOCK
+        if first_full >= last_full:
+            return self._rows_mask(start, stop)
+        return (
+            (self.prefix[last_full] & ~self.prefix[first_full])
+            | self._rows_mask(start, first_full * BLOCK)
+            | self._rows_mask(last_full * BLOCK, stop)
+        )
+
+    def take(self, mask: int, offset: int, limit: Optional[int]) -> List[int]:
+        """Rows of ``mask`` in sorted order, skipping ``offset`` and returning up to ``limit``."""
+        found: List[int] = []
+        for index, block in enumerate(self.blocks):
+            hits = block & mask
+            if not hits:
+                continue
+            count = hits.bit_count()
+            if offset >= count:
+                offset -= count
+                continue
+            for row in self.rows[index * BLOCK:(index + 1) * BLOCK]:
+                if hits >> row & 1:
+                    if offset:
+                        offset -= 1
+                    else:
+                        found.append(row)
+                        if limit is not None and len(found) >= limit:
+                            return found
+        return found
+
+    def first_key(self, mask: int, reverse: bool = False) -> Any:
+        indexes = range(len(self.blocks) - 1, -1, -1) if reverse else range(len(self.blocks))
+        for index in indexes:
+            hits = self.blocks[index] & mask
+            if not hits:
+                continue
+            positions = range(index * BLOCK, min((index + 1) * BLOCK, len(self.rows)))
+            for position in reversed(positions) if reverse else positions:
+                if hits >> self.rows[position] & 1:
+                    return self.keys[position]
+        return None
+
+
+def _any_of(bitmaps: Dict[str, int], values: Sequence[str], everything: int) -> int:
+    if not values:
+        return everything
+    mask = 0
+    for value in values:
+        mask |= bitmaps.get(value, 0)
+    return mask
+
+
+def _newest_first_key(doc: Dict[str, Any]) -> Tuple[float, str]:
+    created_at = doc.get("created_at")
+    timestamp = as_utc(created_at).timestamp() if isinstance(created_at, datetime) else 0.0
+    return -timestamp, doc["id"]
+
+
+def _in_stock_sizes(doc: Dict[str, Any]) -> List[str]:
+    return [entry["size"] for entry in doc.get("sizes") or [] if entry.get("stock", 0) > 0]
+
+
+class FacetIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+        self.refreshes = 0
+        self.updates = 0
+
+    def _reset(self) -> None:
+        self._row_of: Dict[str, int] = {}
+        self._docs: List[Optional[Dict[str, Any]]] = []
+        self._prices: List[float] = []
+        self._free: List[int] = []
+        self._live = 0
+        self._visible = 0
+        self._featured = 0
+        self._in_stock = 0
+        self._category: Dict[str, int] = defaultdict(int)
+        self._color: Dict[str, int] = defaultdict(int)
+        self._size: Dict[str, int] = defaultdict(int)
+        self._by_price: Optional[_OrderedRows] = None
+        self._by_recency: Optional[_OrderedRows] = None
+
+    # Maintenance
+
+    def _flip(self, row: int, doc: Dict[str, Any], on: bool) -> None:
+        bit = 1 << row
+
+        def apply(value: int) -> int:
+            return value | bit if on else value & ~bit
+
+        self._live = apply(self._live)
+        if doc.get("published", True):
+            self._visible = apply(self._visible)
+        if doc.get("featured"):
+            self._featured = apply(self._featured)
+        sizes = _in_stock_sizes(doc)
+        if sizes:
+            self._in_stock = apply(self._in_stock)
+        for size in sizes:
+            self._size[size] = apply(self._size[size])
+        self._category[doc.get("category")] = apply(self._category[doc.get("category")])
+        self._color[doc.get("color")] = apply(self._color[doc.get("color")])
+        # Ordered columns are rebuilt on the next query
+        self._by_price = None
+        self._by_recency = None
+
+    def _remove_locked(self, product_id: str) -> None:
+        row = self._row_of.pop(product_id, None)
+        if row is None:
+            return
+        self._flip(row, self._docs[row], on=False)
+        self._docs[row] = None
+        self._free.append(row)
+
+    def upsert(self, doc: Dict[str, Any]) -> None:
+        doc = {key: value for key, value in doc.items() if key != "_id"}
+        with self._lock:
+            self._remove_locked(doc["id"])
+            if self._free:
+                row = self._free.pop()
+                self._docs[row] = doc
+                self._prices[row] = float(doc.get("price", 0.0))
+            else:
+                row = len(self._docs)
+                self._docs.append(doc)
+                self._prices.append(float(doc.get("price", 0.0)))
+            self._row_of[doc["id"]] = row
+            self._flip(row, doc, on=True)
+            self.updates += 1
+
+    def remove(self, product_id: str) -> None:
+        with self._lock:
+            self._remove_locked(product_id)
+            self.updates += 1
+
+    def load(self, docs: Iterable[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._reset()
+        for doc in docs:
+            self.upsert(doc)
+
+    async def refresh(self, db) -> int:
+        """Rebuild from Mongo into a fresh index and swap it in."""
+        fresh = FacetIndex()
+        fresh.load(await db.products.find({}, {"_id": 0}).to_list(None))
+        fresh._ordered()
+        with self._lock:
+            for name in (
+                "_row_of", "_docs", "_prices", "_free", "_live", "_visible", "_featured",
+                "_in_stock", "_category", "_color", "_size", "_by_price", "_by_recency",
+            ):
+                setattr(self, name, getattr(fresh, name))
+            self.refreshes += 1
+        return len(fresh._row_of)
+
+    def _ordered(self) -> Tuple[_OrderedRows, _OrderedRows]:
+        if self._by_price is None:
+            rows = sorted(self._row_of.values(), key=self._prices.__getitem__)
+            self._by_price = _OrderedRows(rows, [self._prices[row] for row in rows])
+        if self._by_recency is None:
+            rows = sorted(self._row_of.values(), key=lambda row: _newest_first_key(self._docs[row]))
+            self._by_recency = _OrderedRows(rows, rows)
+        return self._by_price, self._by_recency
+
+    # Queries
+
+    def search(self, query: FacetQuery, offset: int = 0, limit: Optional[int] = None) -> FacetResult:
+        """Filter, count facets and page through matches, newest first."""
+        with self._lock:
+            by_price, by_recency = self._ordered()
+            base = self._visible & self._live
+
+            price_mask = base
+            if query.min_price is not None or query.max_price is not None:
+                start = 0 if query.min_price is None else bisect.bisect_left(by_price.keys, query.min_price)
+                stop = len(by_price.keys) if query.max_price is None else bisect.bisect_right(
+                    by_price.keys, query.max_price
+                )
+                price_mask = by_price.range_mask(start, stop)
+
+            masks = {
+                "category": _any_of(self._category, query.categories, base),
+                "color": _any_of(self._color, query.colors, base),
+                "size": _any_of(self._size, query.sizes, base),
+                "price": price_mask,
+                "in_stock": base if query.in_stock is None else (
+                    self._in_stock if query.in_stock else base & ~self._in_stock
+                ),
+                "featured": base if query.featured is None else (
+                    self._featured if query.featured else base & ~self._featured
+                ),
+            }
+
+            def without(facet: str) -> int:
+                mask = base
+                for name, value in masks.items():
+                    if name != facet:
+                        mask &= value
+                return mask
+
+            matched = without("")
+            unpriced = without("price")
+            facets = {
+                "category": self._counts(self._category, without("category")),
+                "color": self._counts(self._color, without("color")),
+                "size": self._counts(self._size, without("size")),
+                "in_stock": (self._in_stock & without("in_stock")).bit_count(),
+                "featured": (self._featured & without("featured")).bit_count(),
+                "price": {"min": by_price.first_key(unpriced), "max": by_price.first_key(unpriced, reverse=True)},
+            }
+            items = [self._docs[row] for row in by_recency.take(matched, offset, limit)]
+        return FacetResult(matched.bit_count(), items, facets)
+
+    @staticmethod
+    def _counts(bitmaps: Dict[Any, int], mask: int) -> Dict[str, int]:
+        counts = {}
+        for value, bitmap in bitmaps.items():
+            count = (bitmap & mask).bit_count()
+            if count and value is not None:
+                counts[value] = count
+        return dict(sorted(counts.items()))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "products": len(self._row_of),
+                "visible": (self._visible & self._live).bit_count(),
+                "rows": len(self._docs),
+                "refreshes": self.refreshes,
+                "updates": self.updates,
+            }
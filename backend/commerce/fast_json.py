@@ -0,0 +1,111 @@
+"""Opt-in orjson response path for list endpoints.
+
+By default, a list endpoint builds a Pydantic model per Mongo document, and
+FastAPI then validates every model again against ``response_model`` before
+encoding it with the stock JSON encoder. With ``FAST_JSON_RESPONSES=1`` (and
+orjson installed), the endpoints use ``documents_response`` instead:
+
+- trusted documents (written by this API through the same models) are only
+  reshaped to the model's fields, with no validation at all;
+- untrusted documents are validated once.
+
+Either way the result is encoded by orjson, and ``response_model`` still
+documents the schema in OpenAPI.
+"""
+
+import copy
+import os
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Type
+
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+_MISSING = object()
+_IMMUTABLE = (str, int, float, bool, bytes, type(None), tuple, frozenset)
+
+
+def fast_json_enabled() -> bool:
+    return ORJSON_AVAILABLE and os.getenv("FAST_JSON_RESPONSES", "").lower() in ("1", "true", "yes")
+
+
+def dumps(content: Any) -> bytes:
+    # Pydantic writes UTC as "Z" rather than "+00:00"; naive datetimes stay naive in both
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+
+
+class FastJSONResponse(Response):
+    """``ORJSONResponse`` that also passes through pre-encoded bytes."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+@lru_cache(maxsize=None)
+def _field_defaults(model: Type[BaseModel]) -> Tuple[Tuple[str, Callable[[Dict[str, Any]], Any]], ...]:
+    """Per-field default makers for ``model``, resolved once.
+
+    ``FieldInfo.get_default`` inspects the factory's signature on every call,
+    which costs more than validating the document when many fields are missing.
+    """
+    defaults = []
+    for name, field in model.model_fields.items():
+        factory = field.default_factory
+        if factory is None:
+            default = field.default
+            if isinstance(default, _IMMUTABLE):
+                make = lambda shaped, default=default: default
+            else:
+                make = lambda shaped, default=default: copy.deepcopy(default)
+        elif getattr(field, "default_factory_takes_validated_data", False):
+            make = factory
+        else:
+            make = lambda shaped, factory=factory: factory()
+        defaults.append((name, make))
+    return tuple(defaults)
+
+
+def shape_document(model: Type[BaseModel], doc: Mapping[str, Any]) -> Dict[str, Any]:
+    """Keep ``model``'s fields from a trusted document, filling in defaults for missing ones.
+
+    Mongo's ``_id`` and any other extra keys are dropped, just as response_model
+    validation would drop them.
+    """
+    shaped = {}
+    for name, make_default in _field_defaults(model):
+        value = doc.get(name, _MISSING)
+        shaped[name] = make_default(shaped) if value is _MISSING else value
+    return shaped
+
+
+def encode_documents(
+    model: Type[BaseModel],
+    docs: Iterable[Mapping[str, Any]],
+    trusted: bool = True,
+) -> bytes:
+    if trusted:
+        items: List[Dict[str, Any]] = [shape_document(model, doc) for doc in docs]
+    else:
+        items = [model.model_validate(doc).model_dump() for doc in docs]
+    return dumps(items)
+
+
+def documents_response(
+    model: Type[BaseModel],
+    docs: Iterable[Mapping[str, Any]],
+    trusted: bool = True,
+    headers: Optional[Mapping[str, str]] = None,
+) -> FastJSONResponse:
+    return FastJSONResponse(content=encode_documents(model, docs, trusted), headers=headers)
@@ -0,0 +1,26 @@
+"""Batched loading of the products that cart lines reference."""
+
+from typing import Dict, Iterable, List, Tuple
+
+
+async def load_products(db, product_ids: Iterable[str]) -> Dict[str, dict]:
+    """Fetch every referenced product with one ``$in`` query, keyed by product id."""
+    ids = list(dict.fromkeys(product_ids))
+    if not ids:
+        return {}
+    products = await db.products.find({"id": {"$in": ids}}).to_list(len(ids))
+    return {product["id"]: product for product in products}
+
+
+async def hydrate_cart_items(db, cart_items: List[dict]) -> List[Tuple[dict, dict]]:
+    """Join cart items with their products in memory.
+
+    Items whose product no longer exists are dropped, matching the behaviour of
+    the previous per-item lookups.
+    """
+    products = await load_products(db, (item["product_id"] for item in cart_items))
+    return [
+        (item, products[item["product_id"]])
+        for item in cart_items
+        if item["product_id"] in products
+    ]
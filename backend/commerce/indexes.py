@@ -0,0 +1,175 @@
+"""Declarative MongoDB indexes for every collection the API queries."""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    collection: str
+    keys: Tuple[Tuple[str, int], ...]
+    name: str
+    unique: bool = False
+    options: Dict[str, object] = field(default_factory=dict, hash=False)
+    reason: str = ""
+
+
+def _spec(collection: str, keys: Sequence[Tuple[str, int]], name: str, reason: str, **options) -> IndexSpec:
+    unique = bool(options.pop("unique", False))
+    return IndexSpec(collection, tuple(keys), name, unique, options, reason)
+
+
+# Single source of truth for the indexes each endpoint relies on
+INDEX_SPECS: List[IndexSpec] = [
+    _spec("products", [("id", ASCENDING)], "products_id", "get/update/delete product, cart hydration", unique=True),
+    _spec(
+        "products",
+        [("created_at", DESCENDING), ("id", DESCENDING)],
+        "products_created_at_id",
+        "get_products sort and keyset pagination",
+    ),
+    _spec(
+        "products",
+        [("featured", ASCENDING), ("created_at", DESCENDING)],
+        "products_featured_created_at",
+        "featured products on the home page",
+    ),
+    _spec(
+        "products",
+        [("published", ASCENDING), ("publish_at", ASCENDING)],
+        "products_published_publish_at",
+        "drop scheduler next launch",
+    ),
+    _spec("cart_items", [("id", ASCENDING)], "cart_items_id", "remove/update cart item, checkout", unique=True),
+    _spec(
+        "cart_items",
+        [("user_id", ASCENDING), ("product_id", ASCENDING), ("size", ASCENDING)],
+        "cart_items_line",
+        "one cart line per (user, product, size); get_cart by user",
+        unique=True,
+    ),
+    _spec("orders", [("id", ASCENDING)], "orders_id", "order lookups", unique=True),
+    _spec(
+        "orders",
+        [("stripe_payment_id", ASCENDING)],
+        "orders_stripe_payment_id",
+        "stripe webhook and checkout cancel",
+        partialFilterExpression={"stripe_payment_id": {"$type": "string"}},
+    ),
+    _spec(
+        "orders",
+        [("user_id", ASCENDING), ("created_at", DESCENDING)],
+        "orders_user_created_at",
+        "get_user_orders",
+    ),
+    _spec("orders", [("created_at", DESCENDING)], "orders_created_at", "get_all_orders"),
+    _spec("drops_subscribers", [("email", ASCENDING)], "drops_subscribers_email", "subscribe_to_drops", unique=True),
+    _spec(
+        "drops_subscribers",
+        [("subscribed_at", DESCENDING)],
+        "drops_subscribers_subscribed_at",
+        "get_drops_subscribers",
+    ),
+    _spec(
+        "drops_subscribers",
+        [("subscribed_at", ASCENDING), ("id", ASCENDING)],
+        "drops_subscribers_subscribed_at_id",
+        "drop notification cursor and checkpoints",
+    ),
+    _spec("drop_campaigns", [("id", ASCENDING)], "drop_campaigns_id", "drop notification progress", unique=True),
+    _spec(
+        "drop_campaigns",
+        [("status", ASCENDING), ("lease_expires_at", ASCENDING)],
+        "drop_campaigns_status_lease_expires_at",
+        "claiming running campaigns with expired leases",
+    ),
+    _spec("stripe_events", [("id", ASCENDING)], "stripe_events_id", "webhook deduplication", unique=True),
+    _spec(
+        "stripe_events",
+        [("status", ASCENDING), ("received_at", ASCENDING)],
+        "stripe_events_status_received_at",
+        "requeue of pending webhook events",
+    ),
+    _spec(
+        "stripe_events",
+        [("status", ASCENDING), ("lease_expires_at", ASCENDING)],
+        "stripe_events_status_lease_expires_at",
+        "requeue of webhook events with expired leases",
+    ),
+    _spec("stock_reservations", [("id", ASCENDING)], "stock_reservations_id", "reservation release", unique=True),
+    _spec(
+        "stock_reservations",
+        [("stripe_session_id", ASCENDING)],
+        "stock_reservations_session",
+        "commit/release by Stripe session",
+    ),
+    _spec(
+        "stock_reservations",
+        [("status", ASCENDING), ("expires_at", ASCENDING)],
+        "stock_reservations_status_expires_at",
+        "expired reservation sweeper",
+    ),
+    _spec("waiting_rooms", [("drop_id", ASCENDING)], "waiting_rooms_drop_id", "waiting room open/join", unique=True),
+    _spec(
+        "waiting_room_tickets",
+        [("drop_id", ASCENDING), ("opened_at", ASCENDING), ("user_id", ASCENDING)],
+        "waiting_room_tickets_user",
+        "one waiting room ticket per user per opening",
+        unique=True,
+    ),
+]
+
+
+async def ensure_indexes(db, specs: Optional[List[IndexSpec]] = None) -> List[Dict[str, object]]:
+    """Create every declared index. Safe to run on every startup.
+
+    ``create_index`` is a no-op when an identical index already exists. A failure
+    (for example duplicate keys blocking a unique index) is logged and reported
+    rather than aborting startup.
+    """
+    report = []
+    for spec in specs if specs is not None else INDEX_SPECS:
+        entry = {"collection": spec.collection, "name": spec.name, "unique": spec.unique}
+        try:
+            await db[spec.collection].create_index(
+                list(spec.keys), name=spec.name, unique=spec.unique, **spec.options
+            )
+            entry["state"] = "ready"
+        except PyMongoError as exc:
+            logger.error("Failed to build index %s.%s: %s", spec.collection, spec.name, exc)
+            entry["state"] = "failed"
+            entry["error"] = str(exc)
+        report.append(entry)
+
+    ready = sum(1 for entry in report if entry["state"] == "ready")
+    logger.info("Index bootstrap complete: %s/%s ready", ready, len(report))
+    return report
+
+
+async def index_status(db, specs: Optional[List[IndexSpec]] = None) -> List[Dict[str, object]]:
+    """Compare the declared indexes with what the server currently has."""
+    specs = specs if specs is not None else INDEX_SPECS
+    existing: Dict[str, Dict[str, dict]] = {}
+
+    for collection in {spec.collection for spec in specs}:
+        info = await db[collection].index_information()
+        existing[collection] = info
+
+    status = []
+    for spec in specs:
+        present = existing[spec.collection].get(spec.name)
+        status.append({
+            "collection": spec.collection,
+            "name": spec.name,
+            "keys": [list(key) for key in spec.keys],
+            "unique": spec.unique,
+            "state": "ready" if present else "missing",
+            "reason": spec.reason,
+        })
+    return status
@@ -0,0 +1,251 @@
+"""Atomic per-size stock reservations for drop-time checkout.
+
+A reservation is written before any stock is taken, as ``pending`` with the
+lines it intends to take, and each line is recorded under ``taken`` as soon as
+its decrement succeeds. If the process dies mid-way, the expiry sweeper finds
+the pending reservation and puts the taken lines back, so stock is never lost
+without a reservation that accounts for it.
+"""
+
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESERVATION_TTL_SECONDS = 1800
+STRIPE_MIN_SESSION_SECONDS = 1800  # Stripe rejects sessions expiring sooner than this
+STRIPE_EXPIRY_MARGIN_SECONDS = 120  # covers pool wait and network time before Stripe sees the request
+SESSION_RELEASE_GRACE_SECONDS = 300  # a payment completing right at expiry still finds its stock held
+
+RESERVATION_PENDING = "pending"
+RESERVATION_HELD = "held"
+RESERVATION_COMMITTED = "committed"
+RESERVATION_RELEASED = "released"
+RESERVATION_REACQUIRING = "reacquiring"
+
+
+class InsufficientStockError(Exception):
+    """Raised when a line item cannot be reserved because the size is sold out."""
+
+    def __init__(self, product_id: str, size: str, quantity: int):
+        self.product_id = product_id
+        self.size = size
+        self.quantity = quantity
+        super().__init__(f"Insufficient stock for product {product_id} size {size} (requested {quantity})")
+
+
+@dataclass
+class ReservationLine:
+    product_id: str
+    size: str
+    quantity: int
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"product_id": self.product_id, "size": self.size, "quantity": self.quantity}
+
+
+def reservation_ttl_seconds() -> int:
+    try:
+        return int(os.getenv("RESERVATION_TTL_SECONDS", DEFAULT_RESERVATION_TTL_SECONDS))
+    except ValueError:
+        return DEFAULT_RESERVATION_TTL_SECONDS
+
+
+async def _decrement(db, line: ReservationLine) -> bool:
+    # One conditional update per line: the filter only matches while the size still
+    # has enough stock, so concurrent checkouts can never drive it below zero.
+    result = await db.products.update_one(
+        {
+            "id": line.product_id,
+            "published": {"$ne": False},  # scheduled drops cannot be reserved before launch
+            "sizes": {"$elemMatch": {"size": line.size, "stock": {"$gte": line.quantity}}},
+        },
+        {"$inc": {"sizes.$.stock": -line.quantity}},
+    )
+    return result.modified_count == 1
+
+
+async def _restore(db, lines: List[ReservationLine]) -> None:
+    for line in lines:
+        await db.products.update_one(
+            {"id": line.product_id, "sizes.size": line.size},
+            {"$inc": {"sizes.$.stock": line.quantity}},
+        )
+
+
+async def reserve_stock(
+    db,
+    user_id: str,
+    lines: List[ReservationLine],
+    ttl_seconds: Optional[int] = None,
+) -> Dict[str, object]:
+    """Decrement stock for every line and record a TTL-bound reservation.
+
+    Either all lines are reserved or none are: if any size is sold out, or
+    anything else interrupts the loop, the lines already taken are put back and
+    the error is re-raised (``InsufficientStockError`` for a sold-out size).
+    """
+    ttl = ttl_seconds if ttl_seconds is not None else reservation_ttl_seconds()
+    now = datetime.now(timezone.utc)
+    reservation = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "items": [line.to_dict() for line in lines],
+        "taken": [],
+        "status": RESERVATION_PENDING,
+        "stripe_session_id": None,
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=ttl),
+    }
+    await db.stock_reservations.insert_one(dict(reservation))
+
+    try:
+        for line in lines:
+            if not await _decrement(db, line):
+                raise InsufficientStockError(line.product_id, line.size, line.quantity)
+            await db.stock_reservations.update_one(
+                {"id": reservation["id"]}, {"$push": {"taken": line.to_dict()}}
+            )
+    except BaseException:
+        # Cancellation included; if this cleanup is cut short too, the sweeper finishes it
+        await _release(db, {"id": reservation["id"]}, RESERVATION_PENDING)
+        raise
+
+    held = await _transition(db, {"id": reservation["id"]}, RESERVATION_HELD, RESERVATION_PENDING)
+    if held is None:
+        raise RuntimeError(f"Reservation {reservation['id']} expired before it was held")
+    reservation.update(taken=reservation["items"], status=RESERVATION_HELD)
+    return reservation
+
+
+def stripe_session_expires_at(reservation: Dict[str, object], now: Optional[datetime] = None) -> datetime:
+    """Expiry to send to Stripe: the reservation's own, but never under Stripe's minimum.
+
+    Call it just before the request leaves, not when the stock is reserved.
+    """
+    now = now or datetime.now(timezone.utc)
+    earliest = now + timedelta(seconds=STRIPE_MIN_SESSION_SECONDS + STRIPE_EXPIRY_MARGIN_SECONDS)
+    return max(reservation["expires_at"], earliest)
+
+
+async def attach_session(
+    db,
+    reservation_id: str,
+    stripe_session_id: str,
+    session_expires_at: datetime,
+) -> bool:
+    """Link a held reservation to its Stripe session and hold it until the session expires.
+
+    The stock is released ``SESSION_RELEASE_GRACE_SECONDS`` after the session's own
+    expiry, so it can never be released while Stripe would still take the payment.
+    Returns False if the reservation was already released.
+    """
+    result = await db.stock_reservations.update_one(
+        {"id": reservation_id, "status": RESERVATION_HELD},
+        {"$set": {
+            "stripe_session_id": stripe_session_id,
+            "stripe_expires_at": session_expires_at,
+            "expires_at": session_expires_at + timedelta(seconds=SESSION_RELEASE_GRACE_SECONDS),
+        }},
+    )
+    return result.modified_count == 1
+
+
+async def _transition(
+    db,
+    query: Dict[str, object],
+    status: str,
+    from_status: str = RESERVATION_HELD,
+) -> Optional[Dict[str, object]]:
+    # The held -> X transition is a single atomic update, so a reservation is
+    # released or committed exactly once even if expiry, cancel and webhook race.
+    return await db.stock_reservations.find_one_and_update(
+        {**query, "status": from_status},
+        {"$set": {"status": status, "updated_at": datetime.now(timezone.utc)}},
+    )
+
+
+async def _release(db, query: Dict[str, object], from_status: str = RESERVATION_HELD) -> bool:
+    reservation = await _transition(db, query, RESERVATION_RELEASED, from_status)
+    if not reservation:
+        return False
+    # A pending reservation only gives back what it actually took
+    taken = reservation.get("taken", reservation["items"])
+    await _restore(db, [ReservationLine(**item) for item in taken])
+    return True
+
+
+async def release_reservation(db, reservation_id: str) -> bool:
+    """Return a held reservation's stock to the product sizes."""
+    return await _release(db, {"id": reservation_id})
+
+
+async def release_by_session(db, stripe_session_id: str) -> bool:
+    return await _release(db, {"stripe_session_id": stripe_session_id})
+
+
+async def commit_reservation(db, reservation_id: str) -> bool:
+    """Mark a held reservation committed, for an order that is settled without a Stripe session."""
+    return await _transition(db, {"id": reservation_id}, RESERVATION_COMMITTED) is not None
+
+
+async def commit_by_session(db, stripe_session_id: str) -> bool:
+    """Mark the reservation for a paid session as committed; stock stays decremented."""
+    reservation = await _transition(db, {"stripe_session_id": stripe_session_id}, RESERVATION_COMMITTED)
+    return reservation is not None
+
+
+async def reacquire_released(db, stripe_session_id: str) -> bool:
+    """Take stock again for a released reservation whose session was paid after all.
+
+    All lines are decremented or none are, as in ``reserve_stock``. On success the
+    reservation ends up committed; on failure it stays released.
+    """
+    reservation = await db.stock_reservations.find_one_and_update(
+        {"stripe_session_id": stripe_session_id, "status": RESERVATION_RELEASED},
+        {"$set": {"status": RESERVATION_REACQUIRING, "updated_at": datetime.now(timezone.utc)}},
+    )
+    if not reservation:
+        return False
+
+    lines = [ReservationLine(**item) for item in reservation["items"]]
+    taken: List[ReservationLine] = []
+    status = RESERVATION_COMMITTED
+    for line in lines:
+        if not await _decrement(db, line):
+            await _restore(db, taken)
+            status = RESERVATION_RELEASED
+            break
+        taken.append(line)
+
+    await db.stock_reservations.update_one(
+        {"id": reservation["id"]},
+        {"$set": {"status": status, "updated_at": datetime.now(timezone.utc)}},
+    )
+    return status == RESERVATION_COMMITTED
+
+
+async def release_expired(db, limit: int = 500) -> int:
+    """Release held reservations whose TTL has elapsed. Returns the number released.
+
+    Pending reservations past their expiry belong to a checkout that died while
+    taking stock; whatever they took is returned too.
+    """
+    now = datetime.now(timezone.utc)
+    cursor = db.stock_reservations.find(
+        {"status": {"$in": [RESERVATION_HELD, RESERVATION_PENDING]}, "expires_at": {"$lt": now}},
+        {"id": 1, "status": 1},
+    ).limit(limit)
+
+    released = 0
+    async for doc in cursor:
+        if await _release(db, {"id": doc["id"]}, doc["status"]):
+            released += 1
+
+    if released:
+        logger.info("Released %s expired stock reservations", released)
+    return released
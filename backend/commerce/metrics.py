@@ -0,0 +1,270 @@
+"""Prometheus text-format metrics for routes, MongoDB, LLM and Stripe calls.
+
+``MetricsMiddleware`` times every request and, through a context variable,
+collects the MongoDB commands each request issues. The commands are reported
+by ``MongoCommandListener``, a pymongo command listener. Motor propagates
+context variables into its executor threads, so commands are attributed to the
+request that awaited them. A per-route histogram of Mongo operations per
+request makes N+1 query patterns stand out.
+"""
+
+import contextvars
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List[float]] = {}  # bucket counts + [sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class GaugeCallback:
+    """Gauge whose samples are read from ``collect`` at scrape time."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], Iterable[Tuple[LabelValues, float]]],
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for key, value in self.collect():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class RequestStats:
+    __slots__ = ("mongo_ops", "mongo_seconds")
+
+    def __init__(self):
+        self.mongo_ops = 0
+        self.mongo_seconds = 0.0
+
+
+_current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "metrics_current_request", default=None
+)
+
+
+class Metrics:
+    def __init__(self):
+        self.http_requests = Counter(
+            "http_requests_total", "HTTP requests by route, method and status.", ("route", "method", "status")
+        )
+        self.http_latency = Histogram(
+            "http_request_duration_seconds", "HTTP request latency by route.", ("route", "method")
+        )
+        self.request_mongo_ops = Histogram(
+            "http_request_mongo_operations",
+            "MongoDB commands issued per HTTP request.",
+            ("route", "method"),
+            buckets=COUNT_BUCKETS,
+        )
+        self.request_mongo_time = Histogram(
+            "http_request_mongo_duration_seconds",
+            "Total MongoDB time per HTTP request.",
+            ("route", "method"),
+        )
+        self.mongo_ops = Counter(
+            "mongo_operations_total", "MongoDB commands by command name and outcome.", ("command", "outcome")
+        )
+        self.mongo_latency = Histogram(
+            "mongo_operation_duration_seconds", "MongoDB command latency.", ("command",)
+        )
+        self.llm_latency = Histogram(
+            "llm_request_duration_seconds", "Agent LLM call latency.", ("agent", "model")
+        )
+        self.llm_requests = Counter(
+            "llm_requests_total", "Agent calls by outcome, including cache hits.", ("agent", "outcome")
+        )
+        self.llm_tokens = Counter(
+            "llm_tokens_total", "LLM tokens consumed by direction.", ("agent", "model", "direction")
+        )
+        self.stripe_latency = Histogram(
+            "stripe_call_duration_seconds", "Stripe API call latency.", ("call", "outcome")
+        )
+        self._collectors: List[object] = [
+            self.http_requests,
+            self.http_latency,
+            self.request_mongo_ops,
+            self.request_mongo_time,
+            self.mongo_ops,
+            self.mongo_latency,
+            self.llm_latency,
+            self.llm_requests,
+            self.llm_tokens,
+            self.stripe_latency,
+        ]
+
+    def register(self, collector) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for collector in self._collectors:
+            lines.extend(collector.render())
+        return "\n".join(lines) + "\n"
+
+    def observe_agent(self, agent_name: str, metadata: Dict[str, object], success: bool) -> None:
+        """Record one agent call from the metadata ``BaseAgent`` attaches to responses."""
+        if metadata.get("cache_hit"):
+            self.llm_requests.inc(agent=agent_name, outcome="cache_hit")
+            return
+        # Coalesced callers shared another call's tokens; shed callers made no call
+        for flag, outcome in (("coalesced", "coalesced"), ("overloaded", "shed")):
+            if metadata.get(flag):
+                self.llm_requests.inc(agent=agent_name, outcome=outcome)
+                return
+        self.llm_requests.inc(agent=agent_name, outcome="success" if success else "error")
+        model = str(metadata.get("model", "unknown"))
+        if "latency_ms" in metadata:
+            self.llm_latency.observe(float(metadata["latency_ms"]) / 1000, agent=agent_name, model=model)
+        for direction in ("input", "output"):
+            tokens = metadata.get(f"{direction}_tokens")
+            if tokens:
+                self.llm_tokens.inc(float(tokens), agent=agent_name, model=model, direction=direction)
+
+    def observe_stripe(self, call: str, seconds: float, outcome: str) -> None:
+        self.stripe_latency.observe(seconds, call=call, outcome=outcome)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    def _record(self, event, outcome: str) -> None:
+        seconds = event.duration_micros / 1_000_000
+        self.metrics.mongo_ops.inc(command=event.command_name, outcome=outcome)
+        self.metrics.mongo_latency.observe(seconds, command=event.command_name)
+        stats = _current_request.get()
+        if stats is not None:
+            stats.mongo_ops += 1
+            stats.mongo_seconds += seconds
+
+    def started(self, event) -> None:
+        pass
+
+    def succeeded(self, event) -> None:
+        self._record(event, "success")
+
+    def failed(self, event) -> None:
+        self._record(event, "failure")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and Mongo usage per matched route."""
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current_request.reset(token)
+            # The router stores the matched endpoint in the shared scope; label by
+            # its name to keep cardinality bounded regardless of path parameters
+            endpoint = scope.get("endpoint")
+            route = getattr(endpoint, "__name__", "unmatched")
+            method = scope["method"]
+            self.metrics.http_requests.inc(route=route, method=method, status=str(status["code"]))
+            self.metrics.http_latency.observe(elapsed, route=route, method=method)
+            self.metrics.request_mongo_ops.observe(stats.mongo_ops, route=route, method=method)
+            self.metrics.request_mongo_time.observe(stats.mongo_seconds, route=route, method=method)
@@ -0,0 +1,450 @@
+"""Drop announcement fan-out to ``drops_subscribers``.
+
+A campaign streams subscribers from a cursor in ``(subscribed_at, id)`` order
+and sends them one batch at a time. Within a batch, sends run concurrently up
+to ``concurrency`` and are paced by a token bucket. After each batch the
+campaign's checkpoint and counters are saved in ``drop_campaigns``, so an
+interrupted campaign resumes after the last completed batch. A resumed
+campaign may resend the batch that was in flight: delivery is at least once.
+
+Every API worker runs a dispatcher, so a campaign is sent only by the worker
+holding its lease: ``owner`` plus ``lease_expires_at``, taken with an atomic
+``find_one_and_update`` and renewed with every checkpoint. Campaigns whose
+lease has expired (their worker died) are claimed by whichever worker looks
+next; a worker that finds its lease gone stops sending.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import smtplib
+import socket
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+CAMPAIGN_RUNNING = "running"
+CAMPAIGN_COMPLETED = "completed"
+CAMPAIGN_CANCELLED = "cancelled"
+CAMPAIGN_FAILED = "failed"
+
+# Fields removed when a worker gives up a campaign
+_RELEASE_LEASE = {"owner": "", "lease_expires_at": ""}
+
+
+class CampaignLeaseLost(RuntimeError):
+    """Raised when a campaign was cancelled or claimed by another worker mid-run."""
+
+
+class NotificationsDisabledError(RuntimeError):
+    """Raised when a campaign is started without a configured transport."""
+
+
+class Message(NamedTuple):
+    to: str
+    subject: str
+    body: str
+
+
+class NotificationTransport(ABC):
+    @abstractmethod
+    async def send(self, message: Message) -> None:
+        """Deliver one message; raise to record it as failed."""
+
+    def describe(self) -> str:
+        return type(self).__name__
+
+
+class FileTransport(NotificationTransport):
+    """Appends each message as a JSON line; for local runs and tests."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = asyncio.Lock()
+        logger.warning(f"Drop notifications will be written to {self.path.resolve()}, not emailed")
+
+    def _append(self, line: str) -> None:
+        with self.path.open("a", encoding="utf-8") as handle:
+            handle.write(line)
+
+    async def send(self, message: Message) -> None:
+        line = json.dumps(message._asdict()) + "\n"
+        async with self._lock:
+            await asyncio.to_thread(self._append, line)
+
+    def describe(self) -> str:
+        return f"file:{self.path}"
+
+
+class SMTPTransport(NotificationTransport):
+    """Blocking ``smtplib`` delivery moved off the event loop, one connection per send."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        sender: str,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = False,
+    ):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+
+    def _deliver(self, message: Message) -> None:
+        email = EmailMessage()
+        email["From"] = self.sender
+        email["To"] = message.to
+        email["Subject"] = message.subject
+        email.set_content(message.body)
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            smtp.send_message(email)
+
+    async def send(self, message: Message) -> None:
+        await asyncio.to_thread(self._deliver, message)
+
+    def describe(self) -> str:
+        return f"smtp:{self.host}:{self.port}"
+
+
+def transport_from_env() -> Optional[NotificationTransport]:
+    """The transport named by ``DROP_NOTIFY_TRANSPORT`` (``smtp`` or ``file``); None when unset."""
+    kind = os.getenv("DROP_NOTIFY_TRANSPORT", "").lower()
+    if not kind:
+        logger.warning("DROP_NOTIFY_TRANSPORT is not set; drop notification campaigns are disabled")
+        return None
+    if kind == "smtp":
+        return SMTPTransport(
+            host=os.getenv("SMTP_HOST", "localhost"),
+            port=int(os.getenv("SMTP_PORT", "1025")),
+            sender=os.getenv("SMTP_SENDER", "drops@localhost"),
+            username=os.getenv("SMTP_USERNAME"),
+            password=os.getenv("SMTP_PASSWORD"),
+            starttls=os.getenv("SMTP_STARTTLS", "").lower() in ("1", "true", "yes"),
+        )
+    if kind == "file":
+        return FileTransport(Path(os.getenv("DROP_NOTIFY_FILE", "drop_notifications.jsonl")))
+    raise ValueError(f"Unknown DROP_NOTIFY_TRANSPORT {kind!r}; use 'smtp' or 'file'")
+
+
+class RateLimiter:
+    """Token bucket shared by every send of a campaign; ``rate_per_second <= 0`` disables it."""
+
+    def __init__(self, rate_per_second: float, burst: Optional[float] = None):
+        self.rate = rate_per_second
+        self.capacity = burst if burst is not None else max(1.0, rate_per_second)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _after_checkpoint(campaign: Dict[str, Any]) -> Dict[str, Any]:
+    checkpoint = campaign.get("checkpoint")
+    if not checkpoint:
+        return {}
+    subscribed_at, subscriber_id = checkpoint["subscribed_at"], checkpoint["id"]
+    return {
+        "$or": [
+            {"subscribed_at": {"$gt": subscribed_at}},
+            {"subscribed_at": subscribed_at, "id": {"$gt": subscriber_id}},
+        ]
+    }
+
+
+class NotificationDispatcher:
+    """Runs drop campaigns as background tasks of the API process."""
+
+    def __init__(
+        self,
+        db,
+        transport: Optional[NotificationTransport],
+        concurrency: int = 20,
+        rate_per_second: float = 50.0,
+        batch_size: int = 500,
+        lease_seconds: float = 120.0,
+    ):
+        self.db = db
+        self.transport = transport
+        self.concurrency = concurrency
+        self.rate_per_second = rate_per_second
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @classmethod
+    def from_env(cls, db) -> "NotificationDispatcher":
+        return cls(
+            db,
+            transport_from_env(),
+            concurrency=int(os.getenv("DROP_NOTIFY_CONCURRENCY", "20")),
+            rate_per_second=float(os.getenv("DROP_NOTIFY_RATE_PER_SECOND", "50")),
+            batch_size=int(os.getenv("DROP_NOTIFY_BATCH_SIZE", "500")),
+            lease_seconds=float(os.getenv("DROP_NOTIFY_LEASE_SECONDS", "120")),
+        )
+
+    def _lease_expires_at(self, rate_per_second: float) -> datetime:
+        # Long enough to send a full batch at the campaign's pace before the next renewal
+        batch_seconds = self.batch_size / rate_per_second if rate_per_second > 0 else 0.0
+        return datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds + batch_seconds)
+
+    async def _claim(self, query: Dict[str, Any], update: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Atomically take the lease on one campaign matching ``query`` that no live worker holds."""
+        now = datetime.now(timezone.utc)
+        claimed = await self.db.drop_campaigns.find_one_and_update(
+            {
+                **query,
+                "$or": [
+                    {"owner": {"$exists": False}},
+                    {"owner": self.owner},
+                    {"lease_expires_at": {"$lt": now}},
+                ],
+            },
+            {
+                "$set": {
+                    **(update or {}),
+                    "owner": self.owner,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now,
+                }
+            },
+            {"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        if claimed is None:
+            return None
+        # Stretch the lease over the first batch at this campaign's pace
+        lease_expires_at = self._lease_expires_at(claimed.get("rate_per_second", self.rate_per_second))
+        await self.db.drop_campaigns.update_one(
+            {"id": claimed["id"], "owner": self.owner}, {"$set": {"lease_expires_at": lease_expires_at}}
+        )
+        claimed["lease_expires_at"] = lease_expires_at
+        return claimed
+
+    async def create(self, subject: str, body: str, rate_per_second: Optional[float] = None) -> Dict[str, Any]:
+        """Record a new campaign and start sending it. ``{email}`` in ``body`` is filled per subscriber."""
+        self._require_transport()
+        now = datetime.now(timezone.utc)
+        rate_per_second = self.rate_per_second if rate_per_second is None else rate_per_second
+        campaign = {
+            "id": str(uuid.uuid4()),
+            "subject": subject,
+            "body": body,
+            "rate_per_second": rate_per_second,
+            "status": CAMPAIGN_RUNNING,
+            "total": await self.db.drops_subscribers.estimated_document_count(),
+            "sent": 0,
+            "failed": 0,
+            "batches": 0,
+            "checkpoint": None,
+            "last_error": None,
+            "created_at": now,
+            "updated_at": now,
+            "owner": self.owner,
+            "lease_expires_at": self._lease_expires_at(rate_per_second),
+        }
+        await self.db.drop_campaigns.insert_one(dict(campaign))
+        self._start(campaign)
+        return campaign
+
+    def _require_transport(self) -> None:
+        if self.transport is None:
+            raise NotificationsDisabledError("Set DROP_NOTIFY_TRANSPORT to send drop notifications")
+
+    async def resume(self, campaign_id: str) -> Optional[Dict[str, Any]]:
+        self._require_transport()
+        campaign = await self._claim(
+            {"id": campaign_id, "status": {"$ne": CAMPAIGN_COMPLETED}}, {"status": CAMPAIGN_RUNNING}
+        )
+        if campaign is None:
+            # Completed, unknown, or still leased by the worker sending it
+            return await self.db.drop_campaigns.find_one(
+                {"id": campaign_id, "status": {"$ne": CAMPAIGN_COMPLETED}}, {"_id": 0}
+            )
+        if not self.is_running(campaign_id):
+            self._start(campaign)
+        return campaign
+
+    async def resume_interrupted(self) -> int:
+        """Claim and restart ``running`` campaigns whose worker stopped or died."""
+        if self.transport is None:
+            return 0  # leave them for a worker that can deliver
+        resumed: List[str] = []
+        while True:
+            campaign = await self._claim({"status": CAMPAIGN_RUNNING, "id": {"$nin": [*self._tasks, *resumed]}})
+            if campaign is None:
+                return len(resumed)
+            self._start(campaign)
+            resumed.append(campaign["id"])
+
+    async def cancel(self, campaign_id: str) -> bool:
+        task = self._tasks.pop(campaign_id, None)
+        if task is not None:
+            task.cancel()
+        # A campaign leased by another worker stops at its next checkpoint
+        result = await self.db.drop_campaigns.update_one(
+            {"id": campaign_id, "status": CAMPAIGN_RUNNING},
+            {
+                "$set": {"status": CAMPAIGN_CANCELLED, "updated_at": datetime.now(timezone.utc)},
+                "$unset": _RELEASE_LEASE,
+            },
+        )
+        return result.modified_count == 1
+
+    async def stop(self) -> None:
+        # Campaigns stay "running" in Mongo; releasing the leases lets another worker resume them now
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        await self.db.drop_campaigns.update_many(
+            {"owner": self.owner, "status": CAMPAIGN_RUNNING}, {"$unset": _RELEASE_LEASE}
+        )
+
+    def is_running(self, campaign_id: str) -> bool:
+        task = self._tasks.get(campaign_id)
+        return task is not None and not task.done()
+
+    def _start(self, campaign: Dict[str, Any]) -> None:
+        campaign_id = campaign["id"]
+        task = asyncio.create_task(self._run(campaign))
+        self._tasks[campaign_id] = task
+
+        def forget(finished: asyncio.Task) -> None:
+            if self._tasks.get(campaign_id) is finished:
+                del self._tasks[campaign_id]
+
+        task.add_done_callback(forget)
+
+    async def _send(self, semaphore: asyncio.Semaphore, limiter: RateLimiter, message: Message) -> Optional[str]:
+        async with semaphore:
+            await limiter.acquire()
+            try:
+                await self.transport.send(message)
+            except Exception as exc:
+                logger.warning(f"Drop notification to {message.to} failed: {exc}")
+                return str(exc)
+        return None
+
+    async def _send_batch(self, campaign: Dict[str, Any], batch: List[dict], limiter: RateLimiter) -> None:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        errors = await asyncio.gather(*(
+            self._send(
+                semaphore,
+                limiter,
+                Message(doc["email"], campaign["subject"], campaign["body"].replace("{email}", doc["email"])),
+            )
+            for doc in batch
+        ))
+        failures = [error for error in errors if error]
+        last = batch[-1]
+        checkpoint = {"subscribed_at": last["subscribed_at"], "id": last["id"]}
+        update: Dict[str, Any] = {
+            "$set": {
+                "checkpoint": checkpoint,
+                "updated_at": datetime.now(timezone.utc),
+                "lease_expires_at": self._lease_expires_at(campaign.get("rate_per_second", self.rate_per_second)),
+            },
+            "$inc": {"sent": len(batch) - len(failures), "failed": len(failures), "batches": 1},
+        }
+        if failures:
+            update["$set"]["last_error"] = failures[-1]
+        # Checkpoint and lease renewal in one write, only while this worker still owns the campaign
+        result = await self.db.drop_campaigns.update_one(
+            {"id": campaign["id"], "owner": self.owner, "status": CAMPAIGN_RUNNING}, update
+        )
+        if result.matched_count == 0:
+            raise CampaignLeaseLost(campaign["id"])
+        campaign["checkpoint"] = checkpoint
+        logger.info(
+            f"Drop campaign {campaign['id']}: batch of {len(batch)} sent, {len(failures)} failed"
+        )
+
+    async def _run(self, campaign: Dict[str, Any]) -> None:
+        limiter = RateLimiter(campaign.get("rate_per_second", self.rate_per_second))
+        cursor = self.db.drops_subscribers.find(
+            _after_checkpoint(campaign), {"_id": 0, "id": 1, "email": 1, "subscribed_at": 1}
+        ).sort([("subscribed_at", 1), ("id", 1)]).batch_size(self.batch_size)
+
+        try:
+            batch: List[dict] = []
+            async for doc in cursor:
+                batch.append(doc)
+                if len(batch) >= self.batch_size:
+                    await self._send_batch(campaign, batch, limiter)
+                    batch = []
+            if batch:
+                await self._send_batch(campaign, batch, limiter)
+        except asyncio.CancelledError:
+            raise
+        except CampaignLeaseLost:
+            logger.warning(f"Drop campaign {campaign['id']} was cancelled or taken over; stopping")
+            return
+        except Exception as exc:
+            logger.exception(f"Drop campaign {campaign['id']} failed")
+            await self.db.drop_campaigns.update_one(
+                {"id": campaign["id"], "owner": self.owner},
+                {
+                    "$set": {"status": CAMPAIGN_FAILED, "last_error": str(exc), "updated_at": datetime.now(timezone.utc)},
+                    "$unset": _RELEASE_LEASE,
+                },
+            )
+            return
+
+        await self.db.drop_campaigns.update_one(
+            {"id": campaign["id"], "owner": self.owner, "status": CAMPAIGN_RUNNING},
+            {
+                "$set": {"status": CAMPAIGN_COMPLETED, "updated_at": datetime.now(timezone.utc)},
+                "$unset": _RELEASE_LEASE,
+            },
+        )
+
+    async def progress(self, campaign_id: str) -> Optional[Dict[str, Any]]:
+        campaign = await self.db.drop_campaigns.find_one({"id": campaign_id}, {"_id": 0})
+        if campaign is None:
+            return None
+        done = campaign["sent"] + campaign["failed"]
+        campaign["percent"] = min(100.0, round(100.0 * done / campaign["total"], 1)) if campaign["total"] else 100.0
+        campaign["active"] = self.is_running(campaign_id)
+        return campaign
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "transport": self.transport.describe() if self.transport else None,
+            "active_campaigns": sorted(self._tasks),
+            "concurrency": self.concurrency,
+            "rate_per_second": self.rate_per_second,
+            "batch_size": self.batch_size,
+            "owner": self.owner,
+        }
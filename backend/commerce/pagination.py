@@ -0,0 +1,75 @@
+"""Keyset pagination and field projection helpers for catalog listings."""
+
+import base64
+import json
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Fields every projected document keeps so the cursor can always be built
+_CURSOR_FIELDS = ("id", "created_at")
+
+SORT_ORDER: List[Tuple[str, int]] = [("created_at", -1), ("id", -1)]
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a client sends a cursor that was not produced by ``encode_cursor``."""
+
+
+def encode_cursor(doc: Dict[str, object]) -> str:
+    payload = json.dumps([doc["created_at"].isoformat(), doc["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), str(doc_id)
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursorError("Invalid pagination cursor") from exc
+
+
+def keyset_filter(cursor: Optional[str]) -> Dict[str, object]:
+    """Mongo filter selecting documents strictly after ``cursor`` in ``SORT_ORDER``."""
+    if not cursor:
+        return {}
+    created_at, doc_id = decode_cursor(cursor)
+    return {
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": doc_id}},
+        ]
+    }
+
+
+def build_projection(
+    fields: Optional[str],
+    allowed: Iterable[str],
+    max_images: Optional[int] = None,
+) -> Optional[Dict[str, object]]:
+    """Translate ``fields=a,b,c`` into a Mongo inclusion projection.
+
+    Unknown names raise ``ValueError``. ``max_images`` trims the ``images`` array
+    server-side so grid views only ship the cover shot.
+    """
+    projection: Dict[str, object] = {}
+
+    if fields:
+        allowed_set = set(allowed)
+        requested = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = sorted(set(requested) - allowed_set)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        projection = {name: 1 for name in (*_CURSOR_FIELDS, *requested)}
+
+    if max_images is not None and (not projection or "images" in projection):
+        projection["images"] = {"$slice": max_images}
+
+    if not projection:
+        return None
+    projection["_id"] = 0
+    return projection
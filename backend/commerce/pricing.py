@@ -0,0 +1,57 @@
+"""Server-side order pricing in a single aggregation.
+
+Cart lines are joined with their products inside Mongo. Prices always come
+from the ``products`` collection, never from the client, and a checkout costs
+one round trip however many lines the cart has.
+"""
+
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+
+class PricedOrder(NamedTuple):
+    items: List[Dict[str, Any]]
+    total: float
+    cart_item_ids: List[str]  # the cart lines that were priced
+
+
+def pricing_pipeline(user_id: str, cart_item_ids: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    match: Dict[str, Any] = {"user_id": user_id}
+    if cart_item_ids is not None:
+        match["id"] = {"$in": list(cart_item_ids)}
+    return [
+        {"$match": match},
+        {"$sort": {"added_at": 1}},
+        {"$lookup": {"from": "products", "localField": "product_id", "foreignField": "id", "as": "product"}},
+        # Lines whose product was deleted or is not launched yet drop out here
+        {"$unwind": "$product"},
+        {"$match": {"product.published": {"$ne": False}}},
+        {"$project": {
+            "_id": 0,
+            "cart_item_id": "$id",
+            "product_id": "$product.id",
+            "product_name": "$product.name",
+            "size": 1,
+            "quantity": 1,
+            "price": "$product.price",
+            "line_total": {"$multiply": ["$product.price", "$quantity"]},
+        }},
+    ]
+
+
+async def price_cart(db, user_id: str, cart_item_ids: Optional[Sequence[str]] = None) -> PricedOrder:
+    """Price ``user_id``'s cart lines: the given ids in request order, or the whole cart.
+
+    Lines that belong to another user are ignored, as are lines whose product
+    is gone.
+    """
+    ids = list(dict.fromkeys(cart_item_ids)) if cart_item_ids is not None else None
+    if ids == []:
+        return PricedOrder([], 0.0, [])
+
+    lines = await db.cart_items.aggregate(pricing_pipeline(user_id, ids)).to_list(None)
+    if ids is not None:
+        position = {item_id: index for index, item_id in enumerate(ids)}
+        lines.sort(key=lambda line: position[line["cart_item_id"]])
+
+    priced_ids = [line.pop("cart_item_id") for line in lines]
+    return PricedOrder(lines, round(sum(line["line_total"] for line in lines), 2), priced_ids)
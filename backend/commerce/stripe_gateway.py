@@ -0,0 +1,134 @@
+"""Run blocking Stripe SDK calls on a bounded thread pool."""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_TIMEOUT_SECONDS = 20.0
+
+
+class StripeTimeoutError(Exception):
+    """Raised when a Stripe call does not finish within the gateway timeout."""
+
+
+class StripeGateway:
+    """Offloads synchronous Stripe calls so they never block the event loop.
+
+    ``pending`` counts calls waiting for a free worker; together with ``active``
+    it shows whether ``max_workers`` is sized for the load.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS):
+        self.max_workers = max_workers
+        self.timeout_seconds = timeout_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stripe")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.max_pending_seen = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+        # Optional callback(call_name, seconds, outcome) for external metrics
+        self.observer: Optional[Callable[[str, float, str], None]] = None
+
+    @classmethod
+    def from_env(cls) -> "StripeGateway":
+        return cls(
+            max_workers=int(os.getenv("STRIPE_MAX_WORKERS", DEFAULT_MAX_WORKERS)),
+            timeout_seconds=float(os.getenv("STRIPE_TIMEOUT_SECONDS", DEFAULT_TIMEOUT_SECONDS)),
+        )
+
+    def configure_client(self, stripe_module) -> None:
+        """Bound each Stripe HTTP request to the gateway timeout.
+
+        ``asyncio.wait_for`` only stops waiting; without a client timeout the request
+        keeps its worker thread busy long after the caller gave up. Retries share
+        the budget.
+        """
+        attempts = (stripe_module.max_network_retries or 0) + 1
+        stripe_module.default_http_client = stripe_module.RequestsClient(
+            timeout=self.timeout_seconds / attempts
+        )
+
+    def _run(self, fn: Callable[..., Any], submitted_at: float, state: Dict[str, bool]) -> Any:
+        started_at = time.perf_counter()
+        with self._lock:
+            if state["abandoned"]:
+                raise StripeTimeoutError("Stripe call abandoned before it started")
+            state["started"] = True
+            self.pending -= 1
+            self.active += 1
+            self.total_wait_seconds += started_at - submitted_at
+        try:
+            return fn()
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.total_run_seconds += time.perf_counter() - started_at
+
+    def _abandon(self, state: Dict[str, bool]) -> None:
+        # A call that timed out (or was cancelled) while queued never runs, and leaves pending
+        with self._lock:
+            if not state["started"]:
+                state["abandoned"] = True
+                self.pending -= 1
+
+    async def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run ``fn(*args, **kwargs)`` on the pool and await its result."""
+        loop = asyncio.get_running_loop()
+        started_at = time.perf_counter()
+        state = {"started": False, "abandoned": False}
+        with self._lock:
+            self.pending += 1
+            self.max_pending_seen = max(self.max_pending_seen, self.pending)
+        future = loop.run_in_executor(
+            self._executor, self._run, partial(fn, *args, **kwargs), started_at, state
+        )
+        outcome = "error"
+        try:
+            result = await asyncio.wait_for(future, timeout=self.timeout_seconds)
+            outcome = "success"
+        except asyncio.TimeoutError as exc:
+            outcome = "timeout"
+            self.timeouts += 1
+            self._abandon(state)
+            raise StripeTimeoutError(f"Stripe call timed out after {self.timeout_seconds}s") from exc
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            self._abandon(state)
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            if self.observer:
+                name = getattr(fn, "__qualname__", getattr(fn, "__name__", "stripe_call"))
+                self.observer(name, time.perf_counter() - started_at, outcome)
+        self.completed += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        finished = self.completed + self.failed
+        return {
+            "max_workers": self.max_workers,
+            "timeout_seconds": self.timeout_seconds,
+            "pending": self.pending,
+            "active": self.active,
+            "max_pending_seen": self.max_pending_seen,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "avg_wait_seconds": self.total_wait_seconds / finished if finished else 0.0,
+            "avg_run_seconds": self.total_run_seconds / finished if finished else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
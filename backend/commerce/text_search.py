@@ -0,0 +1,242 @@
+"""Local full-text product search: an inverted index with BM25 ranking.
+
+``name``, ``color`` and ``description`` are tokenized into one weighted term
+frequency per document (a simplified BM25F, where a name hit outweighs a
+description hit). Each query token matches:
+
+- its exact term;
+- for the last token, as typed in a search box, every term it prefixes;
+- when neither exists, terms within one edit (insert, delete, substitute or
+  transpose), found through a symmetric-delete table.
+
+Prefix and typo matches are discounted against exact ones. Admin writes
+update single documents; nothing here calls Mongo at query time.
+
+Only published products are indexed. An unlaunched drop contributes no terms,
+so its name cannot leak through prefix or typo expansions or skew document
+frequencies; it enters the index when it launches.
+"""
+
+import asyncio
+import bisect
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from .drops import visible_filter
+
+FIELD_WEIGHTS = {"name": 3.0, "color": 2.0, "description": 1.0}
+PREFIX_WEIGHT = 0.8
+TYPO_WEIGHT = 0.6
+MIN_TYPO_LENGTH = 4  # shorter tokens have too many one-edit neighbours
+MAX_PREFIX_EXPANSIONS = 50
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def _deletes(term: str) -> Set[str]:
+    return {term[:index] + term[index + 1:] for index in range(len(term))}
+
+
+def _within_one_edit(left: str, right: str) -> bool:
+    """Optimal string alignment distance <= 1, transpositions included."""
+    if abs(len(left) - len(right)) > 1:
+        return False
+    if len(left) == len(right):
+        diffs = [index for index, (a, b) in enumerate(zip(left, right)) if a != b]
+        if len(diffs) <= 1:
+            return True
+        first, second = diffs[0], diffs[-1]
+        return (
+            len(diffs) == 2 and second == first + 1
+            and left[first] == right[second] and left[second] == right[first]
+        )
+    shorter, longer = (left, right) if len(left) < len(right) else (right, left)
+    for index in range(len(longer)):
+        if longer[:index] + longer[index + 1:] == shorter:
+            return True
+    return False
+
+
+class SearchHit(NamedTuple):
+    score: float
+    doc: Dict[str, Any]
+
+
+class SearchResult(NamedTuple):
+    total: int
+    hits: List[SearchHit]
+    expansions: Dict[str, List[str]]  # query token -> index terms it matched
+
+
+class TextIndex:
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._reset()
+        self.updates = 0
+
+    def _reset(self) -> None:
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._terms_of: Dict[str, Counter] = {}
+        self._length: Dict[str, float] = {}
+        self._total_length = 0.0
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._vocabulary: List[str] = []  # sorted, for prefix lookups
+        self._deletes: Dict[str, Set[str]] = defaultdict(set)
+
+    # Maintenance
+
+    def _add_term(self, term: str) -> None:
+        bisect.insort(self._vocabulary, term)
+        if len(term) >= MIN_TYPO_LENGTH:
+            for variant in _deletes(term):
+                self._deletes[variant].add(term)
+
+    def _drop_term(self, term: str) -> None:
+        del self._postings[term]
+        index = bisect.bisect_left(self._vocabulary, term)
+        if index < len(self._vocabulary) and self._vocabulary[index] == term:
+            self._vocabulary.pop(index)
+        if len(term) >= MIN_TYPO_LENGTH:
+            for variant in _deletes(term):
+                self._deletes[variant].discard(term)
+                if not self._deletes[variant]:
+                    del self._deletes[variant]
+
+    def _remove_locked(self, product_id: str) -> None:
+        terms = self._terms_of.pop(product_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(product_id, None)
+            if not postings:
+                self._drop_term(term)
+        self._total_length -= self._length.pop(product_id)
+        del self._docs[product_id]
+
+    def upsert(self, doc: Dict[str, Any]) -> None:
+        if doc.get("published") is False:
+            self.remove(doc["id"])
+            return
+        doc = {key: value for key, value in doc.items() if key != "_id"}
+        product_id = doc["id"]
+        terms: Counter = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(str(doc.get(field) or "")):
+                terms[token] += weight
+
+        with self._lock:
+            self._remove_locked(product_id)
+            for term, frequency in terms.items():
+                if term not in self._postings:
+                    self._add_term(term)
+                self._postings[term][product_id] = frequency
+            self._terms_of[product_id] = terms
+            self._length[product_id] = float(sum(terms.values()))
+            self._total_length += self._length[product_id]
+            self._docs[product_id] = doc
+            self.updates += 1
+
+    def remove(self, product_id: str) -> None:
+        with self._lock:
+            self._remove_locked(product_id)
+            self.updates += 1
+
+    def load(self, docs: Iterable[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._reset()
+        for doc in docs:
+            self.upsert(doc)
+
+    async def refresh(self, db) -> int:
+        """Rebuild from Mongo into a fresh index and swap it in."""
+        fresh = TextIndex(self.k1, self.b)
+        docs = await db.products.find(visible_filter(), {"_id": 0}).to_list(None)
+        # Tokenizing the whole catalog is CPU-bound; keep it off the event loop
+        await asyncio.to_thread(fresh.load, docs)
+        with self._lock:
+            for name in (
+                "_postings", "_terms_of", "_length", "_total_length", "_docs", "_vocabulary", "_deletes",
+            ):
+                setattr(self, name, getattr(fresh, name))
+        return len(fresh._docs)
+
+    # Queries
+
+    def _prefixed(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        matches = []
+        for term in self._vocabulary[start:]:
+            if not term.startswith(prefix):
+                break
+            if term != prefix:
+                matches.append(term)
+        # Prefer the terms most documents share when a short prefix matches many
+        matches.sort(key=lambda term: -len(self._postings[term]))
+        return matches[:MAX_PREFIX_EXPANSIONS]
+
+    def _near(self, token: str) -> List[str]:
+        if len(token) < MIN_TYPO_LENGTH:
+            return []
+        candidates: Set[str] = set(self._deletes.get(token, ()))
+        for variant in _deletes(token) | {token}:
+            if variant in self._postings:
+                candidates.add(variant)
+            candidates.update(self._deletes.get(variant, ()))
+        return sorted(term for term in candidates if _within_one_edit(token, term))
+
+    def _expand(self, token: str, is_last: bool) -> List[Tuple[str, float]]:
+        expansions = []
+        if token in self._postings:
+            expansions.append((token, 1.0))
+        if is_last:
+            expansions.extend((term, PREFIX_WEIGHT) for term in self._prefixed(token))
+        if not expansions:
+            expansions.extend((term, TYPO_WEIGHT) for term in self._near(token))
+        return expansions
+
+    def search(self, query: str, offset: int = 0, limit: Optional[int] = 10) -> SearchResult:
+        tokens = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            doc_count = len(self._docs)
+            if not tokens or not doc_count:
+                return SearchResult(0, [], {})
+            average_length = self._total_length / doc_count
+
+            scores: Dict[str, float] = defaultdict(float)
+            expansions: Dict[str, List[str]] = {}
+            for position, token in enumerate(tokens):
+                matched = self._expand(token, is_last=position == len(tokens) - 1)
+                expansions[token] = [term for term, _ in matched]
+                # A token contributes its best-matching term per document
+                best: Dict[str, float] = {}
+                for term, weight in matched:
+                    postings = self._postings[term]
+                    idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for product_id, frequency in postings.items():
+                        norm = self.k1 * (1 - self.b + self.b * self._length[product_id] / average_length)
+                        score = weight * idf * frequency * (self.k1 + 1) / (frequency + norm)
+                        if score > best.get(product_id, 0.0):
+                            best[product_id] = score
+                for product_id, score in best.items():
+                    scores[product_id] += score
+
+            ranked = sorted(
+                (SearchHit(score, self._docs[product_id]) for product_id, score in scores.items()),
+                key=lambda hit: (-hit.score, hit.doc["id"]),
+            )
+        end = None if limit is None else offset + limit
+        return SearchResult(len(ranked), ranked[offset:end], expansions)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"documents": len(self._docs), "terms": len(self._vocabulary), "updates": self.updates}
@@ -0,0 +1,328 @@
+"""Virtual waiting room that meters access to checkout paths during a drop.
+
+Shoppers join a drop's queue and receive a signed token carrying their user id
+and queue position. Positions ``0 .. burst - 1`` are admitted at once and one
+more every ``1 / rate_per_second`` after that, so position ``n`` is admitted at
+``opened_at + max(0, n - burst + 1) / rate_per_second``.
+
+Room state lives in Mongo so every worker process agrees on it: rooms in
+``waiting_rooms`` (positions handed out with an atomic ``$inc``) and one ticket
+per user per opening in ``waiting_room_tickets``. Joining again returns the
+same ticket. Each process keeps a copy of the open rooms, refreshed every few
+seconds, so gated requests are checked without a database round trip. A token
+only admits requests made for the user it was issued to, so it cannot be
+shared.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+QUEUE_TOKEN_HEADER = "x-queue-token"
+
+# (method, path) pairs that require an admitted token while a room is open
+DEFAULT_GATED_ROUTES: Tuple[Tuple[str, str], ...] = (
+    ("POST", "/api/cart/add"),
+    ("POST", "/api/checkout"),
+    ("POST", "/api/orders"),
+)
+
+
+class InvalidQueueTokenError(ValueError):
+    """Raised when a queue token is malformed, tampered with, expired or not the caller's."""
+
+
+@dataclass
+class DropRoom:
+    drop_id: str
+    rate_per_second: float
+    burst: int
+    opened_at: float
+    next_position: int = 0
+
+    def admitted_at(self, position: int) -> float:
+        return self.opened_at + max(0, position - self.burst + 1) / self.rate_per_second
+
+    def admitted_count(self, now: float) -> int:
+        # Positions below this are admitted: position < admitted_count(now) iff now >= admitted_at(position)
+        return self.burst + max(0, math.floor((now - self.opened_at) * self.rate_per_second))
+
+
+def _room(doc: Dict[str, Any]) -> DropRoom:
+    return DropRoom(
+        doc["drop_id"], doc["rate_per_second"], doc["burst"], doc["opened_at"], doc.get("next_position", 0)
+    )
+
+
+class WaitingRoom:
+    def __init__(
+        self,
+        db,
+        secret: bytes,
+        token_ttl_seconds: float = 900.0,
+        gated_routes: Iterable[Tuple[str, str]] = DEFAULT_GATED_ROUTES,
+        refresh_seconds: float = 2.0,
+    ):
+        if not secret:
+            raise ValueError("A waiting room secret is required")
+        self.db = db
+        self._secret = secret
+        self.token_ttl_seconds = token_ttl_seconds
+        self.gated_routes = tuple(gated_routes)
+        self.refresh_seconds = refresh_seconds
+        self.rooms: Dict[str, DropRoom] = {}  # this process's copy of waiting_rooms
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls, db) -> Optional["WaitingRoom"]:
+        """The shared ``WAITING_ROOM_SECRET`` is required; without it the room is disabled.
+
+        A per-process random secret would make tokens issued by one worker
+        invalid on every other.
+        """
+        secret = os.getenv("WAITING_ROOM_SECRET")
+        if not secret:
+            logger.warning("WAITING_ROOM_SECRET is not set; the drop waiting room is disabled")
+            return None
+        return cls(
+            db,
+            secret=secret.encode(),
+            token_ttl_seconds=float(os.getenv("WAITING_ROOM_TOKEN_TTL_SECONDS", "900")),
+            refresh_seconds=float(os.getenv("WAITING_ROOM_REFRESH_SECONDS", "2")),
+        )
+
+    # Room lifecycle
+
+    async def refresh(self) -> int:
+        """Reload the open rooms, picking up opens and closes made by other workers."""
+        docs = await self.db.waiting_rooms.find({}, {"_id": 0}).to_list(None)
+        self.rooms = {doc["drop_id"]: _room(doc) for doc in docs}
+        return len(self.rooms)
+
+    async def open(self, drop_id: str, rate_per_second: float, burst: int = 0) -> DropRoom:
+        if rate_per_second <= 0:
+            raise ValueError("rate_per_second must be positive")
+        room = DropRoom(drop_id, rate_per_second, burst, time.time())
+        await self.db.waiting_rooms.replace_one(
+            {"drop_id": drop_id},
+            {
+                "drop_id": drop_id,
+                "rate_per_second": rate_per_second,
+                "burst": burst,
+                "opened_at": room.opened_at,
+                "next_position": 0,
+            },
+            upsert=True,
+        )
+        # Tickets from an earlier opening carry another opened_at and no longer validate
+        await self.db.waiting_room_tickets.delete_many({"drop_id": drop_id, "opened_at": {"$ne": room.opened_at}})
+        self.rooms[drop_id] = room
+        return room
+
+    async def close(self, drop_id: str) -> bool:
+        result = await self.db.waiting_rooms.delete_one({"drop_id": drop_id})
+        await self.db.waiting_room_tickets.delete_many({"drop_id": drop_id})
+        self.rooms.pop(drop_id, None)
+        return result.deleted_count == 1
+
+    @property
+    def active(self) -> bool:
+        return bool(self.rooms)
+
+    # Tickets and tokens
+
+    def _sign(self, payload: bytes) -> str:
+        return hmac.new(self._secret, payload, hashlib.sha256).hexdigest()
+
+    def _token(self, room: DropRoom, user_id: str, position: int) -> str:
+        payload = json.dumps(
+            {"d": room.drop_id, "p": position, "o": room.opened_at, "u": user_id}, separators=(",", ":")
+        ).encode()
+        return f"{base64.urlsafe_b64encode(payload).decode()}.{self._sign(payload)}"
+
+    async def join(self, drop_id: str, user_id: str) -> Dict[str, Any]:
+        """Issue the user's ticket for a drop; a user who joins again keeps their place."""
+        doc = await self.db.waiting_rooms.find_one({"drop_id": drop_id}, {"_id": 0})
+        if doc is None:
+            raise KeyError(drop_id)
+        room = _room(doc)
+        self.rooms[drop_id] = room
+        ticket_key = {"drop_id": drop_id, "opened_at": room.opened_at, "user_id": user_id}
+
+        ticket = await self.db.waiting_room_tickets.find_one(ticket_key, {"position": 1})
+        if ticket is None:
+            counter = await self.db.waiting_rooms.find_one_and_update(
+                {"drop_id": drop_id, "opened_at": room.opened_at},
+                {"$inc": {"next_position": 1}},
+                {"next_position": 1},
+                return_document=ReturnDocument.AFTER,
+            )
+            if counter is None:
+                raise KeyError(drop_id)  # closed or reopened in the meantime
+            try:
+                await self.db.waiting_room_tickets.insert_one({**ticket_key, "position": counter["next_position"] - 1})
+            except DuplicateKeyError:
+                pass  # a concurrent join by the same user won; use their ticket
+            ticket = await self.db.waiting_room_tickets.find_one(ticket_key, {"position": 1})
+
+        token = self._token(room, user_id, ticket["position"])
+        return {"token": token, **self.status(token, user_id)}
+
+    def _decode(self, token: str) -> Tuple[DropRoom, int, str]:
+        try:
+            encoded, signature = token.rsplit(".", 1)
+            payload = base64.urlsafe_b64decode(encoded.encode())
+        except ValueError as exc:
+            raise InvalidQueueTokenError("Malformed queue token") from exc
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            raise InvalidQueueTokenError("Invalid queue token signature")
+
+        try:
+            claims = json.loads(payload)
+            drop_id, position, opened_at, user_id = claims["d"], int(claims["p"]), claims["o"], claims["u"]
+        except (ValueError, KeyError, TypeError) as exc:
+            raise InvalidQueueTokenError("Malformed queue token") from exc
+
+        room = self.rooms.get(drop_id)
+        # A token from a previous opening of the same drop is not valid any more
+        if room is None or room.opened_at != opened_at:
+            raise InvalidQueueTokenError("Queue for this drop is closed")
+        return room, position, user_id
+
+    def status(self, token: str, user_id: Optional[str] = None, now: Optional[float] = None) -> Dict[str, Any]:
+        """Queue status for ``token``; with ``user_id``, the token must have been issued to that user."""
+        now = time.time() if now is None else now
+        room, position, token_user = self._decode(token)
+        if user_id is not None and not hmac.compare_digest(token_user, user_id):
+            raise InvalidQueueTokenError("Queue token was issued to another user")
+        admitted_at = room.admitted_at(position)
+        if now > admitted_at + self.token_ttl_seconds:
+            raise InvalidQueueTokenError("Queue token expired")
+        return {
+            "drop_id": room.drop_id,
+            "position": position,
+            "admitted": now >= admitted_at,
+            "ahead": max(0, position - room.admitted_count(now)),
+            "estimated_wait_seconds": max(0, math.ceil(admitted_at - now)),
+        }
+
+    # Gate
+
+    def is_gated(self, method: str, path: str) -> bool:
+        return self.active and any(
+            method == gated_method and path.rstrip("/") == gated_path
+            for gated_method, gated_path in self.gated_routes
+        )
+
+    def check(self, token: Optional[str], user_id: Optional[str]) -> Tuple[bool, Dict[str, Any]]:
+        """Return ``(allowed, details)`` for a request to a gated route made for ``user_id``."""
+        if not token:
+            return False, {"detail": "Join the waiting room for this drop first", "drops": list(self.rooms)}
+        if not user_id:
+            return False, {"detail": "Gated requests must name the user_id the token was issued to"}
+        try:
+            status = self.status(token, user_id)
+        except InvalidQueueTokenError as exc:
+            return False, {"detail": str(exc), "drops": list(self.rooms)}
+        if not status["admitted"]:
+            return False, {"detail": "Still in the waiting room", **status}
+        return True, status
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "rejected": self.rejected,
+            "rooms": {
+                drop_id: {
+                    "rate_per_second": room.rate_per_second,
+                    "burst": room.burst,
+                    "joined": room.next_position,
+                    "admitted": min(room.next_position, room.admitted_count(now)),
+                }
+                for drop_id, room in self.rooms.items()
+            },
+        }
+
+
+def _body_user_id(body: bytes) -> Optional[str]:
+    try:
+        user_id = json.loads(body).get("user_id")
+    except (ValueError, AttributeError):
+        return None
+    return user_id if isinstance(user_id, str) else None
+
+
+class WaitingRoomMiddleware:
+    """ASGI middleware rejecting gated requests whose queue token is not admitted yet.
+
+    The gated routes all carry ``user_id`` in their JSON body; the body is read
+    once, checked against the token and replayed to the app. Everything else,
+    including all catalog reads, passes straight through.
+    """
+
+    def __init__(self, app, waiting_room_of):
+        self.app = app
+        # Resolved per request: the room is created in the lifespan, after middleware is built
+        self.waiting_room_of = waiting_room_of
+
+    async def __call__(self, scope, receive, send):
+        waiting_room: Optional[WaitingRoom] = self.waiting_room_of() if scope["type"] == "http" else None
+        if waiting_room is None or not waiting_room.is_gated(scope["method"], scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        token = None
+        for name, value in scope.get("headers", []):
+            if name.decode("latin-1") == QUEUE_TOKEN_HEADER:
+                token = value.decode("latin-1")
+                break
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+
+        allowed, details = waiting_room.check(token, _body_user_id(body))
+        if allowed:
+            replayed = False
+
+            async def replay():
+                nonlocal replayed
+                if replayed:
+                    return await receive()
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+
+            await self.app(scope, replay, send)
+            return
+
+        waiting_room.rejected += 1
+        payload = json.dumps(details).encode()
+        retry_after = str(max(1, details.get("estimated_wait_seconds", 1)))
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(payload)).encode()),
+                (b"retry-after", retry_after.encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": payload})
@@ -0,0 +1,236 @@
+"""Idempotent Stripe webhook ingestion with asynchronous fulfilment.
+
+The HTTP handler only verifies the signature and records the event in
+``stripe_events``, whose unique ``id`` index turns Stripe's retries into no-ops.
+It then returns 200. Fulfilment runs on a bounded pool of worker tasks. A
+worker claims an event by moving it to ``processing`` under a lease. Events that
+could not be queued stay ``pending``; events whose worker died keep an expired
+lease. ``requeue_stale`` picks up both.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from pymongo.errors import DuplicateKeyError
+
+from .inventory import RESERVATION_COMMITTED, commit_by_session, reacquire_released, release_by_session
+
+logger = logging.getLogger(__name__)
+
+EVENT_PENDING = "pending"
+EVENT_PROCESSING = "processing"
+EVENT_PROCESSED = "processed"
+EVENT_FAILED = "failed"
+
+MAX_ATTEMPTS = 5
+LEASE_SECONDS = 300  # a claimed event is only retried after its worker has held it this long
+
+ORDER_NEEDS_ATTENTION = "needs_attention"  # paid, but the stock is gone: refund by hand
+
+
+async def _secure_stock(db, payment_id: str) -> bool:
+    # Commit the held stock; if expiry or a cancel already released it, try to take it back
+    if await commit_by_session(db, payment_id):
+        return True
+    reservation = await db.stock_reservations.find_one({"stripe_session_id": payment_id}, {"status": 1})
+    if reservation is None or reservation["status"] == RESERVATION_COMMITTED:
+        return True  # no reservation to commit, or a retried event committed it already
+    if await reacquire_released(db, payment_id):
+        logger.warning("Paid session %s had released its stock; re-reserved it", payment_id)
+        return True
+    return False
+
+
+async def complete_checkout(db, session: Dict[str, Any]) -> None:
+    """Mark the order paid, keep the reserved stock and clear the cart.
+
+    A payment whose stock was released and has since sold out leaves the order
+    in ``needs_attention`` for a refund instead of silently overselling.
+    """
+    payment_id = session["id"]
+    if await _secure_stock(db, payment_id):
+        status = "paid"
+    else:
+        status = ORDER_NEEDS_ATTENTION
+        logger.error("Paid session %s has no stock left to fulfil; order needs a refund", payment_id)
+    order = await db.orders.find_one_and_update(
+        {"stripe_payment_id": payment_id},
+        {"$set": {"status": status}},
+        {"user_id": 1, "cart_item_ids": 1},
+    )
+
+    # Only the lines that were checked out; the shopper may have added more since
+    if order and order.get("cart_item_ids"):
+        await db.cart_items.delete_many({"id": {"$in": order["cart_item_ids"]}, "user_id": order["user_id"]})
+
+
+async def expire_checkout(db, session_id: str) -> bool:
+    """Release the session's stock and cancel its pending order."""
+    released = await release_by_session(db, session_id)
+    if released:
+        await db.orders.update_one(
+            {"stripe_payment_id": session_id, "status": "pending"},
+            {"$set": {"status": "cancelled"}}
+        )
+    return released
+
+
+async def fulfil_event(db, event: Dict[str, Any]) -> None:
+    session = event["data"]["object"]
+    if event["type"] == "checkout.session.completed":
+        await complete_checkout(db, session)
+    elif event["type"] == "checkout.session.expired":
+        await expire_checkout(db, session["id"])
+
+
+async def record_event(db, event: Dict[str, Any]) -> bool:
+    """Persist a verified event. Returns False when Stripe is retrying one we already have."""
+    try:
+        await db.stripe_events.insert_one({
+            "id": event["id"],
+            "type": event["type"],
+            "event": event,
+            "status": EVENT_PENDING,
+            "attempts": 0,
+            "received_at": datetime.now(timezone.utc),
+        })
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+class WebhookWorker:
+    """Bounded asyncio queue drained by ``concurrency`` fulfilment tasks."""
+
+    def __init__(
+        self,
+        db,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[None]] = fulfil_event,
+        concurrency: int = 4,
+        queue_size: int = 1000,
+    ):
+        self.db = db
+        self.handler = handler
+        self.concurrency = concurrency
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=queue_size)
+        self._tasks: List[asyncio.Task] = []
+        self._queued: Set[str] = set()  # ids waiting in the queue, so requeue never doubles them
+        self.processed = 0
+        self.failed = 0
+        self.deferred = 0
+
+    @classmethod
+    def from_env(cls, db) -> "WebhookWorker":
+        return cls(
+            db,
+            concurrency=int(os.getenv("WEBHOOK_WORKERS", "4")),
+            queue_size=int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000")),
+        )
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, event_id: str) -> bool:
+        """Queue an event for fulfilment without waiting. Full queue: leave it for requeue_stale."""
+        if event_id in self._queued:
+            return True
+        try:
+            self.queue.put_nowait(event_id)
+        except asyncio.QueueFull:
+            self.deferred += 1
+            return False
+        self._queued.add(event_id)
+        return True
+
+    async def requeue_stale(self, older_than_seconds: float = 60.0, limit: int = 500) -> int:
+        """Re-submit events that were never queued, or whose lease expired with their worker."""
+        now = datetime.now(timezone.utc)
+        cutoff = now - timedelta(seconds=older_than_seconds)
+        cursor = self.db.stripe_events.find(
+            {"$or": [
+                {"status": EVENT_PENDING, "received_at": {"$lt": cutoff}},
+                {"status": EVENT_PROCESSING, "lease_expires_at": {"$lt": now}},
+            ]},
+            {"id": 1},
+        ).sort("received_at", 1).limit(limit)
+        requeued = 0
+        async for doc in cursor:
+            if doc["id"] in self._queued:
+                continue  # still waiting in this process's queue
+            if not self.submit(doc["id"]):
+                break
+            requeued += 1
+        return requeued
+
+    async def _claim(self, event_id: str) -> Optional[Dict[str, Any]]:
+        # A lease, not just a timestamp: while it runs, no other worker or requeue can take the event
+        now = datetime.now(timezone.utc)
+        return await self.db.stripe_events.find_one_and_update(
+            {"id": event_id, "$or": [
+                {"status": EVENT_PENDING},
+                {"status": EVENT_PROCESSING, "lease_expires_at": {"$lt": now}},
+            ]},
+            {
+                "$inc": {"attempts": 1},
+                "$set": {
+                    "status": EVENT_PROCESSING,
+                    "claimed_at": now,
+                    "lease_expires_at": now + timedelta(seconds=LEASE_SECONDS),
+                },
+            },
+        )
+
+    async def _run(self) -> None:
+        while True:
+            event_id = await self.queue.get()
+            self._queued.discard(event_id)
+            try:
+                await self._process(event_id)
+            finally:
+                self.queue.task_done()
+
+    async def _process(self, event_id: str) -> None:
+        doc = await self._claim(event_id)
+        if doc is None:
+            return  # already processed by another worker or process
+
+        try:
+            await self.handler(self.db, doc["event"])
+        except Exception as exc:
+            logger.exception("Failed to fulfil Stripe event %s", event_id)
+            attempts = doc.get("attempts", 0) + 1
+            status = EVENT_FAILED if attempts >= MAX_ATTEMPTS else EVENT_PENDING
+            await self.db.stripe_events.update_one(
+                {"id": event_id},
+                {"$set": {"status": status, "last_error": str(exc)}, "$unset": {"lease_expires_at": ""}},
+            )
+            self.failed += 1
+            return
+
+        await self.db.stripe_events.update_one(
+            {"id": event_id},
+            {
+                "$set": {"status": EVENT_PROCESSED, "processed_at": datetime.now(timezone.utc)},
+                "$unset": {"lease_expires_at": ""},
+            },
+        )
+        self.processed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "workers": len(self._tasks),
+            "processed": self.processed,
+            "failed": self.failed,
+            "deferred": self.deferred,
+        }
@@ -1,20 +1,74 @@
 """FastAPI server exposing AI agent endpoints."""
 
+import asyncio
+import json
 import logging
 import os
 import uuid
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
-from fastapi import APIRouter, FastAPI, HTTPException, Request
+from fastapi import APIRouter, FastAPI, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from pydantic import BaseModel, Field
 from starlette.middleware.cors import CORSMiddleware
 
-from ai_agents.agents import AgentConfig, ChatAgent, SearchAgent
+from ai_agents.agents import AgentConfig, CatalogAgent, ChatAgent, SearchAgent
+from ai_agents.cache import MongoResponseCache, response_cache_from_env
+from ai_agents.limits import AgentOverloadedError, ConcurrencyGate
+from ai_agents.registry import AgentRegistry
+from commerce.bulk_import import import_products, iter_jsonl
+from commerce.catalog_cache import CatalogCache, ListingFilters, ListingKey, watch_catalog_changes
+from commerce.drops import DropScheduler, LaunchSnapshot, is_due, visible_filter
+from commerce.export import EXPORT_BATCH_SIZE, EXPORT_MEDIA_TYPES, export_rows
+from commerce.facets import FacetIndex, FacetQuery
+from commerce.fast_json import (
+    FastJSONResponse,
+    documents_response,
+    dumps,
+    encode_documents,
+    fast_json_enabled,
+    shape_document,
+)
+from commerce.hydration import hydrate_cart_items
+from commerce.indexes import ensure_indexes, index_status
+from commerce.inventory import (
+    InsufficientStockError,
+    ReservationLine,
+    attach_session,
+    commit_reservation,
+    release_expired,
+    release_reservation,
+    reserve_stock,
+    stripe_session_expires_at,
+)
+from commerce.metrics import GaugeCallback, Metrics, MetricsMiddleware, MongoCommandListener
+from commerce.notifications import NotificationDispatcher, NotificationsDisabledError
+from commerce.pagination import (
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    SORT_ORDER,
+    build_projection,
+    encode_cursor,
+    keyset_filter,
+)
+from commerce.pricing import price_cart
+from commerce.stripe_gateway import StripeGateway, StripeTimeoutError
+from commerce.text_search import TextIndex
+from commerce.waiting_room import (
+    QUEUE_TOKEN_HEADER,
+    InvalidQueueTokenError,
+    WaitingRoom,
+    WaitingRoomMiddleware,
+)
+from commerce.webhooks import WebhookWorker, expire_checkout, record_event
 
 try:
     import stripe
@@ -88,6 +142,8 @@ class Product(BaseModel):
     color: str
     sizes: List[SizeStock]
     featured: bool = False
+    publish_at: Optional[datetime] = None  # scheduled drop time; hidden until then
+    published: bool = True
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
@@ -100,6 +156,7 @@ class ProductCreate(BaseModel):
     color: str
     sizes: List[SizeStock]
     featured: bool = False
+    publish_at: Optional[datetime] = None
 
 
 class ProductUpdate(BaseModel):
@@ -111,6 +168,7 @@ class ProductUpdate(BaseModel):
     color: Optional[str] = None
     sizes: Optional[List[SizeStock]] = None
     featured: Optional[bool] = None
+    publish_at: Optional[datetime] = None
 
 
 class DropsSubscriber(BaseModel):
@@ -123,6 +181,12 @@ class DropsSubscriberCreate(BaseModel):
     email: str
 
 
+class DropCampaignCreate(BaseModel):
+    subject: str
+    body: str  # "{email}" is replaced with each subscriber's address
+    rate_per_second: Optional[float] = Field(None, ge=0)
+
+
 class CartItem(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
@@ -144,26 +208,40 @@ class Order(BaseModel):
     user_id: str
     items: List[dict]
     total: float
-    status: str = "pending"  # pending, paid, shipped, delivered
+    status: str = "pending"  # pending, paid, needs_attention, cancelled, shipped, delivered
     stripe_payment_id: Optional[str] = None
+    reservation_id: Optional[str] = None
+    cart_item_ids: List[str] = Field(default_factory=list)  # cart lines cleared once paid
     shipping_address: dict
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
 class OrderCreate(BaseModel):
     user_id: str
-    items: List[dict]
-    total: float
+    cart_items: Optional[List[str]] = None  # cart item ids; the whole cart when omitted
     stripe_payment_id: Optional[str] = None
     shipping_address: dict
 
 
+class WaitingRoomOpen(BaseModel):
+    rate_per_second: float = Field(gt=0)
+    burst: int = Field(default=0, ge=0)
+
+
+class WaitingRoomJoin(BaseModel):
+    user_id: str
+
+
 class CheckoutRequest(BaseModel):
     user_id: str
     cart_items: List[str]  # cart item IDs
     shipping_address: dict
 
 
+class CheckoutCancel(BaseModel):
+    user_id: str
+
+
 def _ensure_db(request: Request):
     try:
         return request.app.state.db
@@ -171,27 +249,137 @@ def _ensure_db(request: Request):
         raise HTTPException(status_code=503, detail="Database not ready") from exc
 
 
-def _get_agent_cache(request: Request) -> Dict[str, object]:
-    if not hasattr(request.app.state, "agent_cache"):
-        request.app.state.agent_cache = {}
-    return request.app.state.agent_cache
+def _get_waiting_room(request: Request) -> WaitingRoom:
+    waiting_room = getattr(request.app.state, "waiting_room", None)
+    if waiting_room is None:
+        raise HTTPException(status_code=503, detail="Waiting room is not configured (set WAITING_ROOM_SECRET)")
+    return waiting_room
 
 
-async def _get_or_create_agent(request: Request, agent_type: str):
-    cache = _get_agent_cache(request)
-    if agent_type in cache:
-        return cache[agent_type]
+def _get_catalog_cache(request: Request) -> CatalogCache:
+    if not hasattr(request.app.state, "catalog_cache"):
+        request.app.state.catalog_cache = CatalogCache.from_env()
+    return request.app.state.catalog_cache
 
-    config: AgentConfig = request.app.state.agent_config
 
-    if agent_type == "search":
-        cache[agent_type] = SearchAgent(config)
-    elif agent_type == "chat":
-        cache[agent_type] = ChatAgent(config)
-    else:
+def _new_stripe_gateway(metrics: Metrics) -> StripeGateway:
+    gateway = StripeGateway.from_env()
+    gateway.observer = metrics.observe_stripe
+    if STRIPE_AVAILABLE:
+        gateway.configure_client(stripe)
+    return gateway
+
+
+def _get_stripe_gateway(request: Request) -> StripeGateway:
+    if not hasattr(request.app.state, "stripe_gateway"):
+        request.app.state.stripe_gateway = _new_stripe_gateway(request.app.state.metrics)
+    return request.app.state.stripe_gateway
+
+
+def _catalog_retriever(app: FastAPI) -> Callable[[str, int], List[Dict[str, Any]]]:
+    def retrieve(message: str, limit: int) -> List[Dict[str, Any]]:
+        return [hit.doc for hit in app.state.search_index.search(message, limit=limit).hits]
+
+    return retrieve
+
+
+def _build_agent_registry(app: FastAPI) -> AgentRegistry:
+    config: AgentConfig = app.state.agent_config
+
+    def configure(agent_type: str, agent) -> None:
+        agent.response_cache = getattr(app.state, "response_cache", None)
+        agent.gate = ConcurrencyGate.from_env(agent_type)
+
+    return AgentRegistry(
+        {
+            "search": lambda: SearchAgent(config),
+            "chat": lambda: ChatAgent(config),
+            "catalog": lambda: CatalogAgent(config, _catalog_retriever(app)),
+        },
+        configure,
+    )
+
+
+def _get_agent_registry(request: Request) -> AgentRegistry:
+    if not hasattr(request.app.state, "agents"):
+        request.app.state.agents = _build_agent_registry(request.app)
+    return request.app.state.agents
+
+
+async def _get_or_create_agent(request: Request, agent_type: str):
+    registry = _get_agent_registry(request)
+    if agent_type not in registry:
         raise HTTPException(status_code=400, detail=f"Unknown agent type '{agent_type}'")
+    return await registry.get(agent_type)
+
+
+def _agent_overloaded(request: Request, agent, exc: AgentOverloadedError) -> HTTPException:
+    request.app.state.metrics.observe_agent(agent.__class__.__name__, {"overloaded": True}, False)
+    return HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": str(exc.retry_after)})
+
+
+def _shed_if_saturated(request: Request, agent) -> None:
+    # Streams answer 200 before the first token, so shed before the response starts
+    try:
+        if agent.gate:
+            agent.gate.check()
+    except AgentOverloadedError as exc:
+        raise _agent_overloaded(request, agent, exc) from exc
+
+
+async def _run_periodically(
+    job: Callable[[], Awaitable[object]],
+    interval_seconds: float,
+    description: str,
+    run_immediately: bool = True,
+):
+    if not run_immediately:
+        await asyncio.sleep(interval_seconds)
+    while True:
+        try:
+            await job()
+        except Exception:  # pragma: no cover - keep running on transient errors
+            logger.exception(f"Failed to {description}")
+        await asyncio.sleep(interval_seconds)
+
+
+STREAM_MEDIA_TYPES = {"sse": "text/event-stream", "ndjson": "application/x-ndjson"}
+
+
+def _stream_agent_events(
+    events: AsyncIterator[Dict[str, Any]],
+    stream_format: str,
+    finalize: Callable[[Dict[str, Any]], Dict[str, Any]],
+) -> StreamingResponse:
+    """Encode agent stream events as SSE or NDJSON; ``finalize`` enriches the final event."""
+
+    async def body():
+        async for event in events:
+            if event["type"] == "final":
+                event = finalize(event)
+            payload = json.dumps(event, default=str)
+            if stream_format == "ndjson":
+                yield payload + "\n"
+            else:
+                yield f"event: {event['type']}\ndata: {payload}\n\n"
+
+    return StreamingResponse(
+        body(),
+        media_type=STREAM_MEDIA_TYPES[stream_format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _search_prompt(query: str) -> str:
+    return (
+        f"Search for information about: {query}. "
+        "Provide a comprehensive summary with key findings."
+    )
+
 
-    return cache[agent_type]
+async def _refresh_catalog_indexes(app: FastAPI) -> None:
+    await app.state.facet_index.refresh(app.state.db)
+    await app.state.search_index.refresh(app.state.db)
 
 
 @asynccontextmanager
@@ -205,16 +393,84 @@ async def lifespan(app: FastAPI):
         missing = [name for name, value in {"MONGO_URL": mongo_url, "DB_NAME": db_name}.items() if not value]
         raise RuntimeError(f"Missing required environment variables: {', '.join(missing)}")
 
-    client = AsyncIOMotorClient(mongo_url)
+    metrics: Metrics = app.state.metrics
+    client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandListener(metrics)])
+    background_tasks: List[asyncio.Task] = []
 
     try:
         app.state.mongo_client = client
         app.state.db = client[db_name]
         app.state.agent_config = AgentConfig()
-        app.state.agent_cache = {}
+        app.state.catalog_cache = CatalogCache.from_env()
+        app.state.stripe_gateway = _new_stripe_gateway(metrics)
+        app.state.response_cache = response_cache_from_env(app.state.db)
+        if isinstance(app.state.response_cache, MongoResponseCache):
+            await app.state.response_cache.ensure_indexes()
+        app.state.index_report = await ensure_indexes(app.state.db)
+        sweep_interval = float(os.getenv("RESERVATION_SWEEP_INTERVAL_SECONDS", "30"))
+        background_tasks.append(asyncio.create_task(_run_periodically(
+            lambda: release_expired(app.state.db), sweep_interval, "release expired stock reservations"
+        )))
+        app.state.webhook_worker = WebhookWorker.from_env(app.state.db)
+        app.state.webhook_worker.start()
+        background_tasks.append(asyncio.create_task(_run_periodically(
+            app.state.webhook_worker.requeue_stale, 30, "requeue pending Stripe events"
+        )))
+        app.state.notifications = NotificationDispatcher.from_env(app.state.db)
+        # Also takes over campaigns whose worker died once their lease expires
+        background_tasks.append(asyncio.create_task(_run_periodically(
+            app.state.notifications.resume_interrupted,
+            app.state.notifications.lease_seconds,
+            "resume interrupted drop campaigns",
+        )))
+        app.state.waiting_room = WaitingRoom.from_env(app.state.db)
+        if app.state.waiting_room is not None:
+            await app.state.waiting_room.refresh()
+            # Pick up rooms opened or closed through other workers
+            background_tasks.append(asyncio.create_task(_run_periodically(
+                app.state.waiting_room.refresh,
+                app.state.waiting_room.refresh_seconds,
+                "refresh waiting rooms",
+                run_immediately=False,
+            )))
+        app.state.facet_index = FacetIndex()
+        app.state.search_index = TextIndex()
+        await _refresh_catalog_indexes(app)
+        # Build every agent and discover MCP tools before traffic arrives; /api/health/ready waits on it
+        app.state.agents = _build_agent_registry(app)
+        background_tasks.append(asyncio.create_task(_run_periodically(
+            app.state.agents.warm_up,
+            float(os.getenv("AGENT_WARM_UP_RETRY_SECONDS", "30")),
+            "warm up agents",
+        )))
+        # Picks up product writes made through other workers
+        background_tasks.append(asyncio.create_task(_run_periodically(
+            lambda: _refresh_catalog_indexes(app),
+            float(os.getenv("CATALOG_INDEX_REFRESH_SECONDS", os.getenv("FACET_REFRESH_SECONDS", "30"))),
+            "refresh the facet and search indexes",
+            run_immediately=False,
+        )))
+        app.state.drop_scheduler = DropScheduler.from_env(
+            app.state.db,
+            app.state.catalog_cache,
+            lambda launch_at: _render_launch_snapshot(app.state.db, launch_at),
+        )
+        app.state.drop_scheduler.on_launch = lambda: _refresh_catalog_indexes(app)
+        background_tasks.append(asyncio.create_task(app.state.drop_scheduler.run()))
+        if os.getenv("CATALOG_CHANGE_STREAM", "").lower() in ("1", "true", "yes"):
+            background_tasks.append(
+                asyncio.create_task(watch_catalog_changes(app.state.db, app.state.catalog_cache))
+            )
         logger.info("AI Agents API starting up")
         yield
     finally:
+        for task in background_tasks:
+            task.cancel()
+        if hasattr(app.state, "webhook_worker"):
+            await app.state.webhook_worker.stop()
+        if hasattr(app.state, "notifications"):
+            await app.state.notifications.stop()
+        app.state.stripe_gateway.shutdown()
         client.close()
         logger.info("AI Agents API shutdown complete")
 
@@ -225,6 +481,39 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+app.state.metrics = Metrics()
+
+
+def _stripe_pool_samples():
+    gateway = getattr(app.state, "stripe_gateway", None)
+    if gateway is None:
+        return []
+    return [(("pending",), gateway.pending), (("active",), gateway.active)]
+
+
+def _agent_gate_samples():
+    samples = []
+    registry = getattr(app.state, "agents", None)
+    for agent_type, agent in registry.items() if registry else ():
+        if agent.gate:
+            samples.append(((agent_type, "waiting"), agent.gate.waiting))
+            samples.append(((agent_type, "active"), agent.gate.active))
+    return samples
+
+
+app.state.metrics.register(GaugeCallback(
+    "agent_gate_calls",
+    "Agent LLM calls waiting for a slot (waiting) or running (active).",
+    ("agent", "state"),
+    _agent_gate_samples,
+))
+app.state.metrics.register(GaugeCallback(
+    "stripe_pool_calls",
+    "Stripe calls waiting for a worker (pending) or running (active).",
+    ("state",),
+    _stripe_pool_samples,
+))
+
 api_router = APIRouter(prefix="/api")
 
 
@@ -233,6 +522,22 @@ async def root():
     return {"message": "Hello World"}
 
 
+@api_router.get("/health/ready")
+async def readiness(request: Request):
+    """Report whether the database answers and every agent is built and warmed (503 until then)"""
+    registry = _get_agent_registry(request)
+    try:
+        await _ensure_db(request).command("ping")
+        database = "ok"
+    except Exception as exc:  # includes the 503 raised before the client exists
+        database = f"unavailable: {exc}"
+    ready = database == "ok" and registry.ready
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "database": database, "agents": registry.status()},
+    )
+
+
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate, request: Request):
     db = _ensure_db(request)
@@ -245,6 +550,8 @@ async def create_status_check(input: StatusCheckCreate, request: Request):
 async def get_status_checks(request: Request):
     db = _ensure_db(request)
     status_checks = await db.status_checks.find().to_list(1000)
+    if fast_json_enabled():
+        return documents_response(StatusCheck, status_checks)
     return [StatusCheck(**status_check) for status_check in status_checks]
 
 
@@ -252,7 +559,11 @@ async def get_status_checks(request: Request):
 async def chat_with_agent(chat_request: ChatRequest, request: Request):
     try:
         agent = await _get_or_create_agent(request, chat_request.agent_type)
-        response = await agent.execute(chat_request.message)
+        try:
+            response = await agent.execute(chat_request.message)
+        except AgentOverloadedError as exc:
+            raise _agent_overloaded(request, agent, exc) from exc
+        request.app.state.metrics.observe_agent(agent.__class__.__name__, response.metadata, response.success)
 
         return ChatResponse(
             success=response.success,
@@ -279,11 +590,11 @@ async def chat_with_agent(chat_request: ChatRequest, request: Request):
 async def search_and_summarize(search_request: SearchRequest, request: Request):
     try:
         search_agent = await _get_or_create_agent(request, "search")
-        search_prompt = (
-            f"Search for information about: {search_request.query}. "
-            "Provide a comprehensive summary with key findings."
-        )
-        result = await search_agent.execute(search_prompt, use_tools=True)
+        try:
+            result = await search_agent.execute(_search_prompt(search_request.query), use_tools=True)
+        except AgentOverloadedError as exc:
+            raise _agent_overloaded(request, search_agent, exc) from exc
+        request.app.state.metrics.observe_agent(search_agent.__class__.__name__, result.metadata, result.success)
 
         if result.success:
             metadata = result.metadata or {}
@@ -315,6 +626,51 @@ async def search_and_summarize(search_request: SearchRequest, request: Request):
         )
 
 
+@api_router.post("/chat/stream")
+async def stream_chat_with_agent(
+    chat_request: ChatRequest,
+    request: Request,
+    format: str = Query("sse", pattern="^(sse|ndjson)$"),
+):
+    """Stream chat tokens and tool events as SSE (default) or NDJSON"""
+    agent = await _get_or_create_agent(request, chat_request.agent_type)
+    _shed_if_saturated(request, agent)
+
+    def finalize(event: Dict[str, Any]) -> Dict[str, Any]:
+        request.app.state.metrics.observe_agent(agent.__class__.__name__, event["metadata"], event["success"])
+        return {
+            **event,
+            "agent_type": chat_request.agent_type,
+            "capabilities": agent.get_capabilities(),
+        }
+
+    return _stream_agent_events(agent.stream(chat_request.message), format, finalize)
+
+
+@api_router.post("/search/stream")
+async def stream_search_and_summarize(
+    search_request: SearchRequest,
+    request: Request,
+    format: str = Query("sse", pattern="^(sse|ndjson)$"),
+):
+    """Stream the search summary and tool calls as SSE (default) or NDJSON"""
+    search_agent = await _get_or_create_agent(request, "search")
+    _shed_if_saturated(request, search_agent)
+
+    def finalize(event: Dict[str, Any]) -> Dict[str, Any]:
+        metadata = event.get("metadata") or {}
+        request.app.state.metrics.observe_agent(search_agent.__class__.__name__, metadata, event["success"])
+        return {
+            **event,
+            "query": search_request.query,
+            "summary": event.get("content", ""),
+            "sources_count": int(metadata.get("tool_call_count", 0) or 0),
+        }
+
+    events = search_agent.stream(_search_prompt(search_request.query), use_tools=True)
+    return _stream_agent_events(events, format, finalize)
+
+
 @api_router.get("/agents/capabilities")
 async def get_agent_capabilities(request: Request):
     try:
@@ -335,28 +691,132 @@ async def get_agent_capabilities(request: Request):
         return {"success": False, "error": str(exc)}
 
 
+@api_router.get("/admin/agents/stats")
+async def get_agent_stats(request: Request):
+    """Per-agent concurrency gate and request coalescing counters (Admin endpoint)"""
+    return {
+        agent_type: {
+            "gate": agent.gate.stats() if agent.gate else None,
+            "in_flight": agent.in_flight.stats(),
+        }
+        for agent_type, agent in _get_agent_registry(request).items()
+    }
+
+
 # Product Endpoints
+def _product_changed(
+    request: Request,
+    product_id: str,
+    before: Optional[dict] = None,
+    after: Optional[dict] = None,
+) -> None:
+    # Every admin write keeps the catalog cache and the in-memory indexes in step
+    _get_catalog_cache(request).invalidate(product_id, before, after)
+    for index in (request.app.state.facet_index, request.app.state.search_index):
+        if after is None:
+            index.remove(product_id)
+        else:
+            index.upsert(after)
+
+
+def _new_product(product_input: ProductCreate) -> Product:
+    product = Product(**product_input.model_dump())
+    product.published = is_due(product.publish_at)
+    return product
+
+
+def _product_update_fields(product_update: ProductUpdate) -> Dict[str, Any]:
+    update_data = {k: v for k, v in product_update.model_dump().items() if v is not None}
+    if "publish_at" in update_data:
+        update_data["published"] = is_due(update_data["publish_at"])
+    return update_data
+
+
 @api_router.post("/products", response_model=Product)
 async def create_product(product_input: ProductCreate, request: Request):
     """Create a new product (Admin endpoint)"""
     db = _ensure_db(request)
-    product = Product(**product_input.model_dump())
-    await db.products.insert_one(product.model_dump())
+    product = _new_product(product_input)
+    product_doc = product.model_dump()
+    await db.products.insert_one(product_doc)
+    _product_changed(request, product.id, after=product_doc)
+    if not product.published:
+        request.app.state.drop_scheduler.wake()
     return product
 
 
-@api_router.get("/products", response_model=List[Product])
-async def get_products(
-    request: Request,
-    category: Optional[str] = None,
-    color: Optional[str] = None,
-    featured: Optional[bool] = None,
-    min_price: Optional[float] = None,
-    max_price: Optional[float] = None,
-):
-    """Get all products with optional filtering"""
+def _validate_product_record(record: Dict[str, Any]) -> Tuple[str, str, Dict[str, Any]]:
+    # Records with an id update that product; records without one create a new product
+    product_id = record.get("id")
+    if product_id is None:
+        product = _new_product(ProductCreate(**record))
+        return "create", product.id, product.model_dump()
+    return "update", str(product_id), _product_update_fields(ProductUpdate(**record))
+
+
+async def _upload_chunks(upload, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+@api_router.post("/products/bulk")
+async def bulk_import_products(request: Request):
+    """Bulk create/update products from JSON lines (Admin endpoint).
+
+    Send the records as an ``application/x-ndjson`` body, or as the ``file``
+    field of a multipart upload. A record without ``id`` is a ``ProductCreate``;
+    one with ``id`` is a ``ProductUpdate`` for that product. Every row gets
+    its own result, and invalid rows do not stop the import.
+    """
     db = _ensure_db(request)
-    query = {}
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Multipart uploads need a 'file' field")
+        chunks = _upload_chunks(upload)
+    else:
+        chunks = request.stream()
+
+    report = await import_products(
+        db, iter_jsonl(chunks), _validate_product_record, cache=_get_catalog_cache(request)
+    )
+    if report["created"] or report["updated"]:
+        await _refresh_catalog_indexes(request.app)
+    request.app.state.drop_scheduler.wake()
+    return report
+
+
+async def _load_product(request: Request, product_id: str) -> Optional[Product]:
+    cache = _get_catalog_cache(request)
+    product = cache.get_product(product_id)
+    if product is not None:
+        return product
+
+    db = _ensure_db(request)
+    product_doc = await db.products.find_one({"id": product_id})
+    if not product_doc:
+        return None
+    product = Product(**product_doc)
+    cache.set_product(product_id, product)
+    return product
+
+
+async def _query_products(
+    db,
+    filters: ListingFilters,
+    projection,
+    page_filter,
+    limit,
+    cursor,
+    include_unpublished: bool = False,
+    visible_at: Optional[datetime] = None,
+):
+    query = {} if include_unpublished else visible_filter(visible_at)
+    category, color, featured, min_price, max_price = filters
 
     if category:
         query["category"] = category
@@ -371,18 +831,172 @@ async def get_products(
         if max_price is not None:
             query["price"]["$lte"] = max_price
 
-    products = await db.products.find(query).sort("created_at", -1).to_list(1000)
-    return [Product(**product) for product in products]
+    if page_filter:
+        query = {"$and": [query, page_filter]} if query else page_filter
+
+    page_size = limit or (MAX_PAGE_SIZE if cursor else 1000)
+    products = await db.products.find(query, projection).sort(SORT_ORDER).to_list(page_size + 1)
+
+    headers = {}
+    if len(products) > page_size:
+        products = products[:page_size]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(products[-1])
+
+    for product in products:
+        product.pop("_id", None)
+    return products, headers
+
+
+def _listing_key(
+    filters: ListingFilters,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    max_images: Optional[int] = None,
+    include_unpublished: bool = False,
+) -> ListingKey:
+    return ListingKey(filters, (limit, cursor, fields, max_images, include_unpublished))
+
+
+# Listings the storefront requests first when a drop opens: shop grid and home page
+LAUNCH_LISTINGS = (ListingFilters(), ListingFilters(featured=True))
+
+
+async def _render_launch_snapshot(db, launch_at: datetime) -> LaunchSnapshot:
+    listings = []
+    products: Dict[str, Product] = {}
+    for filters in LAUNCH_LISTINGS:
+        docs, headers = await _query_products(db, filters, None, None, None, None, visible_at=launch_at)
+        items = [Product(**{**doc, "published": True}) for doc in docs]
+        body = json.dumps(jsonable_encoder(items)).encode()
+        listings.append((_listing_key(filters), (body, headers), [item.id for item in items]))
+        products.update((item.id, item) for item in items)
+    return LaunchSnapshot(listings, products)
+
+
+@api_router.get("/products", response_model=List[Product])
+async def get_products(
+    request: Request,
+    response: Response,
+    category: Optional[str] = None,
+    color: Optional[str] = None,
+    featured: Optional[bool] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    max_images: Optional[int] = Query(None, ge=0),
+    include_unpublished: bool = False,
+):
+    """Get all products with optional filtering.
+
+    Pass ``limit`` to page through the catalog; the opaque cursor for the next
+    page is returned in the ``X-Next-Cursor`` header. ``fields`` and
+    ``max_images`` trim each document for grid views. Scheduled drops are
+    hidden until launch unless ``include_unpublished`` is set (Admin).
+    """
+    db = _ensure_db(request)
+    try:
+        projection = build_projection(fields, Product.model_fields.keys(), max_images)
+        page_filter = keyset_filter(cursor)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    cache = _get_catalog_cache(request)
+    cache_key = _listing_key(
+        ListingFilters(category or None, color or None, featured, min_price, max_price),
+        limit, cursor, fields, max_images, include_unpublished,
+    )
+    cached = cache.get_listing(cache_key)
+    if cached is None:
+        items, headers = await _query_products(
+            db, cache_key.filters, projection, page_filter, limit, cursor, include_unpublished
+        )
+        product_ids = [item["id"] for item in items]
+        if fast_json_enabled():
+            # Encode once at fill time; cache hits then send the bytes as-is
+            items = dumps(items) if fields else encode_documents(Product, items)
+        elif fields:
+            # Partial documents do not satisfy the Product model; send them as-is
+            items = jsonable_encoder(items)
+        else:
+            items = [Product(**item) for item in items]
+        cached = (items, headers)
+        cache.set_listing(cache_key, cached, product_ids)
+
+    items, headers = cached
+    if isinstance(items, bytes):
+        # Pre-encoded by the fast JSON path or by the drop launch snapshot
+        return Response(content=items, media_type="application/json", headers=headers)
+    if fields:
+        return JSONResponse(content=items, headers=headers)
+
+    response.headers.update(headers)
+    return items
+
+
+@api_router.get("/products/browse")
+async def browse_products(
+    request: Request,
+    category: Optional[List[str]] = Query(None),
+    color: Optional[List[str]] = Query(None),
+    size: Optional[List[str]] = Query(None),
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: Optional[bool] = None,
+    featured: Optional[bool] = None,
+    limit: int = Query(24, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+):
+    """Filter the catalog in memory and return facet counts with the page.
+
+    Repeat ``category``, ``color`` or ``size`` to match any of several values;
+    ``size`` only matches sizes that are in stock. Served from the facet
+    index without a Mongo round trip.
+    """
+    query = FacetQuery(
+        tuple(category or ()), tuple(color or ()), tuple(size or ()), min_price, max_price, in_stock, featured
+    )
+    result = request.app.state.facet_index.search(query, offset, limit)
+    body = {
+        "total": result.total,
+        "items": [shape_document(Product, doc) for doc in result.items],
+        "facets": result.facets,
+    }
+    return FastJSONResponse(content=body) if fast_json_enabled() else body
+
+
+@api_router.get("/products/search")
+async def search_products(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+):
+    """Rank products by BM25 over name, color and description.
+
+    The last word matches as a prefix and misspelled words match terms one edit
+    away, so the endpoint can back a search-as-you-type box. Served from the
+    local inverted index; no LLM or Mongo call is made.
+    """
+    result = request.app.state.search_index.search(q, offset, limit)
+    body = {
+        "query": q,
+        "total": result.total,
+        "items": [{**shape_document(Product, hit.doc), "score": round(hit.score, 4)} for hit in result.hits],
+        "matched_terms": result.expansions,
+    }
+    return FastJSONResponse(content=body) if fast_json_enabled() else body
 
 
 @api_router.get("/products/{product_id}", response_model=Product)
 async def get_product(product_id: str, request: Request):
     """Get a single product by ID"""
-    db = _ensure_db(request)
-    product = await db.products.find_one({"id": product_id})
-    if not product:
+    product = await _load_product(request, product_id)
+    if not product or not product.published:
         raise HTTPException(status_code=404, detail="Product not found")
-    return Product(**product)
+    return product
 
 
 @api_router.put("/products/{product_id}", response_model=Product)
@@ -394,16 +1008,27 @@ async def update_product(product_id: str, product_update: ProductUpdate, request
     if not existing_product:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    update_data = {k: v for k, v in product_update.model_dump().items() if v is not None}
+    update_data = _product_update_fields(product_update)
 
     if update_data:
         await db.products.update_one({"id": product_id}, {"$set": update_data})
         updated_product = await db.products.find_one({"id": product_id})
+        _product_changed(request, product_id, existing_product, updated_product)
+        if "publish_at" in update_data:
+            request.app.state.drop_scheduler.wake()
         return Product(**updated_product)
 
     return Product(**existing_product)
 
 
+@api_router.get("/admin/drops/scheduler")
+async def get_drop_scheduler_stats(request: Request):
+    """Drop launch scheduler state and next scheduled launch (Admin endpoint)"""
+    scheduler: DropScheduler = request.app.state.drop_scheduler
+    next_launch = await scheduler.next_launch()
+    return {**scheduler.stats(), "next_launch": next_launch.isoformat() if next_launch else None}
+
+
 @api_router.delete("/products/{product_id}")
 async def delete_product(product_id: str, request: Request):
     """Delete a product (Admin endpoint)"""
@@ -411,6 +1036,7 @@ async def delete_product(product_id: str, request: Request):
     result = await db.products.delete_one({"id": product_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    _product_changed(request, product_id)
     return {"success": True, "message": "Product deleted"}
 
 
@@ -426,7 +1052,12 @@ async def subscribe_to_drops(subscriber_input: DropsSubscriberCreate, request: R
         return DropsSubscriber(**existing)
 
     subscriber = DropsSubscriber(**subscriber_input.model_dump())
-    await db.drops_subscribers.insert_one(subscriber.model_dump())
+    try:
+        await db.drops_subscribers.insert_one(subscriber.model_dump())
+    except DuplicateKeyError:
+        # Lost a race with a concurrent subscribe for the same email
+        existing = await db.drops_subscribers.find_one({"email": subscriber_input.email})
+        return DropsSubscriber(**existing)
     return subscriber
 
 
@@ -438,37 +1069,117 @@ async def get_drops_subscribers(request: Request):
     return [DropsSubscriber(**sub) for sub in subscribers]
 
 
+def _export_response(cursor, export_format: str, columns, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        export_rows(cursor.batch_size(EXPORT_BATCH_SIZE), export_format, columns),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'},
+    )
+
+
+@api_router.get("/drops/subscribers/export")
+async def export_drops_subscribers(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+):
+    """Stream every drops subscriber as NDJSON or CSV (Admin endpoint)"""
+    db = _ensure_db(request)
+    cursor = db.drops_subscribers.find({}, {"_id": 0}).sort("subscribed_at", -1)
+    return _export_response(cursor, format, list(DropsSubscriber.model_fields), "drops_subscribers")
+
+
+@api_router.post("/admin/drops/notify")
+async def create_drop_campaign(campaign_input: DropCampaignCreate, request: Request):
+    """Start mailing every drops subscriber in the background (Admin endpoint)"""
+    _ensure_db(request)
+    dispatcher: NotificationDispatcher = request.app.state.notifications
+    try:
+        campaign = await dispatcher.create(
+            campaign_input.subject, campaign_input.body, campaign_input.rate_per_second
+        )
+    except NotificationsDisabledError as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    return await dispatcher.progress(campaign["id"])
+
+
+@api_router.get("/admin/drops/notify")
+async def get_drop_notifier_stats(request: Request):
+    """Notification transport and active campaigns (Admin endpoint)"""
+    return request.app.state.notifications.stats()
+
+
+@api_router.get("/admin/drops/notify/{campaign_id}")
+async def get_drop_campaign(campaign_id: str, request: Request):
+    """Progress of a drop notification campaign (Admin endpoint)"""
+    campaign = await request.app.state.notifications.progress(campaign_id)
+    if campaign is None:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign
+
+
+@api_router.post("/admin/drops/notify/{campaign_id}/resume")
+async def resume_drop_campaign(campaign_id: str, request: Request):
+    """Resume a cancelled, failed or interrupted campaign from its checkpoint (Admin endpoint)"""
+    dispatcher: NotificationDispatcher = request.app.state.notifications
+    try:
+        campaign = await dispatcher.resume(campaign_id)
+    except NotificationsDisabledError as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    if campaign is None:
+        raise HTTPException(status_code=404, detail="Campaign not found or already completed")
+    return await dispatcher.progress(campaign_id)
+
+
+@api_router.delete("/admin/drops/notify/{campaign_id}")
+async def cancel_drop_campaign(campaign_id: str, request: Request):
+    """Stop a running campaign; it can be resumed later (Admin endpoint)"""
+    if not await request.app.state.notifications.cancel(campaign_id):
+        raise HTTPException(status_code=404, detail="No running campaign with this id")
+    return {"success": True}
+
+
 # Cart Endpoints
 @api_router.post("/cart/add", response_model=CartItem)
 async def add_to_cart(cart_item_input: CartItemCreate, request: Request):
     """Add item to cart"""
     db = _ensure_db(request)
 
-    # Verify product exists
-    product = await db.products.find_one({"id": cart_item_input.product_id})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
+    if cart_item_input.quantity < 1:
+        raise HTTPException(status_code=400, detail="Quantity must be at least 1")
 
-    # Check if item already in cart
-    existing = await db.cart_items.find_one({
-        "user_id": cart_item_input.user_id,
-        "product_id": cart_item_input.product_id,
-        "size": cart_item_input.size
-    })
+    # Verify product and size availability from the catalog cache
+    product = await _load_product(request, cart_item_input.product_id)
+    if not product or not product.published:
+        raise HTTPException(status_code=404, detail="Product not found")
 
-    if existing:
-        # Update quantity
-        new_quantity = existing["quantity"] + cart_item_input.quantity
-        await db.cart_items.update_one(
-            {"id": existing["id"]},
-            {"$set": {"quantity": new_quantity}}
-        )
-        updated = await db.cart_items.find_one({"id": existing["id"]})
-        return CartItem(**updated)
+    size_stock = next((entry for entry in product.sizes if entry.size == cart_item_input.size), None)
+    if not size_stock:
+        raise HTTPException(status_code=400, detail="Size not available")
+    if size_stock.stock < cart_item_input.quantity:
+        raise HTTPException(status_code=409, detail="Not enough stock for this size")
 
+    # One atomic upsert per call: creates the line or adds to its quantity.
+    # The unique cart_items_line index makes concurrent double-clicks converge.
     cart_item = CartItem(**cart_item_input.model_dump())
-    await db.cart_items.insert_one(cart_item.model_dump())
-    return cart_item
+    line = {
+        "user_id": cart_item.user_id,
+        "product_id": cart_item.product_id,
+        "size": cart_item.size
+    }
+    update = {
+        "$inc": {"quantity": cart_item.quantity},
+        "$setOnInsert": {"id": cart_item.id, "added_at": cart_item.added_at}
+    }
+    try:
+        updated = await db.cart_items.find_one_and_update(
+            line, update, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # A concurrent upsert inserted the line first; add to it instead
+        updated = await db.cart_items.find_one_and_update(
+            line, update, return_document=ReturnDocument.AFTER
+        )
+    return CartItem(**updated)
 
 
 @api_router.get("/cart/{user_id}", response_model=List[dict])
@@ -477,16 +1188,13 @@ async def get_cart(user_id: str, request: Request):
     db = _ensure_db(request)
     cart_items = await db.cart_items.find({"user_id": user_id}).to_list(1000)
 
-    cart_with_products = []
-    for item in cart_items:
-        product = await db.products.find_one({"id": item["product_id"]})
-        if product:
-            cart_with_products.append({
-                "cart_item": CartItem(**item).model_dump(),
-                "product": Product(**product).model_dump()
-            })
-
-    return cart_with_products
+    return [
+        {
+            "cart_item": CartItem(**item).model_dump(),
+            "product": Product(**product).model_dump()
+        }
+        for item, product in await hydrate_cart_items(db, cart_items)
+    ]
 
 
 @api_router.delete("/cart/{item_id}")
@@ -519,15 +1227,41 @@ async def update_cart_quantity(item_id: str, quantity: int, request: Request):
 
 
 # Order Endpoints
+def _reservation_lines(priced_items: List[dict]) -> List[ReservationLine]:
+    return [ReservationLine(item["product_id"], item["size"], item["quantity"]) for item in priced_items]
+
+
 @api_router.post("/orders", response_model=Order)
 async def create_order(order_input: OrderCreate, request: Request):
-    """Create an order after payment"""
+    """Create an order after payment, priced server-side from the user's cart"""
     db = _ensure_db(request)
-    order = Order(**order_input.model_dump())
-    await db.orders.insert_one(order.model_dump())
+    priced = await price_cart(db, order_input.user_id, order_input.cart_items)
+    if not priced.items:
+        raise HTTPException(status_code=400, detail="No valid items in cart")
+
+    # Same stock guarantee as /api/checkout: the order only exists if its stock was taken
+    try:
+        reservation = await reserve_stock(db, order_input.user_id, _reservation_lines(priced.items))
+    except InsufficientStockError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+
+    order = Order(
+        user_id=order_input.user_id,
+        items=priced.items,
+        total=priced.total,
+        stripe_payment_id=order_input.stripe_payment_id,
+        reservation_id=reservation["id"],
+        shipping_address=order_input.shipping_address
+    )
+    try:
+        await db.orders.insert_one(order.model_dump())
+    except BaseException:
+        await release_reservation(db, reservation["id"])
+        raise
+    await commit_reservation(db, reservation["id"])
 
-    # Clear user's cart
-    await db.cart_items.delete_many({"user_id": order_input.user_id})
+    # Clear the ordered cart lines
+    await db.cart_items.delete_many({"id": {"$in": priced.cart_item_ids}})
 
     return order
 
@@ -537,6 +1271,8 @@ async def get_user_orders(user_id: str, request: Request):
     """Get user's order history"""
     db = _ensure_db(request)
     orders = await db.orders.find({"user_id": user_id}).sort("created_at", -1).to_list(1000)
+    if fast_json_enabled():
+        return documents_response(Order, orders)
     return [Order(**order) for order in orders]
 
 
@@ -545,9 +1281,32 @@ async def get_all_orders(request: Request):
     """Get all orders (Admin endpoint)"""
     db = _ensure_db(request)
     orders = await db.orders.find().sort("created_at", -1).to_list(1000)
+    if fast_json_enabled():
+        return documents_response(Order, orders)
     return [Order(**order) for order in orders]
 
 
+@api_router.get("/admin/orders/export")
+async def export_all_orders(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+):
+    """Stream every order as NDJSON or CSV (Admin endpoint)"""
+    db = _ensure_db(request)
+    cursor = db.orders.find({}, {"_id": 0}).sort("created_at", -1)
+    return _export_response(cursor, format, list(Order.model_fields), "orders")
+
+
+@api_router.get("/admin/indexes")
+async def get_index_status(request: Request):
+    """Report declared indexes and whether each one exists (Admin endpoint)"""
+    db = _ensure_db(request)
+    return {
+        "startup": getattr(request.app.state, "index_report", []),
+        "current": await index_status(db),
+    }
+
+
 # Stripe Checkout Endpoint
 @api_router.post("/checkout")
 async def create_checkout_session(checkout_request: CheckoutRequest, request: Request):
@@ -562,38 +1321,22 @@ async def create_checkout_session(checkout_request: CheckoutRequest, request: Re
     if not stripe_key:
         raise HTTPException(status_code=500, detail="Stripe not configured")
 
-    stripe.api_key = stripe_key
-
-    # Get cart items
-    cart_items = []
-    total = 0.0
-
-    for cart_item_id in checkout_request.cart_items:
-        cart_item_doc = await db.cart_items.find_one({"id": cart_item_id})
-        if not cart_item_doc:
-            continue
-
-        product = await db.products.find_one({"id": cart_item_doc["product_id"]})
-        if not product:
-            continue
-
-        item_total = product["price"] * cart_item_doc["quantity"]
-        total += item_total
-
-        cart_items.append({
-            "product_id": product["id"],
-            "product_name": product["name"],
-            "size": cart_item_doc["size"],
-            "quantity": cart_item_doc["quantity"],
-            "price": product["price"]
-        })
+    # Price the cart lines against current product prices
+    cart_items, total, cart_item_ids = await price_cart(db, checkout_request.user_id, checkout_request.cart_items)
 
     if not cart_items:
         raise HTTPException(status_code=400, detail="No valid items in cart")
 
+    # Hold the stock for the lifetime of the Stripe session
     try:
-        # Create Stripe checkout session
-        session = stripe.checkout.Session.create(
+        reservation = await reserve_stock(db, checkout_request.user_id, _reservation_lines(cart_items))
+    except InsufficientStockError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+
+    def create_session():
+        # Runs on the Stripe pool, so the expiry is computed as the request leaves
+        return stripe.checkout.Session.create(
+            api_key=stripe_key,
             payment_method_types=["card"],
             line_items=[
                 {
@@ -611,11 +1354,23 @@ async def create_checkout_session(checkout_request: CheckoutRequest, request: Re
             mode="payment",
             success_url=os.getenv("STRIPE_SUCCESS_URL", "http://localhost:3000/success?session_id={CHECKOUT_SESSION_ID}"),
             cancel_url=os.getenv("STRIPE_CANCEL_URL", "http://localhost:3000/cart"),
+            expires_at=int(stripe_session_expires_at(reservation).timestamp()),
             metadata={
                 "user_id": checkout_request.user_id,
+                "reservation_id": reservation["id"],
             }
         )
 
+    gateway = _get_stripe_gateway(request)
+    try:
+        # Create Stripe checkout session off the event loop
+        session = await gateway.call(create_session)
+        session_expires_at = datetime.fromtimestamp(session.expires_at, timezone.utc)
+        if not await attach_session(db, reservation["id"], session.id, session_expires_at):
+            # The hold lapsed while Stripe was answering; do not leave a payable session behind
+            await gateway.call(stripe.checkout.Session.expire, session.id, api_key=stripe_key)
+            raise HTTPException(status_code=409, detail="Stock reservation expired, please retry checkout")
+
         # Create order with pending status
         order = Order(
             user_id=checkout_request.user_id,
@@ -623,6 +1378,8 @@ async def create_checkout_session(checkout_request: CheckoutRequest, request: Re
             total=total,
             status="pending",
             stripe_payment_id=session.id,
+            reservation_id=reservation["id"],
+            cart_item_ids=cart_item_ids,
             shipping_address=checkout_request.shipping_address
         )
         await db.orders.insert_one(order.model_dump())
@@ -636,17 +1393,101 @@ async def create_checkout_session(checkout_request: CheckoutRequest, request: Re
 
     except stripe.error.StripeError as e:
         logger.error(f"Stripe error: {str(e)}")
+        await release_reservation(db, reservation["id"])
         raise HTTPException(status_code=400, detail=str(e))
+    except StripeTimeoutError as e:
+        logger.error(f"Stripe timeout: {str(e)}")
+        await release_reservation(db, reservation["id"])
+        raise HTTPException(status_code=504, detail=str(e))
+
+
+@api_router.get("/admin/stripe/stats")
+async def get_stripe_stats(request: Request):
+    """Stripe worker pool queue depth and timings (Admin endpoint)"""
+    return _get_stripe_gateway(request).stats()
+
+
+@api_router.post("/checkout/{session_id}/cancel")
+async def cancel_checkout_session(session_id: str, cancel_request: CheckoutCancel, request: Request):
+    """Expire the shopper's Stripe session, then release the stock it held"""
+    if not STRIPE_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Payment processing unavailable")
+
+    db = _ensure_db(request)
+    order = await db.orders.find_one(
+        {"stripe_payment_id": session_id, "user_id": cancel_request.user_id}, {"_id": 0, "status": 1}
+    )
+    if not order:
+        raise HTTPException(status_code=404, detail="Checkout session not found")
+
+    # The stock may only go back once Stripe can no longer take a payment on the session
+    stripe_key = os.getenv("STRIPE_SECRET_KEY")
+    gateway = _get_stripe_gateway(request)
+    try:
+        await gateway.call(stripe.checkout.Session.expire, session_id, api_key=stripe_key)
+    except stripe.error.StripeError as exc:
+        # Expiring fails for sessions that are already expired or already paid
+        session = await gateway.call(stripe.checkout.Session.retrieve, session_id, api_key=stripe_key)
+        if session.status != "expired":
+            raise HTTPException(status_code=409, detail=f"Checkout session is {session.status}") from exc
+    except StripeTimeoutError as exc:
+        raise HTTPException(status_code=504, detail=str(exc)) from exc
+
+    released = await expire_checkout(db, session_id)
+    return {"success": True, "released": released}
+
+
+# Drop Waiting Room Endpoints
+@api_router.post("/waiting-room/{drop_id}/join")
+async def join_waiting_room(drop_id: str, ticket: WaitingRoomJoin, request: Request):
+    """Join a drop's queue and receive a queue token bound to the user; joining again keeps the place"""
+    try:
+        return await _get_waiting_room(request).join(drop_id, ticket.user_id)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail="No waiting room open for this drop") from exc
+
+
+@api_router.get("/waiting-room/status")
+async def get_waiting_room_status(user_id: str, request: Request):
+    """Check queue position and admission for the user's token in X-Queue-Token"""
+    waiting_room = _get_waiting_room(request)
+    token = request.headers.get(QUEUE_TOKEN_HEADER)
+    if not token:
+        raise HTTPException(status_code=400, detail="Missing queue token")
+    try:
+        return waiting_room.status(token, user_id)
+    except InvalidQueueTokenError as exc:
+        raise HTTPException(status_code=403, detail=str(exc)) from exc
+
+
+@api_router.get("/admin/waiting-room")
+async def get_waiting_rooms(request: Request):
+    """List open waiting rooms and admission counters (Admin endpoint)"""
+    return _get_waiting_room(request).stats()
+
+
+@api_router.post("/admin/waiting-room/{drop_id}")
+async def open_waiting_room(drop_id: str, settings: WaitingRoomOpen, request: Request):
+    """Open (or reset) the waiting room for a drop (Admin endpoint)"""
+    room = await _get_waiting_room(request).open(drop_id, settings.rate_per_second, settings.burst)
+    return {"success": True, "drop_id": room.drop_id, "opened_at": room.opened_at}
+
+
+@api_router.delete("/admin/waiting-room/{drop_id}")
+async def close_waiting_room(drop_id: str, request: Request):
+    """Close a drop's waiting room so gated routes stop requiring tokens (Admin endpoint)"""
+    if not await _get_waiting_room(request).close(drop_id):
+        raise HTTPException(status_code=404, detail="No waiting room open for this drop")
+    return {"success": True}
 
 
 @api_router.post("/webhook/stripe")
 async def stripe_webhook(request: Request):
-    """Handle Stripe webhook events"""
+    """Verify and record a Stripe webhook event; fulfilment runs on the webhook worker"""
     if not STRIPE_AVAILABLE:
         raise HTTPException(status_code=503, detail="Stripe not available")
 
     db = _ensure_db(request)
-    stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
     webhook_secret = os.getenv("STRIPE_WEBHOOK_SECRET")
 
     payload = await request.body()
@@ -654,41 +1495,48 @@ async def stripe_webhook(request: Request):
 
     try:
         if webhook_secret:
-            event = stripe.Webhook.construct_event(payload, sig_header, webhook_secret)
-        else:
-            event = stripe.Event.construct_from(
-                stripe.util.convert_to_dict(payload), stripe.api_key
-            )
+            stripe.Webhook.construct_event(payload, sig_header, webhook_secret)
+        event = json.loads(payload)
+        event_id, event_type = event["id"], event["type"]
+    except Exception as e:
+        logger.error(f"Webhook error: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # Handle successful payment
-        if event["type"] == "checkout.session.completed":
-            session = event["data"]["object"]
-            payment_id = session["id"]
+    # Stripe retries deliver the same event id; only the first one is queued
+    if await record_event(db, event):
+        request.app.state.webhook_worker.submit(event_id)
+        return {"success": True, "type": event_type}
 
-            # Update order status
-            await db.orders.update_one(
-                {"stripe_payment_id": payment_id},
-                {"$set": {"status": "paid"}}
-            )
+    return {"success": True, "type": event_type, "duplicate": True}
 
-            # Clear user's cart
-            user_id = session.get("metadata", {}).get("user_id")
-            if user_id:
-                await db.cart_items.delete_many({"user_id": user_id})
 
-        return {"success": True}
-
-    except Exception as e:
-        logger.error(f"Webhook error: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
+@api_router.get("/admin/webhooks/stats")
+async def get_webhook_stats(request: Request):
+    """Webhook fulfilment queue depth and outcome counters (Admin endpoint)"""
+    return request.app.state.webhook_worker.stats()
 
 
 app.include_router(api_router)
 
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(
+        request.app.state.metrics.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+app.add_middleware(WaitingRoomMiddleware, waiting_room_of=lambda: getattr(app.state, "waiting_room", None))
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "Retry-After"],
 )
+
+app.add_middleware(MetricsMiddleware, metrics=app.state.metrics)
@@ -0,0 +1,74 @@
+"""Tests for the agent concurrency gate and request coalescing (no external services needed)."""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from ai_agents.limits import AgentOverloadedError, ConcurrencyGate, SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_gate_queues_up_to_the_limit_then_sheds():
+    gate = ConcurrencyGate("chat", max_concurrent=1, max_queue=1)
+    release = asyncio.Event()
+
+    async def call():
+        async with gate.slot():
+            await release.wait()
+
+    running = asyncio.create_task(call())
+    queued = asyncio.create_task(call())
+    await asyncio.sleep(0)
+    assert (gate.active, gate.waiting) == (1, 1)
+
+    with pytest.raises(AgentOverloadedError) as excinfo:
+        async with gate.slot():
+            pass
+    assert excinfo.value.retry_after >= 1
+
+    release.set()
+    await asyncio.gather(running, queued)
+    assert gate.stats()["admitted"] == 2
+    assert gate.stats()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_identical_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = 0
+
+    async def answer():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "Friday at 10am"
+
+    results = await asyncio.gather(*(flight.do("next drop", answer) for _ in range(5)))
+
+    assert calls == 1
+    assert [result for result, _ in results] == ["Friday at 10am"] * 5
+    assert sum(shared for _, shared in results) == 4
+    assert flight.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight()
+
+    async def answer():
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    leader = asyncio.create_task(flight.do("key", answer))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flight.do("key", answer))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == ("ok", True)
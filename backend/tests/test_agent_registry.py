@@ -0,0 +1,129 @@
+"""Tests for the agent registry (no external services needed)."""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from ai_agents.agents import ToolDiscoveryError
+from ai_agents.registry import AgentRegistry
+
+
+class FakeAgent:
+    def __init__(self, fail: bool = False, tools_down: bool = False):
+        self.fail = fail
+        self.tools_down = tools_down
+        self.mcp_tools = ["web_search"]
+        self.warm_ups = 0
+
+    async def warm_up(self):
+        self.warm_ups += 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("MCP unreachable")
+        if self.tools_down:
+            raise ToolDiscoveryError("MCP discovery returned no tools")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_first_callers_share_one_build():
+    built = []
+
+    def factory():
+        built.append(FakeAgent())
+        return built[-1]
+
+    registry = AgentRegistry({"search": factory})
+    agents = await asyncio.gather(*(registry.get("search") for _ in range(5)))
+
+    assert len(built) == 1
+    assert all(agent is built[0] for agent in agents)
+    assert built[0].warm_ups == 1
+    assert registry.status()["search"]["tools"] == 1
+
+
+@pytest.mark.asyncio
+async def test_warm_up_reports_failures_and_retries_lazily():
+    attempts = []
+
+    def flaky():
+        attempts.append(FakeAgent(fail=not attempts))
+        return attempts[-1]
+
+    configured = []
+    registry = AgentRegistry(
+        {"chat": FakeAgent, "search": flaky},
+        configure=lambda name, agent: configured.append(name),
+    )
+    status = await registry.warm_up()
+
+    assert status["chat"]["state"] == "ready"
+    assert status["search"] == {"state": "failed", "error": "MCP unreachable"}
+    assert not registry.ready
+
+    await registry.get("search")
+    assert registry.ready
+    assert sorted(configured) == ["chat", "search", "search"]
+
+
+@pytest.mark.asyncio
+async def test_registered_agent_replaces_the_factory_build():
+    registry = AgentRegistry({"chat": FakeAgent}, configure=lambda name, agent: setattr(agent, "configured", True))
+    stub = FakeAgent()
+    await registry.register("chat", stub)
+
+    assert await registry.get("chat") is stub
+    assert stub.configured and stub.warm_ups == 0
+    assert registry.ready
+
+
+@pytest.mark.asyncio
+async def test_failed_tool_discovery_is_degraded_until_a_retry_succeeds():
+    agent = FakeAgent(tools_down=True)
+    registry = AgentRegistry({"search": lambda: agent})
+
+    status = await registry.warm_up()
+    assert status["search"] == {"state": "degraded", "tools": 0, "error": "MCP discovery returned no tools"}
+    assert not registry.ready
+    # Requests are still served, without tools, by the same instance
+    assert await registry.get("search") is agent
+    assert agent.warm_ups == 1
+
+    agent.tools_down = False
+    status = await registry.warm_up()
+    assert status["search"]["state"] == "ready"
+    assert registry.ready
+    assert agent.warm_ups == 2
+
+
+@pytest.mark.asyncio
+async def test_search_agent_warm_up_fails_and_retries_when_mcp_is_unreachable(monkeypatch):
+    from ai_agents import agents
+
+    class UnreachableMCP:
+        def __init__(self, configs):
+            pass
+
+        async def get_tools(self):
+            raise ConnectionError("MCP unreachable")
+
+    monkeypatch.setenv("CODEXHUB_MCP_AUTH_TOKEN", "test-token")
+    monkeypatch.setattr(agents, "MultiServerMCPClient", UnreachableMCP)
+    agent = agents.SearchAgent(agents.AgentConfig())
+
+    with pytest.raises(ToolDiscoveryError):
+        await agent.warm_up()
+    assert not agent._mcp_setup_done
+
+    class ReachableMCP(UnreachableMCP):
+        async def get_tools(self):
+            return ["web_search"]
+
+    monkeypatch.setattr(agents, "MultiServerMCPClient", ReachableMCP)
+    await agent.warm_up()
+    assert agent._mcp_setup_done and agent.mcp_tools == ["web_search"]
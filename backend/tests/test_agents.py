@@ -15,7 +15,7 @@ ROOT_DIR = Path(__file__).resolve().parent.parent
 if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
-from ai_agents import AgentConfig, ImageAgent, SearchAgent
+from ai_agents import AgentConfig, CatalogAgent, ImageAgent, SearchAgent
 
 
 load_dotenv()
@@ -67,6 +67,26 @@ async def test_image_agent():
     print(f"     HTTP Status: {head.status_code}")
 
 
+@pytest.mark.asyncio
+async def test_catalog_agent():
+    print("\n👟 Testing CatalogAgent...")
+    os.environ.setdefault("AI_MODEL_NAME", "gemini-2.5-pro")
+    products = [
+        {"id": "p1", "name": "Apex Runner", "color": "Black", "price": 120.0,
+         "sizes": [{"size": "9", "stock": 0}, {"size": "10", "stock": 3}]},
+    ]
+    agent = CatalogAgent(AgentConfig(), lambda message, limit: products[:limit])
+
+    response = await agent.execute("Do you have size 10 in black?")
+
+    assert response.success, response.error
+    assert response.metadata.get("catalog_skus") == ["p1"]
+    assert "apex runner" in response.content.lower()
+
+    print(f"  ✅ Catalog Agent PASSED")
+    print(f"     Response preview: {response.content[:100]}...")
+
+
 async def main():
     print("\n" + "="*60)
     print("🤖 AI AGENTS TEST SUITE")
@@ -75,6 +95,7 @@ async def main():
     try:
         await test_search_agent()
         await test_image_agent()
+        await test_catalog_agent()
         
         print("\n" + "="*60)
         print("🎉 ALL TESTS PASSED!")
@@ -0,0 +1,64 @@
+"""Tests for the in-memory facet index (no external services needed)."""
+
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from commerce.facets import FacetIndex, FacetQuery
+
+
+def _product(index, color, price, stock_by_size, **extra):
+    return {
+        "id": f"p{index}",
+        "name": f"Runner {index}",
+        "price": price,
+        "category": "sneakers",
+        "color": color,
+        "sizes": [{"size": size, "stock": stock} for size, stock in stock_by_size.items()],
+        "featured": False,
+        "created_at": datetime(2026, 1, 1) + timedelta(hours=index),
+        **extra,
+    }
+
+
+def _index():
+    index = FacetIndex()
+    index.load([
+        _product(1, "red", 120.0, {"9": 2, "10": 0}),
+        _product(2, "black", 180.0, {"9": 0, "10": 4}),
+        _product(3, "red", 220.0, {"10": 1}),
+        _product(4, "red", 150.0, {"10": 5}, published=False),
+    ])
+    return index
+
+
+def test_filters_intersect_and_results_are_newest_first():
+    result = _index().search(FacetQuery(colors=("red",), sizes=("10",)))
+
+    assert result.total == 1
+    assert [item["id"] for item in result.items] == ["p3"]
+
+    result = _index().search(FacetQuery(max_price=200.0))
+    assert [item["id"] for item in result.items] == ["p2", "p1"]
+
+
+def test_facet_counts_ignore_their_own_selection_and_unpublished_products():
+    result = _index().search(FacetQuery(colors=("red",), sizes=("10",)))
+
+    assert result.facets["color"] == {"black": 1, "red": 1}
+    assert result.facets["size"] == {"10": 1, "9": 1}
+    assert result.facets["price"] == {"min": 220.0, "max": 220.0}
+
+
+def test_upsert_and_remove_update_rows_in_place():
+    index = _index()
+    index.upsert(_product(1, "red", 120.0, {"9": 0, "10": 3}))
+    index.remove("p3")
+
+    result = index.search(FacetQuery(colors=("red",), sizes=("10",)))
+    assert [item["id"] for item in result.items] == ["p1"]
+    assert index.stats()["products"] == 3
@@ -0,0 +1,78 @@
+"""The orjson fast path must produce the same JSON as the response_model path."""
+
+import json
+import sys
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+
+pytest.importorskip("orjson")
+pytest.importorskip("fastapi")
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, Field
+
+from commerce.fast_json import encode_documents, shape_document
+
+
+class SizeStock(BaseModel):
+    size: str
+    stock: int
+
+
+class Item(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    sizes: List[SizeStock]
+    publish_at: Optional[datetime] = None
+    published: bool = True
+    created_at: datetime
+
+
+DOC = {
+    "_id": "mongo-object-id",
+    "id": "sku-1",
+    "name": "Runner",
+    "sizes": [{"size": "10", "stock": 3}],
+    "created_at": datetime(2026, 3, 1, 10, 30, 15, 123456, tzinfo=timezone.utc),
+}
+
+
+def test_shape_drops_extra_keys_and_fills_defaults():
+    shaped = shape_document(Item, DOC)
+
+    assert "_id" not in shaped
+    assert shaped["published"] is True
+    assert shaped["publish_at"] is None
+
+
+def test_missing_factory_defaults_are_fresh_per_document():
+    class Tagged(BaseModel):
+        id: str
+        tags: List[str] = Field(default_factory=list)
+        note: Optional[str] = None
+
+    first, second = (shape_document(Tagged, {"id": str(n)}) for n in range(2))
+
+    assert first == {"id": "0", "tags": [], "note": None}
+    assert first["tags"] is not second["tags"]
+
+
+@pytest.mark.parametrize("trusted", [True, False])
+@pytest.mark.parametrize("created_at", [
+    DOC["created_at"],
+    datetime(2026, 3, 1, 10, 30, 15, tzinfo=timezone.utc),
+    datetime(2026, 3, 1, 10, 30, 15, 123456),  # naive, as Mongo returns it
+])
+def test_encoding_matches_response_model_output(trusted, created_at):
+    doc = {**DOC, "created_at": created_at}
+    expected = jsonable_encoder([Item(**doc)])
+
+    assert json.loads(encode_documents(Item, [doc], trusted=trusted)) == expected
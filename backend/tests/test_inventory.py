@@ -0,0 +1,95 @@
+"""Tests for stock reservations and the expiry sweeper (no external services needed)."""
+
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from mongomock_motor import AsyncMongoMockClient
+
+from commerce import inventory
+from commerce.inventory import (
+    RESERVATION_HELD,
+    RESERVATION_PENDING,
+    RESERVATION_RELEASED,
+    InsufficientStockError,
+    ReservationLine,
+    release_expired,
+    reserve_stock,
+)
+
+
+async def _db(stock=None):
+    db = AsyncMongoMockClient()["inventory_test"]
+    for product_id, count in (stock or {"a": 2, "b": 1}).items():
+        await db.products.insert_one({"id": product_id, "sizes": [{"size": "10", "stock": count}]})
+    return db
+
+
+async def _stock(db, product_id):
+    product = await db.products.find_one({"id": product_id})
+    return product["sizes"][0]["stock"]
+
+
+LINES = [ReservationLine("a", "10", 1), ReservationLine("b", "10", 1)]
+
+
+@pytest.mark.asyncio
+async def test_reservation_takes_every_line_or_none():
+    db = await _db()
+    reservation = await reserve_stock(db, "u1", LINES)
+    assert reservation["status"] == RESERVATION_HELD
+    assert (await _stock(db, "a"), await _stock(db, "b")) == (1, 0)
+
+    # "b" is now sold out, so the "a" line taken first must be put back
+    with pytest.raises(InsufficientStockError):
+        await reserve_stock(db, "u2", LINES)
+    assert (await _stock(db, "a"), await _stock(db, "b")) == (1, 0)
+    failed = await db.stock_reservations.find_one({"user_id": "u2"})
+    assert failed["status"] == RESERVATION_RELEASED
+
+
+@pytest.mark.asyncio
+async def test_unexpected_error_mid_reservation_restores_taken_lines(monkeypatch):
+    db = await _db()
+    decrement = inventory._decrement
+
+    async def flaky(db, line):
+        if line.product_id == "b":
+            raise ConnectionError("primary stepped down")
+        return await decrement(db, line)
+
+    monkeypatch.setattr(inventory, "_decrement", flaky)
+    with pytest.raises(ConnectionError):
+        await reserve_stock(db, "u1", LINES)
+
+    assert (await _stock(db, "a"), await _stock(db, "b")) == (2, 1)
+    assert (await db.stock_reservations.find_one({}))["status"] == RESERVATION_RELEASED
+
+
+@pytest.mark.asyncio
+async def test_sweeper_returns_stock_of_expired_and_abandoned_reservations():
+    db = await _db()
+    held = await reserve_stock(db, "u1", [ReservationLine("a", "10", 1)], ttl_seconds=-1)
+    # A checkout that died after taking "b" but before finishing: pending, one line taken
+    await db.products.update_one({"id": "b"}, {"$inc": {"sizes.0.stock": -1}})
+    await db.stock_reservations.insert_one({
+        "id": "crashed",
+        "items": [line.to_dict() for line in LINES],
+        "taken": [LINES[1].to_dict()],
+        "status": RESERVATION_PENDING,
+        "expires_at": datetime.now(timezone.utc) - timedelta(seconds=1),
+    })
+    assert (await _stock(db, "a"), await _stock(db, "b")) == (1, 0)
+
+    assert await release_expired(db) == 2
+    assert (await _stock(db, "a"), await _stock(db, "b")) == (2, 1)
+    assert await release_expired(db) == 0
+    assert (await db.stock_reservations.find_one({"id": held["id"]}))["status"] == RESERVATION_RELEASED
@@ -0,0 +1,35 @@
+"""Smoke run of the in-process drop-day load test (no external services needed)."""
+
+import sys
+from argparse import Namespace
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+pytest.importorskip("mongomock_motor")
+
+from benchmarks.load_test import run
+
+
+@pytest.mark.asyncio
+async def test_drop_day_mix_runs_without_errors_or_oversells():
+    args = Namespace(
+        requests=300,
+        concurrency=20,
+        products=5,
+        stock=2,
+        llm_latency=0.0,
+        stripe_latency=0.0,
+        mongo_url=None,
+        seed=1,
+    )
+    report = await run(args)
+
+    assert report["_total"]["oversold_products"] == 0
+    for name, row in report.items():
+        if not name.startswith("_"):
+            assert row["errors"] == 0, f"{name} had {row['errors']} errors"
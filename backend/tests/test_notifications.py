@@ -0,0 +1,124 @@
+"""Tests for drop campaign checkpoints and worker leases (no external services needed)."""
+
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from mongomock_motor import AsyncMongoMockClient
+
+from commerce.notifications import (
+    CAMPAIGN_COMPLETED,
+    CAMPAIGN_RUNNING,
+    NotificationDispatcher,
+    NotificationsDisabledError,
+    NotificationTransport,
+)
+
+
+class RecordingTransport(NotificationTransport):
+    """Records recipients; with ``block_after``, later sends hang until ``release`` is set."""
+
+    def __init__(self, block_after=None):
+        self.sent = []
+        self.block_after = block_after
+        self.release = asyncio.Event()
+
+    async def send(self, message):
+        if self.block_after is not None and len(self.sent) >= self.block_after:
+            await self.release.wait()
+        self.sent.append(message.to)
+
+
+async def _db(subscribers=5):
+    db = AsyncMongoMockClient()["notifications_test"]
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    await db.drops_subscribers.insert_many([
+        {"id": f"s{n}", "email": f"fan{n}@example.com", "subscribed_at": start + timedelta(minutes=n)}
+        for n in range(subscribers)
+    ])
+    return db
+
+
+def _dispatcher(db, transport):
+    return NotificationDispatcher(db, transport, concurrency=1, rate_per_second=0, batch_size=2)
+
+
+async def _campaign(db, campaign_id):
+    return await db.drop_campaigns.find_one({"id": campaign_id})
+
+
+async def _wait_for(predicate):
+    for _ in range(200):
+        if await predicate():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+@pytest.mark.asyncio
+async def test_stopped_campaign_resumes_after_its_last_checkpoint():
+    db = await _db()
+    first = _dispatcher(db, RecordingTransport(block_after=3))
+    campaign = await first.create("Drop", "Hi {email}")
+
+    async def checkpointed():
+        return (await _campaign(db, campaign["id"]))["batches"] == 1
+
+    await _wait_for(checkpointed)
+    await first.stop()
+    stopped = await _campaign(db, campaign["id"])
+    assert stopped["status"] == CAMPAIGN_RUNNING and "owner" not in stopped
+
+    transport = RecordingTransport()
+    second = _dispatcher(db, transport)
+    assert await second.resume_interrupted() == 1
+    await asyncio.gather(*second._tasks.values())
+
+    # The in-flight batch is sent again: delivery is at least once
+    assert transport.sent == [f"fan{n}@example.com" for n in range(2, 5)]
+    done = await _campaign(db, campaign["id"])
+    assert done["status"] == CAMPAIGN_COMPLETED
+    assert done["batches"] == 3 and "owner" not in done
+
+
+@pytest.mark.asyncio
+async def test_only_one_worker_sends_and_an_expired_lease_is_taken_over():
+    db = await _db()
+    stalled = RecordingTransport(block_after=1)
+    first = _dispatcher(db, stalled)
+    campaign = await first.create("Drop", "Hi")
+    second = _dispatcher(db, RecordingTransport())
+
+    assert await second.resume_interrupted() == 0
+
+    await db.drop_campaigns.update_one(
+        {"id": campaign["id"]},
+        {"$set": {"lease_expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}},
+    )
+    assert await second.resume_interrupted() == 1
+    await asyncio.gather(*second._tasks.values())
+
+    # The first worker wakes up, finds the lease gone and stops without touching the campaign
+    stalled.release.set()
+    await asyncio.gather(*first._tasks.values())
+    done = await _campaign(db, campaign["id"])
+    assert done["status"] == CAMPAIGN_COMPLETED
+    assert done["batches"] == 3 and done["sent"] == 5
+
+
+@pytest.mark.asyncio
+async def test_campaigns_need_an_explicit_transport():
+    dispatcher = NotificationDispatcher(await _db(), None)
+
+    with pytest.raises(NotificationsDisabledError):
+        await dispatcher.create("Drop", "Hi")
+    assert await dispatcher.resume_interrupted() == 0
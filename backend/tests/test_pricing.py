@@ -0,0 +1,80 @@
+"""Tests for server-side cart pricing and order creation (no external services needed)."""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+
+from commerce.pricing import price_cart
+
+
+async def _db():
+    db = AsyncMongoMockClient()["pricing_test"]
+    await db.products.insert_many([
+        {"id": "runner", "name": "Runner", "price": 120.0, "sizes": [{"size": "10", "stock": 3}]},
+        {"id": "slide", "name": "Slide", "price": 35.5, "sizes": [{"size": "9", "stock": 1}]},
+        {"id": "drop", "name": "Drop", "price": 300.0, "published": False, "sizes": [{"size": "10", "stock": 5}]},
+    ])
+    await db.cart_items.insert_many([
+        {"id": "c1", "user_id": "u1", "product_id": "runner", "size": "10", "quantity": 2, "added_at": 1},
+        {"id": "c2", "user_id": "u1", "product_id": "slide", "size": "9", "quantity": 1, "added_at": 2},
+        {"id": "c3", "user_id": "u1", "product_id": "drop", "size": "10", "quantity": 1, "added_at": 3},
+        {"id": "c4", "user_id": "u1", "product_id": "deleted", "size": "10", "quantity": 1, "added_at": 4},
+        {"id": "c5", "user_id": "u2", "product_id": "runner", "size": "10", "quantity": 1, "added_at": 5},
+    ])
+    return db
+
+
+@pytest.mark.asyncio
+async def test_totals_multiply_quantity_by_the_stored_price():
+    priced = await price_cart(await _db(), "u1")
+
+    assert [(item["product_id"], item["quantity"], item["line_total"]) for item in priced.items] == [
+        ("runner", 2, 240.0),
+        ("slide", 1, 35.5),
+    ]
+    assert priced.total == 275.5
+    assert priced.cart_item_ids == ["c1", "c2"]
+
+
+@pytest.mark.asyncio
+async def test_unpublished_deleted_and_foreign_lines_drop_out():
+    priced = await price_cart(await _db(), "u1", ["c5", "c4", "c3", "c2", "c2"])
+
+    assert priced.cart_item_ids == ["c2"]
+    assert priced.total == 35.5
+    assert (await price_cart(await _db(), "u1", [])).items == []
+
+
+@pytest.mark.asyncio
+async def test_create_order_takes_stock_and_refuses_to_oversell():
+    import server
+
+    db = await _db()
+    request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(db=db)))
+    order_input = server.OrderCreate(user_id="u1", cart_items=["c2"], shipping_address={"city": "Bench"})
+
+    order = await server.create_order(order_input, request)
+    reservation = await db.stock_reservations.find_one({"id": order.reservation_id})
+    assert reservation["status"] == "committed"
+    assert (await db.products.find_one({"id": "slide"}))["sizes"][0]["stock"] == 0
+
+    await db.cart_items.insert_one(
+        {"id": "c6", "user_id": "u1", "product_id": "slide", "size": "9", "quantity": 1, "added_at": 6}
+    )
+    with pytest.raises(HTTPException) as excinfo:
+        await server.create_order(
+            server.OrderCreate(user_id="u1", cart_items=["c6"], shipping_address={}), request
+        )
+    assert excinfo.value.status_code == 409
+    assert await db.orders.count_documents({}) == 1
@@ -0,0 +1,76 @@
+"""Tests for the agent response cache (no external services needed)."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from ai_agents.cache import InMemoryResponseCache, cache_scope
+
+
+SCOPE = cache_scope("ChatAgent", "system prompt", "gemini-2.5-pro", False)
+RESPONSE = {"success": True, "content": "Friday at 10am", "metadata": {}, "error": None}
+
+
+@pytest.mark.asyncio
+async def test_exact_hit_ignores_case_whitespace_and_punctuation():
+    cache = InMemoryResponseCache()
+    await cache.set(SCOPE, "When is the next drop?", RESPONSE)
+
+    assert await cache.get(SCOPE, "  when is the   NEXT drop") == (RESPONSE, "exact")
+
+
+@pytest.mark.asyncio
+async def test_scope_separates_models_and_system_prompts():
+    cache = InMemoryResponseCache()
+    await cache.set(SCOPE, "When is the next drop?", RESPONSE)
+
+    other_model = cache_scope("ChatAgent", "system prompt", "gpt-4o", False)
+    other_prompt = cache_scope("ChatAgent", "another prompt", "gemini-2.5-pro", False)
+    assert await cache.get(other_model, "When is the next drop?") is None
+    assert await cache.get(other_prompt, "When is the next drop?") is None
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_and_ttl_expiry():
+    cache = InMemoryResponseCache(max_entries=2)
+    for prompt in ("one", "two", "three"):
+        await cache.set(SCOPE, prompt, RESPONSE)
+    assert await cache.get(SCOPE, "one") is None
+    assert await cache.get(SCOPE, "three") is not None
+
+    expired = InMemoryResponseCache(ttl_seconds=0)
+    await expired.set(SCOPE, "one", RESPONSE)
+    assert await expired.get(SCOPE, "one") is None
+
+
+@pytest.mark.asyncio
+async def test_similarity_mode_matches_paraphrases_only():
+    cache = InMemoryResponseCache(similarity_threshold=0.8)
+    await cache.set(SCOPE, "When is the next drop?", RESPONSE)
+
+    assert await cache.get(SCOPE, "when is the next sneaker drop") == (RESPONSE, "similar")
+    assert await cache.get(SCOPE, "what sizes run small") is None
+
+
+@pytest.mark.asyncio
+async def test_similarity_mode_never_crosses_sizes_or_model_numbers():
+    cache = InMemoryResponseCache(similarity_threshold=0.8)
+    await cache.set(SCOPE, "do you have size 10 in black", RESPONSE)
+    await cache.set(SCOPE, "is the air max 90 restocking", RESPONSE)
+
+    assert await cache.get(SCOPE, "do you have size 11 in black") is None
+    assert await cache.get(SCOPE, "is the air max 95 restocking") is None
+    assert await cache.get(SCOPE, "do you have a size 10 in black") == (RESPONSE, "similar")
+
+
+@pytest.mark.asyncio
+async def test_similarity_can_be_disabled_per_call():
+    cache = InMemoryResponseCache(similarity_threshold=0.8)
+    await cache.set(SCOPE, "When is the next drop?", RESPONSE)
+
+    assert await cache.get(SCOPE, "when is the next sneaker drop", allow_similar=False) is None
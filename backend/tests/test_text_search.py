@@ -0,0 +1,81 @@
+"""Tests for the local product search index (no external services needed)."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from commerce.text_search import TextIndex
+
+
+def _index():
+    index = TextIndex()
+    index.load([
+        {"id": "1", "name": "Apex Runner", "color": "Black", "description": "Lightweight running shoe"},
+        {"id": "2", "name": "Court Classic", "color": "White", "description": "Leather court sneaker"},
+        {"id": "3", "name": "Trail Runner", "color": "Red", "description": "Rugged trail shoe", "published": False},
+    ])
+    return index
+
+
+def _ids(result):
+    return [hit.doc["id"] for hit in result.hits]
+
+
+def test_name_matches_rank_above_description_matches():
+    index = _index()
+    index.upsert({"id": "4", "name": "Daily Trainer", "color": "Grey", "description": "A court shoe"})
+
+    assert _ids(index.search("court")) == ["2", "4"]
+
+
+def test_last_token_matches_as_prefix():
+    result = _index().search("white leath")
+
+    assert _ids(result) == ["2"]
+    assert result.expansions["leath"] == ["leather"]
+
+
+def test_typos_within_one_edit_still_match():
+    assert _ids(_index().search("apex rnuner")) == ["1"]
+    assert _ids(_index().search("blakc")) == ["1"]
+
+
+def test_unpublished_and_removed_products_are_not_returned():
+    index = _index()
+    assert _ids(index.search("trail")) == []
+
+    index.remove("1")
+    assert _ids(index.search("runner")) == []
+
+
+def test_unpublished_products_do_not_leak_through_expansions():
+    index = _index()
+    assert index.search("trai").expansions == {"trai": []}
+    assert index.search("rugge").expansions == {"rugge": []}
+    assert index.stats()["documents"] == 2
+
+    index.upsert({"id": "3", "name": "Trail Runner", "color": "Red", "description": "Rugged trail shoe"})
+    assert _ids(index.search("trai")) == ["3"]
+
+    index.upsert({"id": "3", "name": "Trail Runner", "published": False})
+    assert index.search("trai").expansions == {"trai": []}
+
+
+@pytest.mark.asyncio
+async def test_refresh_picks_up_writes_from_other_workers():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["search_test"]
+    index = _index()
+    await db.products.insert_many([
+        {"id": "5", "name": "Harbor Slide", "color": "Navy", "description": "Pool slide"},
+        {"id": "6", "name": "Zebraflux", "color": "White", "description": "Scheduled drop", "published": False},
+    ])
+
+    assert await index.refresh(db) == 1
+    assert _ids(index.search("harbo")) == ["5"]
+    assert index.search("zebraf").expansions == {"zebraf": []}
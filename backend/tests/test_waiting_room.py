@@ -0,0 +1,104 @@
+"""Tests for drop waiting room admission, queue tokens and the gate (no external services needed)."""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from mongomock_motor import AsyncMongoMockClient
+
+from commerce.waiting_room import DropRoom, InvalidQueueTokenError, WaitingRoom, WaitingRoomMiddleware
+
+
+@pytest.mark.parametrize("burst", [0, 1, 3])
+def test_admission_time_and_admitted_count_agree(burst):
+    room = DropRoom("drop", rate_per_second=2.0, burst=burst, opened_at=1000.0)
+
+    for step in range(12):
+        now = 1000.0 + step * 0.25
+        for position in range(10):
+            assert (now >= room.admitted_at(position)) == (position < room.admitted_count(now))
+
+
+def test_burst_admits_exactly_burst_positions_at_opening():
+    assert [DropRoom("d", 1.0, 1, 0.0).admitted_at(p) for p in range(3)] == [0.0, 1.0, 2.0]
+    assert [DropRoom("d", 1.0, 0, 0.0).admitted_at(p) for p in range(2)] == [1.0, 2.0]
+
+
+async def _room():
+    waiting_room = WaitingRoom(AsyncMongoMockClient()["waiting_room_test"], b"secret")
+    await waiting_room.open("drop", rate_per_second=1.0, burst=1)
+    return waiting_room
+
+
+@pytest.mark.asyncio
+async def test_tokens_are_bound_to_one_ticket_per_user():
+    waiting_room = await _room()
+    alice = await waiting_room.join("drop", "alice")
+    again = await waiting_room.join("drop", "alice")
+    bob = await waiting_room.join("drop", "bob")
+
+    assert (alice["position"], again["position"], bob["position"]) == (0, 0, 1)
+    assert alice["admitted"] and not bob["admitted"] and bob["ahead"] == 0
+    assert waiting_room.check(alice["token"], "alice")[0]
+
+    allowed, details = waiting_room.check(alice["token"], "bob")
+    assert not allowed and "another user" in details["detail"]
+    with pytest.raises(InvalidQueueTokenError):
+        waiting_room.status(alice["token"][:-1] + "0", "alice")
+
+    await waiting_room.open("drop", rate_per_second=1.0, burst=1)
+    with pytest.raises(InvalidQueueTokenError):
+        waiting_room.status(alice["token"], "alice")
+
+
+@pytest.mark.asyncio
+async def test_other_workers_see_the_room_after_refresh():
+    waiting_room = await _room()
+    other = WaitingRoom(waiting_room.db, b"secret")
+    alice = await waiting_room.join("drop", "alice")
+
+    assert not other.check(alice["token"], "alice")[0]
+    await other.refresh()
+    assert other.check(alice["token"], "alice")[0]
+
+
+async def _call(waiting_room_of, token, body):
+    seen, sent = {}, []
+    messages = [{"type": "http.request", "body": body[:4], "more_body": True}, {"type": "http.request", "body": body[4:]}]
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    async def app(scope, receive, send):
+        seen["body"] = (await receive())["body"]
+
+    headers = [(b"x-queue-token", token.encode())]
+    await WaitingRoomMiddleware(app, waiting_room_of)(
+        {"type": "http", "method": "POST", "path": "/api/checkout", "headers": headers}, receive, send
+    )
+    return seen.get("body"), sent
+
+
+@pytest.mark.asyncio
+async def test_middleware_checks_the_token_against_the_body_user():
+    waiting_room = await _room()
+    alice = await waiting_room.join("drop", "alice")
+    body = json.dumps({"user_id": "alice", "cart_items": []}).encode()
+
+    replayed, sent = await _call(lambda: waiting_room, alice["token"], body)
+    assert replayed == body and sent == []
+
+    replayed, sent = await _call(lambda: waiting_room, alice["token"], json.dumps({"user_id": "bob"}).encode())
+    assert replayed is None and sent[0]["status"] == 429
+    assert waiting_room.rejected == 1
@@ -0,0 +1,192 @@
+"""Tests for webhook deduplication, worker leases and checkout completion (no external services needed)."""
+
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from mongomock_motor import AsyncMongoMockClient
+
+from commerce.inventory import (
+    RESERVATION_COMMITTED,
+    ReservationLine,
+    attach_session,
+    reserve_stock,
+)
+from commerce.webhooks import (
+    EVENT_FAILED,
+    EVENT_PENDING,
+    EVENT_PROCESSED,
+    EVENT_PROCESSING,
+    MAX_ATTEMPTS,
+    ORDER_NEEDS_ATTENTION,
+    WebhookWorker,
+    complete_checkout,
+    expire_checkout,
+    record_event,
+)
+
+
+async def _db():
+    db = AsyncMongoMockClient()["webhooks_test"]
+    await db.stripe_events.create_index("id", unique=True)
+    return db
+
+
+def _event(event_id, session_id="cs_1", event_type="checkout.session.completed"):
+    return {"id": event_id, "type": event_type, "data": {"object": {"id": session_id}}}
+
+
+class RecordingHandler:
+    def __init__(self, fail=False):
+        self.seen = []
+        self.fail = fail
+
+    async def __call__(self, db, event):
+        self.seen.append(event["id"])
+        if self.fail:
+            raise RuntimeError("fulfilment down")
+
+
+async def _event_doc(db, event_id):
+    return await db.stripe_events.find_one({"id": event_id})
+
+
+@pytest.mark.asyncio
+async def test_duplicate_delivery_is_fulfilled_once():
+    db = await _db()
+    handler = RecordingHandler()
+    worker = WebhookWorker(db, handler, concurrency=1)
+
+    assert await record_event(db, _event("evt_1"))
+    assert not await record_event(db, _event("evt_1"))
+    assert worker.submit("evt_1") and worker.submit("evt_1")
+    assert worker.queue.qsize() == 1
+
+    worker.start()
+    await worker.queue.join()
+    # Stripe retries after we answered: the event is recorded, so the retry goes nowhere
+    worker.submit("evt_1")
+    await worker.queue.join()
+    await worker.stop()
+
+    assert handler.seen == ["evt_1"]
+    assert (await _event_doc(db, "evt_1"))["status"] == EVENT_PROCESSED
+    assert worker.processed == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_lease_is_requeued_and_a_live_one_is_left_alone():
+    db = await _db()
+    handler = RecordingHandler()
+    worker = WebhookWorker(db, handler, concurrency=1)
+    now = datetime.now(timezone.utc)
+    leases = {"evt_dead": now - timedelta(seconds=1), "evt_live": now + timedelta(minutes=5)}
+    for event_id, lease_expires_at in leases.items():
+        await record_event(db, _event(event_id))
+        await db.stripe_events.update_one(
+            {"id": event_id},
+            {"$set": {"status": EVENT_PROCESSING, "attempts": 1, "lease_expires_at": lease_expires_at}},
+        )
+
+    assert await worker.requeue_stale() == 1
+    assert await worker.requeue_stale() == 0  # already waiting in the queue
+    worker.start()
+    await worker.queue.join()
+    await worker.stop()
+
+    assert handler.seen == ["evt_dead"]
+    dead, live = await _event_doc(db, "evt_dead"), await _event_doc(db, "evt_live")
+    assert (dead["status"], dead["attempts"]) == (EVENT_PROCESSED, 2)
+    assert "lease_expires_at" not in dead
+    assert live["status"] == EVENT_PROCESSING
+
+    # A worker that picked up the live event anyway cannot claim it under the other's lease
+    await worker._process("evt_live")
+    assert handler.seen == ["evt_dead"]
+
+
+@pytest.mark.asyncio
+async def test_failing_event_is_retried_until_max_attempts():
+    db = await _db()
+    handler = RecordingHandler(fail=True)
+    worker = WebhookWorker(db, handler)
+    await record_event(db, _event("evt_1"))
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        await worker._process("evt_1")
+        doc = await _event_doc(db, "evt_1")
+        assert doc["attempts"] == attempt
+        assert doc["status"] == (EVENT_FAILED if attempt == MAX_ATTEMPTS else EVENT_PENDING)
+        assert doc["last_error"] == "fulfilment down" and "lease_expires_at" not in doc
+
+    await worker._process("evt_1")
+    assert len(handler.seen) == MAX_ATTEMPTS and worker.failed == MAX_ATTEMPTS
+
+
+async def _checkout(db, stock=1):
+    """A shopper with a held reservation for one pair, linked to session cs_1, and a pending order."""
+    await db.products.insert_one({"id": "runner", "sizes": [{"size": "10", "stock": stock}]})
+    await db.cart_items.insert_many([
+        {"id": "c1", "user_id": "u1", "product_id": "runner", "size": "10", "quantity": 1},
+        {"id": "c2", "user_id": "u1", "product_id": "runner", "size": "10", "quantity": 1},
+    ])
+    reservation = await reserve_stock(db, "u1", [ReservationLine("runner", "10", 1)])
+    await attach_session(db, reservation["id"], "cs_1", datetime.now(timezone.utc) + timedelta(minutes=30))
+    await db.orders.insert_one(
+        {"id": "o1", "user_id": "u1", "status": "pending", "stripe_payment_id": "cs_1", "cart_item_ids": ["c1"]}
+    )
+    return reservation
+
+
+async def _stock(db):
+    return (await db.products.find_one({"id": "runner"}))["sizes"][0]["stock"]
+
+
+@pytest.mark.asyncio
+async def test_completion_commits_stock_and_clears_only_checked_out_lines():
+    db = await _db()
+    reservation = await _checkout(db)
+
+    await complete_checkout(db, {"id": "cs_1"})
+    await complete_checkout(db, {"id": "cs_1"})  # a redelivered event changes nothing
+
+    assert (await db.orders.find_one({"id": "o1"}))["status"] == "paid"
+    assert (await db.stock_reservations.find_one({"id": reservation["id"]}))["status"] == RESERVATION_COMMITTED
+    assert await _stock(db) == 0
+    assert [item["id"] async for item in db.cart_items.find({})] == ["c2"]
+
+
+@pytest.mark.asyncio
+async def test_payment_after_release_retakes_stock_if_any_is_left():
+    db = await _db()
+    reservation = await _checkout(db, stock=2)
+    await expire_checkout(db, "cs_1")
+    assert await _stock(db) == 2
+
+    await complete_checkout(db, {"id": "cs_1"})
+
+    assert (await db.orders.find_one({"id": "o1"}))["status"] == "paid"
+    assert (await db.stock_reservations.find_one({"id": reservation["id"]}))["status"] == RESERVATION_COMMITTED
+    assert await _stock(db) == 1
+
+
+@pytest.mark.asyncio
+async def test_payment_after_stock_is_gone_needs_attention_instead_of_overselling():
+    db = await _db()
+    await _checkout(db)
+    await expire_checkout(db, "cs_1")
+    await reserve_stock(db, "u2", [ReservationLine("runner", "10", 1)])  # someone else takes the last pair
+    assert await _stock(db) == 0
+
+    await complete_checkout(db, {"id": "cs_1"})
+
+    assert (await db.orders.find_one({"id": "o1"}))["status"] == ORDER_NEEDS_ATTENTION
+    assert await _stock(db) == 0
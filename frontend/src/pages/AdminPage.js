@@ -26,7 +26,7 @@ export default function AdminPage() {
 
   const fetchProducts = async () => {
     try {
-      const response = await axios.get(`${API}/products`);
+      const response = await axios.get(`${API}/products?include_unpublished=true`);
       setProducts(response.data);
     } catch (error) {
       console.error('Error fetching products:', error);